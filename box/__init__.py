@@ -1,8 +1,11 @@
 from .client import BoxClient, \
     start_authenticate_v1, finish_authenticate_v1, \
     start_authenticate_v2, finish_authenticate_v2, refresh_v2_token, \
-    CredentialsV1, CredentialsV2
+    CredentialsV1, CredentialsV2, deadline
+from .breaker import CircuitBreaker, CircuitBreakers
+from .locks import FileLock
+from .store import CredentialStore, FileCredentialStore, SqliteCredentialStore
 
 from .client import EventFilter, EventType, ShareAccess
 from .client import BoxClientException, BoxAccountUnauthorized, BoxAuthenticationException, PreconditionFailed, \
-    ItemDoesNotExist, ItemAlreadyExists
+    ItemDoesNotExist, ItemAlreadyExists, CircuitOpen, DeadlineExceeded, IntegrityError
@@ -0,0 +1,187 @@
+"""
+Circuit breakers, which stop requests to a failing Box service early instead of letting them pile up.
+
+A breaker is closed while requests mostly succeed. Once the share of failed (or too slow) requests over a rolling
+window crosses a threshold, it opens, and requests fail right away. After a while it lets a few probe requests
+through (half-open): if they succeed it closes again, otherwise it stays open for another period.
+"""
+import threading
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+# the families of endpoints that get a breaker of their own
+FAMILIES = ('api', 'upload', 'events', 'thumbnails')
+
+
+class CircuitBreaker(object):
+    """
+    Tracks the outcome of the requests to one family of endpoints, and decides whether new ones may be sent.
+
+    Args:
+        - failure_rate: (optional) the share of failed requests over the window that opens the circuit.
+        - min_requests: (optional) the number of requests in the window below which the circuit never opens.
+        - window: (optional) the length of the rolling window, in seconds.
+        - slow_call_duration: (optional) the number of seconds after which a request counts as failed, even if it
+                              succeeded. Disabled by default.
+        - open_duration: (optional) the number of seconds the circuit stays open before probing.
+        - probes: (optional) the number of concurrent probe requests while half-open, all of which have to succeed
+                  for the circuit to close.
+    """
+    def __init__(self, failure_rate=0.5, min_requests=20, window=60, slow_call_duration=None, open_duration=30,
+                 probes=1, clock=time.time):
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.window = window
+        self.slow_call_duration = slow_call_duration
+        self.open_duration = open_duration
+        self.probes = probes
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        # second -> [requests, failures, slow requests, total latency]
+        self._buckets = {}
+        self._opened_at = None
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+
+    def allow(self):
+        """
+        Returns whether a request may be sent now. Every allowed request has to be followed by a call to record().
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+
+            if self.state == OPEN:
+                if self._clock() - self._opened_at < self.open_duration:
+                    return False
+                self.state = HALF_OPEN
+                self._probes_in_flight = self._probe_successes = 0
+
+            if self._probes_in_flight >= self.probes:
+                return False
+            self._probes_in_flight += 1
+            return True
+
+    def record(self, success, latency):
+        """
+        Records the outcome of a request.
+
+        Args:
+            - success: whether the service handled the request. Client errors (4xx) are successes.
+            - latency: the duration of the request, in seconds.
+        """
+        slow = self.slow_call_duration is not None and latency > self.slow_call_duration
+        failed = not success or slow
+
+        with self._lock:
+            self._add(failed, slow, latency)
+
+            if self.state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if failed:
+                    self._open()
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.probes:
+                        self.state = CLOSED
+                        self._buckets.clear()
+
+            elif self.state == CLOSED:
+                requests, failures = self._totals()[:2]
+                if requests >= self.min_requests and failures >= self.failure_rate * requests:
+                    self._open()
+
+    def retry_after(self):
+        """
+        Returns the number of seconds until the circuit lets probes through, 0 if it isn't open
+        """
+        with self._lock:
+            if self.state != OPEN:
+                return 0
+            return max(0, self._opened_at + self.open_duration - self._clock())
+
+    def _open(self):
+        self.state = OPEN
+        self._opened_at = self._clock()
+
+    def _add(self, failed, slow, latency):
+        now = int(self._clock())
+        for second in [second for second in self._buckets if second <= now - self.window]:
+            del self._buckets[second]
+
+        bucket = self._buckets.setdefault(now, [0, 0, 0, 0.0])
+        bucket[0] += 1
+        bucket[1] += failed
+        bucket[2] += slow
+        bucket[3] += latency
+
+    def _totals(self):
+        totals = [0, 0, 0, 0.0]
+        oldest = int(self._clock()) - self.window
+        for second, bucket in self._buckets.items():
+            if second > oldest:
+                for index, value in enumerate(bucket):
+                    totals[index] += value
+        return totals
+
+    def stats(self):
+        """
+        Returns the state of the circuit, and the counts & mean latency of the requests in the window
+        """
+        with self._lock:
+            requests, failures, slow, latency = self._totals()
+            return {
+                'state': self.state,
+                'requests': requests,
+                'failures': failures,
+                'slow': slow,
+                'error_rate': float(failures) / requests if requests else 0.0,
+                'mean_latency': latency / requests if requests else 0.0,
+            }
+
+
+class CircuitBreakers(object):
+    """
+    A CircuitBreaker per family of endpoints (see FAMILIES), created on first use.
+
+    A single instance is meant to be shared by all the clients of a process, so that they all back off together.
+
+    Args:
+        - **settings: the default arguments of the breakers. See CircuitBreaker.
+    """
+    def __init__(self, **settings):
+        self.settings = settings
+        self._family_settings = {}
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def configure(self, family, **settings):
+        """
+        Overrides the default settings for the breaker of one family, f.ex. a longer slow_call_duration for events
+        """
+        with self._lock:
+            self._family_settings[family] = settings
+            self._breakers.pop(family, None)
+
+    def get(self, family):
+        with self._lock:
+            breaker = self._breakers.get(family)
+            if breaker is None:
+                settings = dict(self.settings)
+                settings.update(self._family_settings.get(family, {}))
+                breaker = self._breakers[family] = CircuitBreaker(**settings)
+            return breaker
+
+    __getitem__ = get
+
+    def stats(self):
+        """
+        Returns the stats of every breaker used so far, by family
+        """
+        with self._lock:
+            breakers = dict(self._breakers)
+        return dict((family, breaker.stats()) for family, breaker in breakers.items())
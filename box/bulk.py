@@ -0,0 +1,348 @@
+"""
+Bulk operations, run concurrently on a bounded pool of threads.
+"""
+import sqlite3
+
+from .client import CollaboratorRole, ItemAlreadyExists, ItemDoesNotExist
+from .models import BoxObject
+from .pool import RateLimiter, WorkerPool
+
+
+class BulkResult(object):
+    """
+    The outcome of one row of a bulk operation.
+
+    Attributes:
+        - row: the row, as passed in. DeletePipeline reports the (type, id, etag) tuple of every item instead, as
+               it also reports the items found in the folders it expands.
+        - result: what the api returned for it, if anything.
+        - error: the exception raised for it, or None.
+        - existed: True if the row was already in effect (f.ex. the collaboration already existed), which is
+                   considered a success.
+    """
+    __slots__ = ('row', 'result', 'error', 'existed')
+
+    def __init__(self, row, result=None, error=None, existed=False):
+        self.row = row
+        self.result = result
+        self.error = error
+        self.existed = existed
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        return '<BulkResult {0!r} {1}>'.format(self.row, 'ok' if self.ok else repr(self.error))
+
+
+def run_bulk(func, rows, workers=8):
+    """
+    Calls func on every row concurrently.
+
+    func returns the BulkResult of a row. Any other exception it raises is recorded as the error of the row.
+
+    Returns:
+        - a list of BulkResult, in the order of the rows
+    """
+    rows = list(rows)
+    results = [None] * len(rows)
+
+    with WorkerPool(workers) as pool:
+        for (index, row), future in pool.map_unordered(lambda indexed: func(indexed[1]), enumerate(rows)):
+            error = future.exception()
+            results[index] = BulkResult(row, error=error) if error is not None else future.result()
+
+    return results
+
+
+def _is_login(principal):
+    return isinstance(principal, basestring) and '@' in principal
+
+
+def create_collaborations(client, rows, workers=8, notify=False):
+    """
+    Creates many collaborations concurrently. Collaborations that already exist count as successes.
+
+    Args:
+        - client: a BoxClient.
+        - rows: (folder, principal, role) tuples. The folder is an ID or a dictionary, the principal a user ID,
+                a login (anything with an '@') or a dictionary with either, and role a value of CollaboratorRole.
+                Role may be omitted, and defaults to CollaboratorRole.VIEWER.
+        - workers: (optional) the number of concurrent requests.
+        - notify: (optional) whether the collaborators get an email notification.
+
+    Returns:
+        - a list of BulkResult, in the order of the rows
+    """
+    def create(row):
+        folder, principal = row[0], row[1]
+        role = row[2] if len(row) > 2 else CollaboratorRole.VIEWER
+        folder_id = client._get_id(folder)
+        if isinstance(principal, dict):
+            principal = principal.get('login') or principal['id']
+
+        try:
+            if _is_login(principal):
+                result = client.create_collaboration_by_login(folder_id, principal, role=role, notify=notify)
+            else:
+                result = client.create_collaboration_by_user_id(folder_id, str(principal), role=role, notify=notify)
+        except ItemAlreadyExists:
+            return BulkResult(row, existed=True)
+
+        return BulkResult(row, result)
+
+    return run_bulk(create, rows, workers)
+
+
+def edit_collaborations(client, rows, workers=8):
+    """
+    Changes the role of many collaborations concurrently.
+
+    Args:
+        - client: a BoxClient.
+        - rows: (collaboration, role) or (collaboration, role, etag) tuples, where collaboration is an ID or a
+                dictionary.
+        - workers: (optional) the number of concurrent requests.
+
+    Returns:
+        - a list of BulkResult, in the order of the rows
+    """
+    def edit(row):
+        etag = row[2] if len(row) > 2 else None
+        return BulkResult(row, client.edit_collaboration(client._get_id(row[0]), role=row[1], etag=etag))
+
+    return run_bulk(edit, rows, workers)
+
+
+def delete_collaborations(client, rows, workers=8):
+    """
+    Deletes many collaborations concurrently. Collaborations that no longer exist count as successes.
+
+    Args:
+        - client: a BoxClient.
+        - rows: collaboration IDs or dictionaries, or (collaboration, etag) tuples.
+        - workers: (optional) the number of concurrent requests.
+
+    Returns:
+        - a list of BulkResult, in the order of the rows
+    """
+    def delete(row):
+        collaboration, etag = row if isinstance(row, tuple) else (row, None)
+        try:
+            client.delete_collaboration(client._get_id(collaboration), etag=etag)
+        except ItemDoesNotExist:
+            return BulkResult(row, existed=True)
+        return BulkResult(row)
+
+    return run_bulk(delete, rows, workers)
+
+
+# the stages an item goes through in a DeletePipeline
+TRASHED = 'trashed'
+PURGED = 'purged'
+
+
+class DeleteCheckpoint(object):
+    """
+    Records the progress of a DeletePipeline in a sqlite database, so an interrupted run can be resumed.
+
+    Args:
+        - path: the path of the database. Created if it doesn't exist.
+        - batch_size: (optional) the number of items recorded per transaction.
+    """
+    def __init__(self, path, batch_size=100):
+        self.db = sqlite3.connect(path)
+        self.db.execute('CREATE TABLE IF NOT EXISTS progress (type TEXT, id TEXT, stage TEXT, PRIMARY KEY (type, id))')
+        self.batch_size = batch_size
+        self._pending = 0
+
+    def stage(self, item_type, item_id):
+        """
+        Returns the last stage an item reached (TRASHED or PURGED), or None
+        """
+        row = self.db.execute('SELECT stage FROM progress WHERE type = ? AND id = ?', (item_type, item_id)).fetchone()
+        return row[0] if row else None
+
+    def record(self, item_type, item_id, stage):
+        self.db.execute('INSERT OR REPLACE INTO progress VALUES (?, ?, ?)', (item_type, item_id, stage))
+        self._pending += 1
+        if self._pending >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        self.db.commit()
+        self._pending = 0
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+
+def _item_info(item):
+    """
+    Returns the (type, id, name, etag) of an item given as a dictionary, a model or a (type, id[, etag]) tuple.
+    The name of a tuple is None
+    """
+    if isinstance(item, (dict, BoxObject)):
+        return item['type'], str(item['id']), item.get('name'), item.get('etag')
+
+    item_type, item_id = item[0], item[1]
+    return item_type, str(item_id), None, item[2] if len(item) > 2 else None
+
+
+def _normalize_item(item):
+    """
+    Returns the (type, id, etag) of an item given as a dictionary, a model or a (type, id[, etag]) tuple
+    """
+    item_type, item_id, _, etag = _item_info(item)
+    return item_type, item_id, etag
+
+
+class DeletePipeline(object):
+    """
+    Deletes a stream of files & folders concurrently, and then purges them from the trash.
+
+    Folders are deleted with a single recursive call by default, which is the cheapest in api calls. With bottom_up,
+    their subtree is listed and deleted item by item instead, files first and then folders from the deepest up;
+    this takes more calls but lets a huge subtree be checkpointed and resumed item by item.
+
+    Args:
+        - client: a BoxClient.
+        - checkpoint: (optional) a DeleteCheckpoint, or the path of one. Items it records as done are skipped.
+        - workers: (optional) the number of concurrent requests.
+        - rate: (optional) the maximal number of requests per second, across all workers.
+        - purge: (optional) whether to permanently delete the items from the trash. (default=True)
+        - bottom_up: (optional) whether to delete folder subtrees item by item. (default=False)
+    """
+    def __init__(self, client, checkpoint=None, workers=8, rate=None, purge=True, bottom_up=False):
+        self.client = client
+        if isinstance(checkpoint, basestring):
+            checkpoint = DeleteCheckpoint(checkpoint)
+        self.checkpoint = checkpoint
+        self.workers = workers
+        self.rate_limiter = RateLimiter(rate) if rate else None
+        self.purge = purge
+        self.bottom_up = bottom_up
+        self.stats = {'trashed': 0, 'purged': 0, 'skipped': 0, 'failed': 0}
+
+    def _call(self, func, *args, **kwargs):
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        try:
+            func(*args, **kwargs)
+        except ItemDoesNotExist:
+            # already trashed, or already gone for good
+            pass
+
+    def _delete(self, work):
+        """
+        Moves an item through its remaining stages. Returns the last stage reached and the error that stopped it
+        """
+        (item_type, item_id, etag), stage, recursive, error = work
+        if error is not None:
+            return stage, error
+
+        try:
+            if stage is None:
+                if item_type == 'folder':
+                    self._call(self.client.delete_folder, item_id, etag=etag, recursive=recursive)
+                else:
+                    self._call(self.client.delete_file, item_id, etag=etag)
+                stage = TRASHED
+
+            if self.purge and stage == TRASHED:
+                if item_type == 'folder':
+                    self._call(self.client.delete_trashed_folder, item_id)
+                else:
+                    self._call(self.client.delete_trashed_file, item_id)
+                stage = PURGED
+        except Exception as e:
+            return stage, e
+
+        return stage, None
+
+    def _is_done(self, stage):
+        return stage == PURGED or (stage == TRASHED and not self.purge)
+
+    def _work(self, items, folders):
+        """
+        Turns the items into work for the pool, skipping finished items. Folders that are deleted bottom up are
+        expanded: their files are yielded, and their folders collected into folders, by depth.
+        """
+        for item in items:
+            item = _normalize_item(item)
+            stage = self.checkpoint.stage(item[0], item[1]) if self.checkpoint else None
+            if self._is_done(stage):
+                self.stats['skipped'] += 1
+                continue
+
+            if item[0] == 'folder' and self.bottom_up and stage is None:
+                for work in self._expand(item, folders):
+                    yield work
+            else:
+                yield item, stage, True, None
+
+    def _expand(self, folder, folders):
+        """
+        Yields the work of the files under a folder. A folder that no longer exists is taken as trashed already
+        (f.ex. by an interrupted run), and one that fails to list is reported as failed, and isn't deleted.
+        """
+        pending = [(folder, 0)]
+        while pending:
+            folder, depth = pending.pop()
+            # listed in full before anything in it is deleted, which would shift the offsets of the later pages
+            try:
+                entries = [_normalize_item(entry)
+                           for entry in self.client.get_folder_iterator(folder[1], fields=['type', 'id', 'etag'])]
+            except ItemDoesNotExist:
+                yield folder, TRASHED, False, None
+                continue
+            except Exception as e:
+                yield folder, None, False, e
+                continue
+
+            folders.setdefault(depth, []).append(folder)
+            for entry in entries:
+                if entry[0] == 'folder':
+                    pending.append((entry, depth + 1))
+                else:
+                    stage = self.checkpoint.stage(entry[0], entry[1]) if self.checkpoint else None
+                    if not self._is_done(stage):
+                        yield entry, stage, True, None
+
+    def _run(self, pool, work):
+        for (item, _, _, _), future in pool.map_unordered(self._delete, work):
+            stage, error = future.result()
+            if stage is not None and self.checkpoint is not None:
+                self.checkpoint.record(item[0], item[1], stage)
+
+            if stage is not None:
+                self.stats[stage] += 1
+            if error is not None:
+                self.stats['failed'] += 1
+
+            yield BulkResult(item, stage, error)
+
+    def run(self, items):
+        """
+        Deletes the items, which are dictionaries (as returned by the apis) or (type, id) / (type, id, etag) tuples.
+        If an etag is given, the item is only deleted if it still matches.
+
+        Yields a BulkResult per item as it completes, whose result is the last stage reached (TRASHED or PURGED).
+        The counts of the run are kept in stats.
+        """
+        folders = {}
+        try:
+            with WorkerPool(self.workers) as pool:
+                for result in self._run(pool, self._work(items, folders)):
+                    yield result
+
+                # folders deleted bottom up go last, deepest first, once they are empty
+                for depth in sorted(folders, reverse=True):
+                    work = [(folder, None, False, None) for folder in folders[depth]]
+                    for result in self._run(pool, work):
+                        yield result
+        finally:
+            if self.checkpoint is not None:
+                self.checkpoint.flush()
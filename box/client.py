@@ -2,16 +2,37 @@
 A client library for working with Box's v2 API.
 For extended specs, see: http://developers.box.com/docs/
 """
+from contextlib import contextmanager
+import copy
 from datetime import datetime
+from functools import partial
+from hashlib import sha1 as _sha1
 
 from httplib import NOT_FOUND, PRECONDITION_FAILED, CONFLICT, UNAUTHORIZED
+from importlib import import_module
 import json
+import threading
 import time
 from urllib import urlencode
 import urlparse
 
 import requests
 
+from .breaker import CircuitBreakers
+from .columnar import DEFAULT_COLUMNS, ListingColumns, fields_for_columns
+from .models import BoxObject, from_json
+from .pool import Future
+from .search import MultiSearch
+from .transport import RequestsTransport
+
+TOO_MANY_REQUESTS = 429
+
+# the number of seconds a long poll is given on top of the time the server may hold it
+LONG_POLL_MARGIN = 30
+
+# the size of the chunks files are downloaded in
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
 
 class EventFilter(object):
     """
@@ -46,14 +67,20 @@ class ShareAccess(object):
     COLLABORATORS = 'collaborators'
 
 
-def start_authenticate_v1(api_key):
+# how many seconds before their expiry v2 tokens are refreshed in the background
+DEFAULT_REFRESH_MARGIN = 5 * 60
+
+
+def start_authenticate_v1(api_key, transport=None):
     """
     Returns a url to redirect the client to. Expires after 10 minutes.
     Note that according to Box, this endpoint will cease to function after December 31st.
+    The request is sent through the given box.transport.Transport, or with requests.
     """
     from lxml import objectify
 
-    r = requests.get('https://www.box.com/api/1.0/rest?action=get_ticket&api_key=%s' % api_key)
+    transport = transport or RequestsTransport()
+    r = transport.request('get', 'https://www.box.com/api/1.0/rest?action=get_ticket&api_key=%s' % api_key)
     if not r.ok:
         raise BoxAuthenticationException(r.status_code, r.text)
 
@@ -64,10 +91,11 @@ def start_authenticate_v1(api_key):
     return 'https://www.box.com/api/1.0/auth/%s' % content.ticket
 
 
-def finish_authenticate_v1(api_key, ticket):
+def finish_authenticate_v1(api_key, ticket, transport=None):
     """
     Exchanges the ticket for an auth token. Should be called after the redirect completes.
-    Returns a dictionary with the token and some additional user info
+    Returns a dictionary with the token and some additional user info.
+    The request is sent through the given box.transport.Transport, or with requests.
 
     Examples output:
     {   'token': 'xbfe79wdedb5mxxxxxxxxxxxxxxxxxxx',
@@ -85,9 +113,10 @@ def finish_authenticate_v1(api_key, ticket):
 
     """
     from lxml import objectify
-    r = requests.get('https://www.box.com/api/1.0/rest', params={'action': 'get_auth_token',
-                                                                 'api_key': api_key,
-                                                                 'ticket': ticket})
+    transport = transport or RequestsTransport()
+    r = transport.request('get', 'https://www.box.com/api/1.0/rest', params={'action': 'get_auth_token',
+                                                                             'api_key': api_key,
+                                                                             'ticket': ticket})
     if not r.ok:
         raise BoxAuthenticationException(r.status_code, r.text)
 
@@ -133,7 +162,7 @@ def start_authenticate_v2(client_id, state=None, redirect_uri=None):
     return 'https://www.box.com/api/oauth2/authorize?' + urlencode(args)
 
 
-def finish_authenticate_v2(client_id, client_secret, code):
+def finish_authenticate_v2(client_id, client_secret, code, transport=None):
     """
     finishes the authentication flow. See http://developers.box.com/oauth/ for details.
 
@@ -141,6 +170,7 @@ def finish_authenticate_v2(client_id, client_secret, code):
         - client_id: The client_id you obtained in the initial setup.
         - client_secret: The client_secret you obtained in the initial setup.
         - code: a string containing the code, or a dictionary containing the GET query
+        - transport: (optional) the box.transport.Transport sending the request. Defaults to requests.
 
     Returns:
         - a dictionary with the token and additional info
@@ -155,10 +185,10 @@ def finish_authenticate_v2(client_id, client_secret, code):
 
     """
 
-    return _oauth2_token_request(client_id, client_secret, 'authorization_code', code=code)
+    return _oauth2_token_request(client_id, client_secret, 'authorization_code', transport, code=code)
 
 
-def refresh_v2_token(client_id, client_secret, refresh_token):
+def refresh_v2_token(client_id, client_secret, refresh_token, transport=None):
     """
     Returns a new access_token & refresh_token from an existing refresh_token
 
@@ -171,14 +201,15 @@ def refresh_v2_token(client_id, client_secret, refresh_token):
         - client_id: The client_id you obtained in the initial setup.
         - client_secret: The client_secret you obtained in the initial setup.
         - code: a string containing the code, or a dictionary containing the GET query
+        - transport: (optional) the box.transport.Transport sending the request. Defaults to requests.
 
     Returns:
         - a dictionary with the token and additional info
     """
-    return _oauth2_token_request(client_id, client_secret, 'refresh_token', refresh_token=refresh_token)
+    return _oauth2_token_request(client_id, client_secret, 'refresh_token', transport, refresh_token=refresh_token)
 
 
-def _oauth2_token_request(client_id, client_secret, grant_type, **kwargs):
+def _oauth2_token_request(client_id, client_secret, grant_type, transport=None, **kwargs):
     """
     Performs an oauth2 request against Box
     """
@@ -188,13 +219,18 @@ def _oauth2_token_request(client_id, client_secret, grant_type, **kwargs):
         'grant_type': grant_type
     }
     args.update(kwargs)
-    response = requests.post('https://www.box.com/api/oauth2/token', args)
+    transport = transport or RequestsTransport()
+    response = transport.request('post', 'https://www.box.com/api/oauth2/token', data=args)
 
     return _handle_auth_response(response)
 
 
 def _handle_auth_response(response):
-    result = response.json()
+    try:
+        result = response.json()
+    except ValueError:
+        raise BoxAuthenticationException(response.status_code, message='the token endpoint replied with non-json content',
+                                         error='invalid_response')
     if 'error' in result:
         raise BoxAuthenticationException(response.status_code, message=result.get('error_description'), error=result['error'])
     return result
@@ -215,7 +251,7 @@ class CredentialsV1(object):
     def headers(self):
         return {'Authorization': 'BoxAuth api_key={0}&auth_token={1}'.format(self._api_key, self._access_token)}
 
-    def refresh(self):
+    def refresh(self, transport=None):
         """
         V1 credentials cannot be refreshed, but doesn't expire either
 
@@ -233,50 +269,488 @@ class CredentialsV2(object):
         - client_id: The client_id you obtained in the initial setup (optional)
         - client_secret: The client_secret you obtained in the initial setup (optional)
         - refresh_call: A method that will be called when the tokens have been refreshed. Should take two arguments, access_token and refresh_token. (optional)
+        - expires_in: The number of seconds the access token is valid for, as returned by finish_authenticate_v2/refresh_v2_token (optional)
+        - refresh_margin: How many seconds before expiry the tokens should be refreshed in the background (optional)
+        - lock: A lock that is held while refreshing, f.ex. a box.FileLock to share it between processes.
+                Defaults to the lock of the store, or to a lock private to this instance. (optional)
+        - store: A box.CredentialStore shared with other instances. The tokens are read from it before every request
+                 and written to it after every refresh. If the store already holds tokens, they take precedence over
+                 the ones passed in; otherwise it is seeded with them. (optional)
+        - transport: The box.transport.Transport sending the refresh requests, unless refresh() is given another.
+                     Kept in the transport attribute. Defaults to requests. (optional)
     """
-    def __init__(self, access_token, refresh_token=None, client_id=None, client_secret=None, refresh_callback=None):
+    def __init__(self, access_token, refresh_token=None, client_id=None, client_secret=None, refresh_callback=None,
+                 expires_in=None, refresh_margin=DEFAULT_REFRESH_MARGIN, lock=None, store=None, transport=None):
         self._access_token = access_token
         self._refresh_token = refresh_token
         self._client_id = client_id
         self._client_secret = client_secret
         self._refresh_callback = refresh_callback
+        self._refresh_margin = refresh_margin
+        self._set_expiry(expires_in)
+        self._background_refresh = None
+        self._background_refresh_lock = threading.Lock()
+        self._background_refresh_failed_for = None
+        self._store = store
+        self.transport = transport
+
+        if store is not None:
+            lock = lock or store.lock()
+            if not self._load_from_store():
+                self._save_to_store()
+
+        self._refresh_lock = lock or threading.Lock()
+
+    def _load_from_store(self):
+        """
+        Replaces the tokens with the ones in the store. Returns False if the store is empty.
+        """
+        tokens = self._store.load()
+        if not tokens:
+            return False
+
+        self._access_token = tokens['access_token']
+        self._refresh_token = tokens.get('refresh_token')
+        self._expires_at = tokens.get('expires_at')
+        return True
+
+    def _save_to_store(self):
+        self._store.save({
+            'access_token': self._access_token,
+            'refresh_token': self._refresh_token,
+            'expires_at': self._expires_at,
+        })
 
     @property
     def headers(self):
-        return {'Authorization': 'Bearer {0}'.format(self._access_token)}
+        if self._store is not None:
+            self._load_from_store()
+
+        # read before a background refresh starts, which may replace it any time
+        access_token = self._access_token
+        if self._should_refresh_in_background():
+            self._start_background_refresh()
+
+        return {'Authorization': 'Bearer {0}'.format(access_token)}
+
+    def _can_refresh(self):
+        return bool(self._refresh_token and self._client_id and self._client_secret)
+
+    def _set_expiry(self, expires_in):
+        self._expires_at = time.time() + expires_in if expires_in else None
+
+    def _should_refresh_in_background(self):
+        """
+        True if the access token is about to expire and can be refreshed
+        """
+        if self._expires_at is None or not self._can_refresh():
+            return False
+
+        if self._background_refresh_failed_for == self._access_token:
+            return False
+
+        return time.time() >= self._expires_at - self._refresh_margin
+
+    def _start_background_refresh(self):
+        """
+        Starts refreshing the tokens in a background thread, unless a refresh is already running.
+        The current access token keeps being used until the refresh completes.
+        """
+        with self._background_refresh_lock:
+            if self._background_refresh is not None and self._background_refresh.is_alive():
+                return
+
+            self._background_refresh = threading.Thread(target=self._refresh_in_background)
+            self._background_refresh.daemon = True
+            self._background_refresh.start()
 
-    def refresh(self):
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception:
+            # don't retry proactively for this token; once it expires it will be refreshed after Box replies with a 401
+            self._background_refresh_failed_for = self._access_token
+
+    def refresh(self, transport=None):
         """
         Refreshes the access token based on the the refresh token, client id and secret if available.
 
+        Args:
+            - transport: (optional) the box.transport.Transport sending this refresh request. Defaults to the
+                         transport of the credentials.
+
+        Only one refresh runs at a time. Callers that arrive while a refresh is in progress wait for it to finish
+        and then use the new tokens, since Box invalidates a refresh token once it has been used.
+
         Returns True if the refresh was successful, False if the refresh could not be performed,
         and raises BoxAuthenticationException if the refresh failed
         """
-        if not self._refresh_token or not self._client_id or not self._client_secret:
+        if not self._can_refresh():
             return False
 
-        result = refresh_v2_token(self._client_id, self._client_secret, self._refresh_token)
+        access_token = self._access_token
+        with self._refresh_lock:
+            if self._store is not None:
+                self._load_from_store()
+
+            if self._access_token != access_token:
+                # refreshed by someone else (possibly another process) while we were waiting for the lock
+                return True
+
+            self._refresh(transport or self.transport)
+
+        return True
+
+    def _refresh(self, transport):
+        result = refresh_v2_token(self._client_id, self._client_secret, self._refresh_token, transport)
 
         self._access_token = result["access_token"]
         if "refresh_token" in result:
             self._refresh_token = result["refresh_token"]
+        self._set_expiry(result.get("expires_in"))
+        if self._store is not None:
+            self._save_to_store()
         if self._refresh_callback:
             self._refresh_callback(self._access_token, self._refresh_token)
 
-        return True
+
+# json modules to decode responses with, fastest first. All of them expose a json compatible loads()
+JSON_BACKENDS = ('orjson', 'ujson', 'json')
+
+
+def _load_json_backend(backend=None):
+    """
+    Returns the module used to decode responses.
+
+    Args:
+        - backend: (optional) a module name from JSON_BACKENDS, or any object with a loads() method.
+                   By default, the fastest backend that is installed is used.
+    """
+    if backend is not None and not isinstance(backend, basestring):
+        return backend
+
+    for name in [backend] if backend else JSON_BACKENDS:
+        try:
+            return __import__(name)
+        except ImportError:
+            if backend:
+                raise
+
+    return json
+
+
+# ijson backends to parse listings incrementally with, fastest first. The C ones beat decoding the whole response
+# with json.loads(), while the pure python one is only worth it for the memory it saves
+IJSON_BACKENDS = ('ijson.backends.yajl2_c', 'ijson.backends.yajl2_cffi', 'ijson')
+
+
+def _load_ijson_backend():
+    """
+    Returns the fastest ijson backend that is installed, or None if ijson isn't
+    """
+    for name in IJSON_BACKENDS:
+        try:
+            return import_module(name)
+        except ImportError:
+            pass
+
+    return None
+
+
+def _iter_json_entries(fileobj, totals, backend):
+    """
+    Incrementally parses a listing (a json object with an 'entries' array), yielding the entries one by one as
+    they are read from fileobj. Other top level scalars (f.ex. total_count) are collected into the totals dictionary.
+
+    Args:
+        - backend: an ijson backend, as returned by _load_ijson_backend().
+    """
+    from ijson.common import ObjectBuilder
+
+    builder = None
+    for prefix, event, value in backend.parse(fileobj):
+        if builder is not None:
+            builder.event(event, value)
+            if prefix == 'entries.item' and event in ('end_map', 'end_array'):
+                yield builder.value
+                builder = None
+        elif prefix == 'entries.item':
+            if event in ('start_map', 'start_array'):
+                builder = ObjectBuilder()
+                builder.event(event, value)
+            else:
+                yield value
+        elif '.' not in prefix and event not in ('start_map', 'end_map', 'start_array', 'end_array', 'map_key'):
+            totals[prefix] = value
+
+
+# the largest page each listing endpoint returns
+MAX_PAGE_SIZES = {
+    'folder_items': 1000,
+    'users': 1000,
+    'search': 200,
+    'collaborations': 1000,
+    'comments': 1000,
+    'tasks': 1000,
+}
+
+
+_deadlines = threading.local()
+
+
+@contextmanager
+def deadline(seconds):
+    """
+    Limits the time the calls made by the current thread within the block may take, all together.
+
+    Requests are sent with a timeout no longer than the time left, and once it has run out further requests (f.ex.
+    the next page of an iterator, or the next long poll) raise DeadlineExceeded instead of being sent. Deadlines nest:
+    an inner block can only shorten the time left.
+
+        with deadline(30):
+            entries = list(client.get_folder_iterator(folder_id))
+    """
+    previous = getattr(_deadlines, 'at', None)
+    at = time.time() + seconds
+    _deadlines.at = at if previous is None else min(previous, at)
+    try:
+        yield
+    finally:
+        _deadlines.at = previous
+
+
+def remaining_time():
+    """
+    Returns the number of seconds left before the deadline of the current thread, or None if there is none
+    """
+    at = getattr(_deadlines, 'at', None)
+    return None if at is None else at - time.time()
+
+
+def _deadline_passed():
+    remaining = remaining_time()
+    return remaining is not None and remaining <= 0
+
+
+def _check_deadline():
+    """
+    Raises DeadlineExceeded if the deadline of the current thread has passed. Returns the time left, or None
+    """
+    remaining = remaining_time()
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceeded(None, 'the deadline has passed')
+    return remaining
+
+
+class _HashingReader(object):
+    """
+    Wraps a fileobj, and computes the sha1 of its content as it is read, so uploads are hashed without a second
+    pass over the file.
+
+    Only data read sequentially from where the file was when wrapped is hashed: re-reading after seeking back doesn't
+    count twice.
+    """
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+        self._digest = _sha1()
+        try:
+            self._start = fileobj.tell() if hasattr(fileobj, 'tell') else 0
+        except (IOError, OSError):
+            # not seekable (a pipe or a socket): it can only be read sequentially
+            self._start = None
+        self._position = 0
+        # the number of bytes hashed, from the start
+        self.size = 0
+
+    def read(self, size=-1):
+        data = self._fileobj.read(size)
+        if self._position == self.size:
+            self._digest.update(data)
+            self.size += len(data)
+        self._position += len(data)
+        return data
+
+    def seek(self, offset, whence=0):
+        self._fileobj.seek(offset, whence)
+        if self._start is not None:
+            self._position = self._fileobj.tell() - self._start
+
+    def hexdigest(self):
+        return self._digest.hexdigest()
+
+    def __getattr__(self, name):
+        return getattr(self._fileobj, name)
+
+
+def _prefetch(fetch, **kwargs):
+    """
+    Calls fetch(**kwargs) in a background thread, under the deadline of the calling thread. Returns a Future of the
+    result
+    """
+    future = Future()
+    at = getattr(_deadlines, 'at', None)
+
+    def run():
+        _deadlines.at = at
+        try:
+            future.set_result(fetch(**kwargs))
+        except Exception as e:
+            future.set_exception(e)
+
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+    return future
+
+
+def paginate(fetch, page_size, prefetch=False):
+    """
+    Iterates over all the entries of an offset based listing, one page at a time.
+
+    Args:
+        - fetch: a function taking limit and offset keyword arguments, and returning a page of the listing (a
+                 dictionary with 'entries' and usually 'total_count'). The first page is requested without an offset.
+        - page_size: the number of entries to request per page.
+        - prefetch: (optional) if True, the next page is requested in the background while the current one is being
+                    consumed. At most two pages are held in memory either way.
+    """
+    page = fetch(limit=page_size)
+    offset = 0
+    while page['entries']:  # while the current page has entries
+        entries = page['entries']
+        next_page = None
+        if prefetch and isinstance(entries, list) and _has_more_pages(page, offset, len(entries), page_size):
+            next_page = _prefetch(fetch, limit=page_size, offset=offset + page_size)
+
+        fetched = 0
+        for entry in entries:
+            fetched += 1
+            yield entry
+
+        if not _has_more_pages(page, offset, fetched, page_size):
+            break
+
+        # otherwise, fetch the next page and repeat
+        offset += page_size
+        page = next_page.result() if next_page is not None else fetch(limit=page_size, offset=offset)
+
+
+def _endpoint_family(endpoint, resource):
+    """
+    Returns the family of endpoints a request belongs to, for its circuit breaker
+    """
+    if '/thumbnail.' in resource:
+        return 'thumbnails'
+    if resource.startswith('events'):
+        return 'events'
+    return endpoint
+
+
+def _is_service_failure(status_code):
+    """
+    Whether a response status means the service failed to handle the request, rather than refused it
+    """
+    return status_code >= 500 or status_code == TOO_MANY_REQUESTS
+
+
+def _has_more_pages(page, offset, fetched, page_size):
+    """
+    True if there are entries after the given page, which held fetched entries starting at offset
+    """
+    if fetched > page_size:
+        # the endpoint ignores paging and returned everything at once
+        return False
+
+    if 'total_count' in page:
+        # stop if 'total_count' of entries (or more) has been fetched so far
+        return offset + fetched < page['total_count']
+
+    # without a total count, only a full page may be followed by more
+    return fetched == page_size
+
+
+class _InflightRequest(object):
+    """
+    A request that concurrent identical requests wait on instead of sending their own
+    """
+    def __init__(self):
+        self._done = threading.Event()
+        self.response = None
+        self.error = None
+
+    def finish(self, response=None, error=None):
+        self.response = response
+        self.error = error
+        self._done.set()
+
+    def wait(self):
+        self._done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.response
+
+
+class _SharedResponse(object):
+    """
+    Wraps a response that is handed to several callers, so its json is decoded only once.
+    Note that all callers receive the same decoded objects.
+    """
+    def __init__(self, response, json_backend):
+        self._response = response
+        self._json_backend = json_backend
+        self._json = None
+        self._json_lock = threading.Lock()
+
+    def json(self):
+        with self._json_lock:
+            if self._json is None:
+                self._json = self._json_backend.loads(self._response.content)
+        return self._json
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
 
 
 class BoxClient(object):
 
-    def __init__(self, credentials):
+    def __init__(self, credentials, coalesce_requests=False, json_backend=None, typed_results=False,
+                 circuit_breakers=None, timeout=None, transport=None, transfer_stats=None):
         """
         Args:
             - credentials: an access_token string, or an instance of CredentialsV1/CredentialsV2
+            - coalesce_requests: (optional) if True, identical GET requests that are issued concurrently (f.ex. by
+                                 several threads asking for the same folder) are sent only once, and all the callers
+                                 share the result.
+            - json_backend: (optional) the json module used to decode responses, either a name from JSON_BACKENDS or
+                            a module. Defaults to the fastest one installed (orjson, then ujson, then json).
+            - typed_results: (optional) if True, files, folders, users, events and collaborations are returned as
+                             the compact objects from box.models rather than as dictionaries, by the getters, the
+                             listings & searches, and the calls that create, upload, copy, move or edit them.
+            - circuit_breakers: (optional) a box.breaker.CircuitBreakers (or True for one with the default settings).
+                                While the breaker of an endpoint family (api, upload, events, thumbnails) is open,
+                                requests to it raise CircuitOpen right away instead of being sent.
+            - timeout: (optional) the timeout of every request in seconds, either a number or a (connect, read)
+                       tuple. Requests don't time out by default, unless they run under a deadline().
+            - transport: (optional) the box.transport.Transport sending the requests. Defaults to requests. Also sends
+                         the refreshes of the credentials after a request is unauthorized, while background refreshes
+                         go through the transport of the credentials.
+            - transfer_stats: (optional) a box.transport.TransferStats counting the bytes received, compressed and
+                              decompressed.
         """
         if not hasattr(credentials, 'headers'):
             credentials = CredentialsV2(credentials)
 
         self.credentials = credentials
+        self.coalesce_requests = coalesce_requests
+        self.json_backend = _load_json_backend(json_backend)
+        self.typed_results = typed_results
+        self.circuit_breakers = CircuitBreakers() if circuit_breakers is True else circuit_breakers
+        self.timeout = timeout
+        self.transport = transport or RequestsTransport()
+        self.transfer_stats = transfer_stats
+        self._extra_headers = {}
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
 
     def _check_for_errors(self, response):
         if not response.ok:
@@ -285,8 +759,38 @@ class BoxClient(object):
 
     @property
     def default_headers(self):
+        if self._extra_headers:
+            headers = dict(self.credentials.headers)
+            headers.update(self._extra_headers)
+            return headers
+
         return self.credentials.headers
 
+    def as_user(self, user_id):
+        """
+        Returns a client that performs all its requests on behalf of another user of the enterprise.
+        Requires the credentials of an enterprise admin.
+
+        Args:
+            - user_id: ID or a dictionary (as returned by the apis) of the user
+        """
+        client = copy.copy(self)
+        client._extra_headers = dict(self._extra_headers)
+        client._extra_headers['As-User'] = self._get_id(user_id)
+        return client
+
+    def _refresh_credentials(self, rejected_headers):
+        """
+        Refreshes the credentials after a request made with rejected_headers was unauthorized.
+
+        Returns True if the request should be retried with the current credentials, False otherwise
+        """
+        if self.default_headers != rejected_headers:
+            # the credentials were refreshed since the request was sent
+            return True
+
+        return self.credentials.refresh(transport=self.transport)
+
     def _request(self, method, resource, params=None, data=None, headers=None, endpoint="api", try_refresh=True, **kwargs):
         """
         Performs a HTTP request to Box.
@@ -307,31 +811,202 @@ class BoxClient(object):
         if isinstance(data, dict):
             data = json.dumps(data)
 
+        auth_headers = self.default_headers
         if headers:
             headers = dict(headers)
-            headers.update(self.default_headers)
+            headers.update(auth_headers)
         else:
-            headers = self.default_headers
+            headers = auth_headers
 
         url = 'https://%s.box.com/2.0/%s' % (endpoint, resource)
 
-        response = requests.request(method, url, params=params, data=data, headers=headers, **kwargs)
+        def perform():
+            response = self._guarded(_endpoint_family(endpoint, resource), self.transport.request, method, url,
+                                     params=params, data=data, headers=headers, **kwargs)
 
-        if response.status_code == UNAUTHORIZED and try_refresh and self.credentials.refresh():
-            return self._request(method, resource, params, data, headers, try_refresh=False, **kwargs)
+            if response.status_code == UNAUTHORIZED and try_refresh and self._refresh_credentials(auth_headers):
+                return self._request(method, resource, params, data, headers, try_refresh=False, **kwargs)
 
-        self._check_for_errors(response)
+            self._check_for_errors(response)
+
+            return response
 
+        # only plain GETs are safe to share. streamed responses can only be consumed once
+        if self.coalesce_requests and method.lower() == 'get' and data is None and not kwargs:
+            key = (url, json.dumps(params, sort_keys=True), json.dumps(headers, sort_keys=True))
+            return self._coalesced(key, perform)
+
+        return perform()
+
+    def with_timeout(self, timeout):
+        """
+        Returns a client whose requests use another timeout, f.ex. for a single slow call:
+
+            client.with_timeout((5, 600)).get_events(stream_position)
+
+        Args:
+            - timeout: the timeout in seconds, either a number or a (connect, read) tuple. None disables it.
+        """
+        client = copy.copy(self)
+        client.timeout = timeout
+        return client
+
+    def _request_timeout(self):
+        """
+        Returns the timeout for a request sent now: the client's, shortened to the time left before the deadline
+        """
+        remaining = _check_deadline()
+        if remaining is None:
+            return self.timeout
+        if self.timeout is None:
+            return remaining
+        if isinstance(self.timeout, tuple):
+            return tuple(min(part, remaining) for part in self.timeout)
+        return min(self.timeout, remaining)
+
+    def _guarded(self, family, send, *args, **kwargs):
+        """
+        Sends a request through the circuit breaker of its endpoint family, if any, with the timeout in effect.
+
+        Args:
+            - family: the endpoint family, one of box.breaker.FAMILIES
+            - send: the function sending the request and returning the response, called with args and kwargs
+        """
+        if 'timeout' not in kwargs:
+            timeout = self._request_timeout()
+            if timeout is not None:
+                kwargs['timeout'] = timeout
+
+        breaker = self.circuit_breakers.get(family) if self.circuit_breakers is not None else None
+        if breaker is not None and not breaker.allow():
+            raise CircuitOpen(None, 'the {0} endpoints are failing, not sending the request'.format(family),
+                              family=family, retry_after=breaker.retry_after())
+
+        start = time.time()
+        try:
+            response = send(*args, **kwargs)
+        except requests.Timeout:
+            expired = _deadline_passed()
+            if breaker is not None:
+                breaker.record(expired, time.time() - start)
+            if expired:
+                raise DeadlineExceeded(None, 'the deadline passed while waiting for {0}'.format(family))
+            raise
+        except requests.RequestException:
+            if breaker is None:
+                raise
+            breaker.record(False, time.time() - start)
+            raise
+        except Exception:
+            # not the service's fault, but the request (or probe) is over
+            if breaker is not None:
+                breaker.record(True, time.time() - start)
+            raise
+
+        if breaker is not None:
+            breaker.record(not _is_service_failure(response.status_code), time.time() - start)
+        if self.transfer_stats is not None and not kwargs.get('stream'):
+            self.transfer_stats.record(family, response)
         return response
 
+    def _coalesced(self, key, perform):
+        """
+        Performs the request, unless an identical one is already in flight, in which case its response is returned.
+        """
+        with self._inflight_lock:
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                inflight = self._inflight[key] = _InflightRequest()
+                leader = True
+            else:
+                leader = False
+
+        if not leader:
+            return inflight.wait()
+
+        response = error = None
+        try:
+            response = _SharedResponse(perform(), self.json_backend)
+            return response
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+            inflight.finish(response, error)
+
+    def _parse_json(self, response):
+        """
+        Decodes the json body of a response
+        """
+        if isinstance(response, _SharedResponse):
+            return response.json()
+
+        return self.json_backend.loads(response.content)
+
+    def _typed(self, result):
+        """
+        Converts an api object into a model, if typed results were requested
+        """
+        if not self.typed_results:
+            return result
+
+        return from_json(result)
+
+    def _typed_listing(self, listing):
+        """
+        Converts the entries of a listing into models, if typed results were requested
+        """
+        if not self.typed_results or not listing.get('entries'):
+            return listing
+
+        return dict(listing, entries=[from_json(entry) for entry in listing['entries']])
+
+    def _iter_listing(self, resource, params, totals):
+        """
+        Requests a listing (a json object with an 'entries' array), and yields the entries as they are received
+        rather than after the whole response has been read. Other top level values of the listing, such as
+        total_count, are collected into the totals dictionary.
+
+        Falls back to decoding the whole response at once if ijson isn't installed.
+        """
+        backend = _load_ijson_backend()
+        if backend is None:
+            listing = self._parse_json(self._request("get", resource, params=params))
+            totals.update((key, value) for key, value in listing.items() if key != 'entries')
+            for entry in listing['entries'] or []:
+                yield entry
+            return
+
+        response = self._request("get", resource, params=params, stream=True)
+        response.raw.decode_content = True
+        try:
+            for entry in _iter_json_entries(response.raw, totals, backend):
+                yield entry
+        finally:
+            response.close()
+
+    @staticmethod
+    def _paging_params(limit, offset):
+        """
+        Returns the query parameters of a page, or None if no paging was requested
+        """
+        params = {}
+        if limit is not None:
+            params['limit'] = limit
+        if offset is not None:
+            params['offset'] = offset
+        return params or None
+
     @classmethod
     def _get_id(cls, identifier):
         """
         converts a an identifier to a string id
         Args:
-            - identifier: a dictionary or string or long
+            - identifier: a dictionary, model, string or long
         """
-        if isinstance(identifier, dict):
+        if isinstance(identifier, (dict, BoxObject)):
             identifier = identifier['id']
 
         return str(identifier)
@@ -346,7 +1021,7 @@ class BoxClient(object):
 
         """
         username = username or 'me'
-        return self._request("get", 'users/' + username).json()
+        return self._typed(self._parse_json(self._request("get", 'users/' + username)))
 
     def get_user_list(self, limit=100, offset=0):
         """
@@ -362,7 +1037,18 @@ class BoxClient(object):
             'offset': offset,
         }
 
-        return self._request("get", 'users/', params).json()
+        return self._typed_listing(self._parse_json(self._request("get", 'users/', params)))
+
+    def get_user_iterator(self, page_size=1000, prefetch=False):
+        """
+        Returns an iterator over all the users in an enterprise.
+
+        Args:
+            - page_size: (optional) number of users to request at a time. (default=1000, max=1000)
+            - prefetch: (optional) if True, the next page is fetched in the background while the current one is
+                        consumed.
+        """
+        return paginate(self.get_user_list, min(page_size, MAX_PAGE_SIZES['users']), prefetch=prefetch)
 
     def get_folder(self, folder_id=0, limit=100, offset=0, fields=None):
         """
@@ -383,7 +1069,7 @@ class BoxClient(object):
         if fields:
             params['fields'] = ','.join(fields)
 
-        return self._request("get", 'folders/{0}'.format(folder_id), params=params).json()
+        return self._typed(self._parse_json(self._request("get", 'folders/{0}'.format(folder_id), params=params)))
 
     def get_folder_content(self, folder_id=0, limit=100, offset=0, fields=None):
         """
@@ -404,28 +1090,68 @@ class BoxClient(object):
         if fields:
             params['fields'] = ','.join(fields)
 
-        return self._request("get", 'folders/{0}/items'.format(folder_id), params=params).json()
+        return self._typed_listing(self._parse_json(self._request("get", 'folders/{0}/items'.format(folder_id), params=params)))
 
-    def get_folder_iterator(self, folder_id):
+    def get_folder_iterator(self, folder_id, incremental=False, fields=None, page_size=1000, prefetch=False):
         """
         returns an iterator over the folder entries.
         this is equivalent of iterating over the folder pages manually
+
+        Args:
+            - folder_id: the id of the folder you wish to query.
+            - incremental: (optional) if True, entries are decoded and yielded while each page is still being
+                           downloaded, instead of after the whole page was decoded. This lowers the latency to the
+                           first entry and the peak memory use on large folders. Requires ijson.
+            - fields: (optional) Attribute(s) to include in the entries
+            - page_size: (optional) number of entries to request at a time. (default=1000, max=1000)
+            - prefetch: (optional) if True, the next page is fetched in the background while the current one is
+                        consumed.
+        """
+
+        if incremental:
+            get_folder_content = self._get_folder_content_incremental
+        else:
+            get_folder_content = self.get_folder_content
+
+        fetch = partial(get_folder_content, folder_id)
+        if fields:
+            fetch = partial(fetch, fields=fields)
+
+        return paginate(fetch, min(page_size, MAX_PAGE_SIZES['folder_items']), prefetch=prefetch)
+
+    def _get_folder_content_incremental(self, folder_id, limit=100, offset=0, fields=None):
+        """
+        Like get_folder_content, but the entries are a generator, and total_count is only known after
+        they were all consumed.
+        """
+        params = {
+            'limit': limit,
+            'offset': offset,
+        }
+
+        if fields:
+            params['fields'] = ','.join(fields)
+
+        content = {}
+        entries = self._iter_listing('folders/{0}/items'.format(folder_id), params, content)
+        content['entries'] = (self._typed(entry) for entry in entries)
+        return content
+
+    def get_folder_columns(self, folder_id, columns=DEFAULT_COLUMNS, incremental=False):
         """
+        Lists a folder into compact columns rather than one dictionary per entry. Useful for scanning and filtering
+        very large folders, f.ex. after converting the columns to NumPy arrays or to an Arrow table.
 
-        batch_size = 1000
-        content = self.get_folder_content(folder_id, limit=batch_size)
-        offset = 0
-        while content['entries']:  # while the current batch has entries
-            for entry in content['entries']:
-                yield entry
-            
-            # stop if 'total_count' of entries (or more) has been fetched so far
-            if  offset + len(content['entries']) >= content['total_count']:
-                break
-                
-            # otherwise, fetch the next batch and repeat
-            offset += batch_size
-            content = self.get_folder_content(folder_id, limit=batch_size, offset=offset)
+        Args:
+            - folder_id: the id of the folder you wish to query.
+            - columns: (optional) the fields to collect. Defaults to id, type, name, size, sha1, modified_at and parent_id.
+            - incremental: (optional) decode the entries as they are downloaded. See get_folder_iterator().
+
+        Returns:
+            - a box.columnar.ListingColumns
+        """
+        entries = self.get_folder_iterator(folder_id, incremental=incremental, fields=fields_for_columns(columns))
+        return ListingColumns.from_entries(entries, columns)
 
     def copy_folder(self, folder_id, destination_parent, new_foldername=None):
         """
@@ -452,7 +1178,33 @@ class BoxClient(object):
         if new_foldername:
             data.update({'name': new_foldername})
 
-        return self._request('post', 'folders/{0}/copy'.format(folder_id), data=data).json()
+        return self._typed(self._parse_json(self._request('post', 'folders/{0}/copy'.format(folder_id), data=data)))
+
+    def move_folder(self, folder_id, destination_parent, new_foldername=None, etag=None):
+        """
+        Moves a folder, along with its content, into another folder.
+
+        Args:
+            - folder_id: the id of the folder we want to move
+            - destination_parent: ID or a dictionary (as returned by the apis) of the target folder
+            - new_foldername: (optional) rename the folder to `new_foldername`, if provided.
+            - etag: (optional) If specified, the folder will only be moved if its etag matches the parameter
+
+        Returns:
+            - a dictionary containing the metadata of the moved folder
+        """
+        return self._move('folders', folder_id, destination_parent, new_foldername, etag)
+
+    def _move(self, resource, item_id, destination_parent, new_name, etag):
+        data = {'parent': {'id': self._get_id(destination_parent)}}
+        if new_name:
+            data['name'] = new_name
+
+        headers = {}
+        if etag:
+            headers['If-Match'] = etag
+
+        return self._typed(self._parse_json(self._request("put", '{0}/{1}'.format(resource, item_id), headers=headers, data=data)))
 
     def create_folder(self, name, parent=0):
         """
@@ -464,18 +1216,34 @@ class BoxClient(object):
         data = {"name": name,
                 'parent': {'id': self._get_id(parent)}}
 
-        return self._request("post", 'folders', data=data).json()
+        return self._typed(self._parse_json(self._request("post", 'folders', data=data)))
 
-    def get_folder_collaborations(self, folder_id):
+    def get_folder_collaborations(self, folder_id, limit=None, offset=None):
         """
         Fetches the collaborations of the given folder_id
 
         Args:
             - folder_id: the folder id.
+            - limit: (optional) number of collaborations to return. (max=1000)
+            - offset: (optional) The record at which to start
 
         Returns a list with all folder collaborations.
         """
-        return self._request("get", 'folders/{0}/collaborations'.format(folder_id)).json()
+        params = self._paging_params(limit, offset)
+        return self._typed_listing(self._parse_json(self._request("get", 'folders/{0}/collaborations'.format(folder_id), params)))
+
+    def get_folder_collaborations_iterator(self, folder_id, page_size=1000, prefetch=False):
+        """
+        Returns an iterator over the collaborations of the given folder_id
+
+        Args:
+            - folder_id: the folder id.
+            - page_size: (optional) number of collaborations to request at a time. (default=1000, max=1000)
+            - prefetch: (optional) if True, the next page is fetched in the background while the current one is
+                        consumed.
+        """
+        fetch = partial(self.get_folder_collaborations, folder_id)
+        return paginate(fetch, min(page_size, MAX_PAGE_SIZES['collaborations']), prefetch=prefetch)
 
     def get_file_metadata(self, file_id):
         """
@@ -486,25 +1254,55 @@ class BoxClient(object):
 
         Returns a dictionary with all of the file metadata.
         """
-        return self._request("get", 'files/{0}'.format(file_id)).json()
+        return self._typed(self._parse_json(self._request("get", 'files/{0}'.format(file_id))))
 
-    def get_file_comments(self, file_id):
+    def get_file_comments(self, file_id, limit=None, offset=None):
         """ Retrieves a file's associated comments
 
         Args:
             - file_id: the file id
+            - limit: (optional) number of comments to return. (max=1000)
+            - offset: (optional) The record at which to start
         Returns a list of mini formatted comments
         """
-        return self._request('get', 'files/{0}/comments'.format(file_id)).json()
+        params = self._paging_params(limit, offset)
+        return self._parse_json(self._request('get', 'files/{0}/comments'.format(file_id), params))
+
+    def get_file_comments_iterator(self, file_id, page_size=1000, prefetch=False):
+        """ Returns an iterator over a file's associated comments
+
+        Args:
+            - file_id: the file id
+            - page_size: (optional) number of comments to request at a time. (default=1000, max=1000)
+            - prefetch: (optional) if True, the next page is fetched in the background while the current one is
+                        consumed.
+        """
+        fetch = partial(self.get_file_comments, file_id)
+        return paginate(fetch, min(page_size, MAX_PAGE_SIZES['comments']), prefetch=prefetch)
 
-    def get_file_tasks(self, file_id):
+    def get_file_tasks(self, file_id, limit=None, offset=None):
         """ Retrieves a file's associated tasks
 
         Args:
             - file_id: the file id
+            - limit: (optional) number of tasks to return. (max=1000)
+            - offset: (optional) The record at which to start
         Returns a list of mini formatted tasks
         """
-        return self._request('get', 'files/{0}/tasks'.format(file_id)).json()
+        params = self._paging_params(limit, offset)
+        return self._parse_json(self._request('get', 'files/{0}/tasks'.format(file_id), params))
+
+    def get_file_tasks_iterator(self, file_id, page_size=1000, prefetch=False):
+        """ Returns an iterator over a file's associated tasks
+
+        Args:
+            - file_id: the file id
+            - page_size: (optional) number of tasks to request at a time. (default=1000, max=1000)
+            - prefetch: (optional) if True, the next page is fetched in the background while the current one is
+                        consumed.
+        """
+        fetch = partial(self.get_file_tasks, file_id)
+        return paginate(fetch, min(page_size, MAX_PAGE_SIZES['tasks']), prefetch=prefetch)
 
     def delete_file(self, file_id, etag=None):
         """
@@ -546,6 +1344,12 @@ class BoxClient(object):
         """
         self._request("delete", 'files/{0}/trash'.format(file_id))
 
+    def delete_trashed_folder(self, folder_id):
+        """
+        Permanently deletes a folder that is in the trash, along with its content.
+        """
+        self._request("delete", 'folders/{0}/trash'.format(folder_id))
+
     def download_file(self, file_id, version=None):
         """
         Downloads a file
@@ -564,6 +1368,37 @@ class BoxClient(object):
 
         return self._request("get", 'files/{0}/content'.format(file_id), params=params, stream=True)
 
+    def download_file_to(self, file_id, fileobj, version=None, sha1=None, chunk_size=DOWNLOAD_CHUNK_SIZE):
+        """
+        Downloads a file into a fileobj, hashing its content along the way. IntegrityError is raised if it doesn't
+        match the sha1 of the file.
+
+        Args:
+            - file_id: The ID of the file to download.
+            - fileobj: a file-like object to write the content to.
+            - version: (optional) The ID specific version of this file to download.
+            - sha1: (optional) the expected sha1, f.ex. from a folder listing. Otherwise the one of the current
+                    version is fetched, at the cost of a request. A specific version is only verified with a sha1.
+            - chunk_size: (optional) the number of bytes read from the network at a time.
+
+        Returns the sha1 of the content.
+        """
+        expected = sha1
+        if expected is None and version is None:
+            expected = self._parse_json(self._request("get", 'files/{0}'.format(file_id),
+                                                      params={'fields': 'sha1'}))['sha1']
+
+        digest = _sha1()
+        response = self.download_file(file_id, version=version)
+        for chunk in response.iter_content(chunk_size):
+            digest.update(chunk)
+            fileobj.write(chunk)
+
+        if expected is not None and digest.hexdigest() != expected:
+            raise IntegrityError(None, 'the download of file {0} is corrupt'.format(file_id),
+                                 expected=expected, actual=digest.hexdigest())
+        return digest.hexdigest()
+
     def get_thumbnail(self, file_id, extension="png", min_height=None, max_height=None, min_width=None, max_width=None, max_wait=0):
         """
         Downloads a file
@@ -579,6 +1414,31 @@ class BoxClient(object):
         Returns a file-like object to the file content
         """
 
+        thumbnail, ready_in_seconds = self.fetch_thumbnail(file_id, extension, min_height=min_height,
+                                                           max_height=max_height, min_width=min_width,
+                                                           max_width=max_width)
+        if ready_in_seconds is None:
+            return thumbnail
+
+        # Thumbnail not ready yet
+        if ready_in_seconds > max_wait:
+            return None
+
+        remaining = remaining_time()
+        if remaining is not None and ready_in_seconds >= remaining:
+            raise DeadlineExceeded(None, 'the thumbnail will not be ready before the deadline')
+
+        # Wait for the thumbnail to get ready
+        time.sleep(ready_in_seconds)
+
+        response = self._request("get", 'files/{0}/thumbnail.{1}'.format(file_id, extension),
+                                 params=self._thumbnail_params(min_height, max_height, min_width, max_width),
+                                 stream=True)
+        self._check_for_errors(response)
+        return response.raw
+
+    @staticmethod
+    def _thumbnail_params(min_height, max_height, min_width, max_width):
         params = {}
         if min_height is not None:
             params['min_height'] = min_height
@@ -588,29 +1448,30 @@ class BoxClient(object):
             params['min_width'] = min_width
         if max_width is not None:
             params['max_width'] = max_width
+        return params
+
+    def fetch_thumbnail(self, file_id, extension="png", min_height=None, max_height=None, min_width=None, max_width=None):
+        """
+        Requests a thumbnail once, without waiting for it to get ready. See get_thumbnail() for the arguments.
 
+        Returns:
+            - a (thumbnail, retry_after) tuple: a file-like object to the thumbnail, or None if it isn't available,
+              and the number of seconds after which to ask again if it isn't ready yet (or None if it is)
+        """
+        params = self._thumbnail_params(min_height, max_height, min_width, max_width)
         response = self._request("get", 'files/{0}/thumbnail.{1}'.format(file_id, extension), params=params, stream=True)
         if response.status_code == 202:
-            # Thumbnail not ready yet
-            ready_in_seconds = int(response.headers["Retry-After"])
-            if ready_in_seconds > max_wait:
-                return None
-
-            # Wait for the thumbnail to get ready
-            time.sleep(ready_in_seconds)
-
-            response = self._request("get", 'files/{0}/thumbnail.{1}'.format(file_id, extension), params=params, stream=True)
-            self._check_for_errors(response)
-            return response.raw
+            return None, int(response.headers["Retry-After"])
         elif response.status_code == 302:
             # No thumbnail available
-            return None
+            return None, None
         else:
-            return response.raw
+            return response.raw, None
 
     def upload_file(self, filename, fileobj, parent=0, content_created_at=None, content_modified_at=None):
         """
         Uploads a file. If the file already exists, ItemAlreadyExists is raised.
+        The content is hashed as it is sent, and IntegrityError is raised if it doesn't match the sha1 of the upload.
 
         Args:
             - filename: the filename to be used. If the file already exists, an ItemAlreadyExists exception will be
@@ -631,18 +1492,22 @@ class BoxClient(object):
         if content_created_at:
             form['content_modified_at'] = content_modified_at.isoformat() if isinstance(content_modified_at, datetime) else content_modified_at
 
+        reader = _HashingReader(fileobj)
+
         # usually Box goes with data==json, but here they want headers (as per standard http form)
-        response = requests.post('https://upload.box.com/api/2.0/files/content',
-                                 form,
+        response = self._guarded('upload', self.transport.request, 'post',
+                                 'https://upload.box.com/api/2.0/files/content',
+                                 data=form,
                                  headers=self.default_headers,
-                                 files={filename: (filename, fileobj)})
+                                 files={filename: (filename, reader)})
 
         self._check_for_errors(response)
-        return response.json()['entries'][0]
+        return self._typed(self._verify_upload(self._parse_json(response)['entries'][0], reader))
 
     def overwrite_file(self, file_id, fileobj, etag=None, content_modified_at=None):
         """
         Overwrites an existing file. The file_id must exist on the server.
+        The content is hashed as it is sent, and IntegrityError is raised if it doesn't match the sha1 of the upload.
         Args:
             - fileid: the id of an existing file.
             - fileobj: a fileobj-like object that contains the data to upload
@@ -659,13 +1524,25 @@ class BoxClient(object):
         if content_modified_at:
             form['content_modified_at'] = content_modified_at.isoformat() if isinstance(content_modified_at, datetime) else content_modified_at
 
-        response = requests.post('https://upload.box.com/api/2.0/files/{0}/content'.format(file_id),
-                                 form,
+        reader = _HashingReader(fileobj)
+        response = self._guarded('upload', self.transport.request, 'post',
+                                 'https://upload.box.com/api/2.0/files/{0}/content'.format(file_id),
+                                 data=form,
                                  headers=headers,
-                                 files={'file': fileobj})
+                                 files={'file': reader})
 
         self._check_for_errors(response)
-        return response.json()['entries'][0]
+        return self._typed(self._verify_upload(self._parse_json(response)['entries'][0], reader))
+
+    @staticmethod
+    def _verify_upload(entry, reader):
+        """
+        Compares the sha1 of an uploaded file with the one of the data sent, if it was all hashed. Returns the entry.
+        """
+        if entry.get('sha1') and entry.get('size') == reader.size and entry['sha1'] != reader.hexdigest():
+            raise IntegrityError(None, 'the upload of file {0} is corrupt'.format(entry.get('id')),
+                                 expected=reader.hexdigest(), actual=entry['sha1'])
+        return entry
 
     def copy_file(self, file_id, destination_parent, new_filename=None):
         """
@@ -685,7 +1562,22 @@ class BoxClient(object):
         if new_filename:
             data['name'] = new_filename
 
-        return self._request("post", 'files/{0}/copy'.format(file_id), data=data).json()
+        return self._typed(self._parse_json(self._request("post", 'files/{0}/copy'.format(file_id), data=data)))
+
+    def move_file(self, file_id, destination_parent, new_filename=None, etag=None):
+        """
+        Moves a file into another folder.
+
+        Args:
+            - file_id: the id of the file we want to move
+            - destination_parent: ID or a dictionary (as returned by the apis) of the target folder
+            - new_filename: (optional) rename the file to `new_filename`, if provided.
+            - etag: (optional) If specified, the file will only be moved if its etag matches the parameter
+
+        Returns:
+            - a dictionary with the file metadata
+        """
+        return self._move('files', file_id, destination_parent, new_filename, etag)
 
     def share_link(self, file_id, access=ShareAccess.OPEN, expire_at=None, can_download=None, can_preview=None):
         """
@@ -729,7 +1621,7 @@ class BoxClient(object):
         if expire_at:
             data['unshared_at'] = expire_at.isoformat()
 
-        result = self._request("put", 'files/{0}'.format(file_id), data={'shared_link': data}).json()
+        result = self._parse_json(self._request("put", 'files/{0}'.format(file_id), data={'shared_link': data}))
         return result['shared_link']
 
     def get_events(self, stream_position='0', stream_type=EventFilter.ALL, limit=1000):
@@ -753,7 +1645,7 @@ class BoxClient(object):
             'limit': limit
         }
 
-        return self._request("get", 'events', params).json()
+        return self._typed_listing(self._parse_json(self._request("get", 'events', params)))
 
     def long_poll_for_events(self, stream_position=None, stream_type=EventFilter.ALL):
         """
@@ -776,20 +1668,36 @@ class BoxClient(object):
 
             query['stream_position'] = stream_position
             query['stream_type'] = stream_type
-            response = requests.get(url, params=query)
+            response = self._guarded('events', self.transport.request, 'get', url, params=query,
+                                     **self._long_poll_timeout(poll_data.get('retry_timeout')))
             self._check_for_errors(response)
-            result = response.json()
+            result = self._parse_json(response)
 
             if result['message'] in ['new_message', 'new_change']:
                 return stream_position
 
+    def _long_poll_timeout(self, retry_timeout):
+        """
+        Returns the timeout argument of a long poll: the server holds it open for up to retry_timeout seconds,
+        which the read timeout of the client must not cut short
+        """
+        if self.timeout is None or retry_timeout is None:
+            return {}
+
+        connect, read = self.timeout if isinstance(self.timeout, tuple) else (self.timeout, self.timeout)
+        timeout = (connect, max(read, retry_timeout + LONG_POLL_MARGIN))
+        remaining = _check_deadline()
+        if remaining is not None:
+            timeout = tuple(min(part, remaining) for part in timeout)
+        return {'timeout': timeout}
+
     def _get_long_poll_data(self):
         """
         Returns the information about the endpoint that will handle the actual long poll request.
         See http://developers.box.com/using-long-polling-to-monitor-events/ for details.
         """
 
-        result = self._request('options', "events").json()
+        result = self._parse_json(self._request('options', "events"))
         return result['entries'][0]
 
     @staticmethod
@@ -816,7 +1724,7 @@ class BoxClient(object):
             - comment_id: the comment id
         Returns a full comment object
         """
-        return self._request('get', 'comments/{0}'.format(comment_id)).json()
+        return self._parse_json(self._request('get', 'comments/{0}'.format(comment_id)))
 
     def add_comment(self, id, type, message):
         """ Add a comment to the given file or comment
@@ -832,7 +1740,7 @@ class BoxClient(object):
         item = {"type": type, "id": id}
 
         data = {'item': item, 'message': message}
-        return self._request('post', 'comments', data=data).json()
+        return self._parse_json(self._request('post', 'comments', data=data))
 
     def change_comment(self, comment_id, message):
         """ Change a comment's message
@@ -844,7 +1752,7 @@ class BoxClient(object):
         Returns the modified comment full object
         """
         data = {'message': message}
-        return self._request('put', 'comments/{0}'.format(comment_id), data=data).json()
+        return self._parse_json(self._request('put', 'comments/{0}'.format(comment_id), data=data))
 
     def delete_comment(self, comment_id):
         """ Delete a given comment from box
@@ -862,7 +1770,7 @@ class BoxClient(object):
             - task_id: the task id
         Returns a full task object
         """
-        return self._request('get', 'tasks/{0}'.format(task_id)).json()
+        return self._parse_json(self._request('get', 'tasks/{0}'.format(task_id)))
 
     def add_task(self, file_id, due_at, action='review', message=None):
         """ Add a task to the given file
@@ -883,7 +1791,7 @@ class BoxClient(object):
             'due_at': str(due_at),
             'message': message,
         }
-        return self._request('post', 'tasks', data=data).json()
+        return self._parse_json(self._request('post', 'tasks', data=data))
 
     def change_task(self, task_id, due_at, action='review', message=None):
         """ Change a task
@@ -904,7 +1812,7 @@ class BoxClient(object):
         if message:
             data['message'] = message
 
-        return self._request('put', 'tasks/{0}'.format(task_id), data=data).json()
+        return self._parse_json(self._request('put', 'tasks/{0}'.format(task_id), data=data))
 
     def delete_task(self, task_id):
         """ Delete a given task from box
@@ -923,7 +1831,7 @@ class BoxClient(object):
 
         Returns the list of the task assignments (mini formatted)
         """
-        return self._request('get', 'tasks/{0}/assignments'.format(task_id)).json()
+        return self._parse_json(self._request('get', 'tasks/{0}/assignments'.format(task_id)))
 
     def get_assignment(self, assignment_id):
         """ Retrieves a given assignment information
@@ -934,7 +1842,7 @@ class BoxClient(object):
         Returns an assignment full object
         """
 
-        return self._request('get', 'task_assignments/{0}'.format(assignment_id)).json()
+        return self._parse_json(self._request('get', 'task_assignments/{0}'.format(assignment_id)))
 
     def assign_task(self, task_id, user_id=None, login=None):
         """ Assign the given task to a user
@@ -956,7 +1864,7 @@ class BoxClient(object):
 
         data = {'task': task, 'assign_to': assign_to}
 
-        return self._request('post', 'task_assignments', data=data).json()
+        return self._parse_json(self._request('post', 'task_assignments', data=data))
 
     def update_assignment(self, assignment_id, resolution_state, message=None):
         """ Update a task assignment state
@@ -974,7 +1882,7 @@ class BoxClient(object):
         if message:
             data['message'] = message
 
-        return self._request('put', 'task_assignments/{0}'.format(assignment_id), data=data).json()
+        return self._parse_json(self._request('put', 'task_assignments/{0}'.format(assignment_id), data=data))
 
     def delete_assignment(self, assignment_id):
         """ Delete the given assignment
@@ -1002,7 +1910,37 @@ class BoxClient(object):
             'offset': offset,
         }
 
-        return self._request("get", 'search', params).json()
+        return self._typed_listing(self._parse_json(self._request("get", 'search', params)))
+
+    def search_iterator(self, query, page_size=200, prefetch=False):
+        """
+        Returns an iterator over all the search results of a query.
+
+        Args:
+            - query: The string to search for. See search().
+            - page_size: (optional) number of results to request at a time. (default=200, max=200)
+            - prefetch: (optional) if True, the next page is fetched in the background while the current one is
+                        consumed.
+        """
+        fetch = partial(self.search, query)
+        return paginate(fetch, min(page_size, MAX_PAGE_SIZES['search']), prefetch=prefetch)
+
+    def search_many(self, queries, workers=8, page_size=200, max_results=None):
+        """
+        Runs many queries concurrently, paging through each of them in parallel.
+
+        Args:
+            - queries: the strings to search for. See search().
+            - workers: (optional) the number of concurrent requests.
+            - page_size: (optional) number of items to request at a time. (default=200, max=200)
+            - max_results: (optional) the number of results to fetch per query. Unlimited by default.
+
+        Returns:
+            - an iterable of box.search.SearchHit, each holding an item and the queries that matched it.
+              Every item is yielded once, as soon as the first query matching it returns it. The queries that
+              failed are in its errors attribute once the iteration is over.
+        """
+        return MultiSearch(self, queries, workers=workers, page_size=page_size, max_results=max_results)
 
     def get_collaboration(self, collaboration_id):
         """
@@ -1013,7 +1951,7 @@ class BoxClient(object):
 
         Returns a dictionary with all of the collaboration data.
         """
-        return self._request("get", 'collaborations/{0}'.format(collaboration_id)).json()
+        return self._typed(self._parse_json(self._request("get", 'collaborations/{0}'.format(collaboration_id))))
 
     def create_collaboration_by_user_id(self, folder_id, user_id, role=CollaboratorRole.VIEWER, notify=False):
         """
@@ -1035,7 +1973,7 @@ class BoxClient(object):
             'accessible_by': {'id': user_id, 'type': 'user'},
             'role': role,
         }
-        return self._request('post', 'collaborations', params, data=data).json()
+        return self._typed(self._parse_json(self._request('post', 'collaborations', params, data=data)))
 
     def create_collaboration_by_login(self, folder_id, login, role=CollaboratorRole.VIEWER, notify=False):
         """
@@ -1057,7 +1995,7 @@ class BoxClient(object):
             'accessible_by': {'login': login, 'type': 'user'},
             'role': role,
         }
-        return self._request('post', 'collaborations', params, data=data).json()
+        return self._typed(self._parse_json(self._request('post', 'collaborations', params, data=data)))
 
     def edit_collaboration(self, collaboration_id, role=CollaboratorRole.VIEWER, etag=None):
         """
@@ -1077,7 +2015,7 @@ class BoxClient(object):
         data = {
             'role': role,
         }
-        return self._request('put', 'collaborations/{0}'.format(collaboration_id), headers=headers, data=data).json()
+        return self._typed(self._parse_json(self._request('put', 'collaborations/{0}'.format(collaboration_id), headers=headers, data=data)))
 
     def delete_collaboration(self, collaboration_id, etag=None):
         """
@@ -1104,6 +2042,35 @@ class BoxClientException(Exception):
         self.__dict__.update(kwargs)
 
 
+class IntegrityError(BoxClientException):
+    """
+    Raised when the content of a transferred file doesn't match its sha1.
+
+    Attributes:
+        - expected: the sha1 the content should have had.
+        - actual: the sha1 it had.
+    """
+    pass
+
+
+class DeadlineExceeded(BoxClientException):
+    """
+    Raised when a call runs out of the time left before the deadline of its thread. See deadline().
+    """
+    pass
+
+
+class CircuitOpen(BoxClientException):
+    """
+    Raised instead of sending a request while the circuit breaker of its endpoints is open.
+
+    Attributes:
+        - family: the endpoint family.
+        - retry_after: the number of seconds until the breaker lets probe requests through.
+    """
+    pass
+
+
 class ItemAlreadyExists(BoxClientException):
     pass
 
@@ -0,0 +1,136 @@
+"""
+Columnar representation of folder listings, for scanning & filtering very large inventories.
+
+Instead of one dictionary per entry, every selected field is stored in its own compact column: numeric fields in
+arrays of machine integers, and text fields in lists of (interned) strings. The columns can be converted to NumPy
+arrays for vectorized processing, or to an Arrow table / Parquet file.
+"""
+from array import array
+
+try:
+    array('q')
+    _INT64 = 'q'
+except ValueError:
+    # python 2 has no explicit 64 bit typecode. 'l' is 64 bits wide on all 64 bit platforms but Windows
+    _INT64 = 'l'
+
+DEFAULT_COLUMNS = ('id', 'type', 'name', 'size', 'sha1', 'modified_at', 'parent_id')
+
+# columns holding integers. missing values are stored as -1
+INTEGER_COLUMNS = frozenset(['id', 'size', 'parent_id', 'sequence_id', 'comment_count'])
+
+# columns with few distinct values, which are interned to share the strings between rows
+INTERNED_COLUMNS = frozenset(['type', 'item_status', 'extension'])
+
+# the api field each column is read from, if named differently
+COLUMN_FIELDS = {
+    'parent_id': 'parent',
+}
+
+MISSING = -1
+
+
+def fields_for_columns(columns):
+    """
+    Returns the api fields that have to be requested in order to fill the given columns
+    """
+    return [COLUMN_FIELDS.get(column, column) for column in columns]
+
+
+def _read_column(entry, column):
+    if column == 'parent_id':
+        parent = entry.get('parent')
+        return parent['id'] if parent else None
+
+    return entry.get(column)
+
+
+class ListingColumns(object):
+    """
+    The entries of a listing, stored column by column.
+
+    Args:
+        - columns: (optional) the names of the columns to collect. Defaults to DEFAULT_COLUMNS.
+    """
+    def __init__(self, columns=DEFAULT_COLUMNS):
+        self.columns = tuple(columns)
+        self._data = {}
+        # the unicode values of interned columns, which intern() doesn't take, shared through this table instead
+        self._shared = {}
+        for column in self.columns:
+            self._data[column] = array(_INT64) if column in INTEGER_COLUMNS else []
+
+    @classmethod
+    def from_entries(cls, entries, columns=DEFAULT_COLUMNS):
+        """
+        Collects the given entries (dictionaries or box.models objects) into columns
+        """
+        result = cls(columns)
+        result.extend(entries)
+        return result
+
+    def append(self, entry):
+        for column in self.columns:
+            value = _read_column(entry, column)
+            if column in INTEGER_COLUMNS:
+                value = MISSING if value is None else int(value)
+            elif column in INTERNED_COLUMNS and value is not None:
+                if isinstance(value, unicode):
+                    value = self._shared.setdefault(value, value)
+                else:
+                    value = intern(str(value))
+            self._data[column].append(value)
+
+    def extend(self, entries):
+        for entry in entries:
+            self.append(entry)
+
+    def __len__(self):
+        return len(self._data[self.columns[0]]) if self.columns else 0
+
+    def __getitem__(self, column):
+        """
+        Returns a column: an array.array for integer columns, a list otherwise
+        """
+        return self._data[column]
+
+    def to_numpy(self):
+        """
+        Returns a dictionary of NumPy arrays, one per column. Integer columns are converted without copying.
+        Requires numpy.
+        """
+        import numpy
+
+        result = {}
+        for column in self.columns:
+            values = self._data[column]
+            if column in INTEGER_COLUMNS:
+                result[column] = numpy.frombuffer(values, dtype=numpy.int64) if len(values) else numpy.zeros(0, numpy.int64)
+            else:
+                result[column] = numpy.array(values, dtype=object)
+        return result
+
+    def to_arrow(self):
+        """
+        Returns the columns as a pyarrow Table. Missing integers become nulls.
+        Requires pyarrow.
+        """
+        import pyarrow
+
+        arrays = []
+        for column in self.columns:
+            values = self._data[column]
+            if column in INTEGER_COLUMNS:
+                arrays.append(pyarrow.array([None if value == MISSING else value for value in values], type=pyarrow.int64()))
+            else:
+                arrays.append(pyarrow.array(values, type=pyarrow.string()))
+        return pyarrow.Table.from_arrays(arrays, names=list(self.columns))
+
+    def to_parquet(self, path, **kwargs):
+        """
+        Writes the columns to a Parquet file. Any additional arguments are passed to pyarrow.parquet.write_table.
+        Requires pyarrow.
+        """
+        import pyarrow.parquet
+
+        pyarrow.parquet.write_table(self.to_arrow(), path, **kwargs)
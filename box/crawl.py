@@ -0,0 +1,168 @@
+"""
+Crawling huge folder trees on a pool of processes.
+
+Listing a folder is mostly spent decoding json and transforming its entries, which holds the GIL, so a crawl on
+threads is bound to a single core. Here every process lists folders with a client of its own: the parent hands out
+the ids of the folders to list through a shared queue, and the processes stream compact records back, so crawls scale
+with the number of cores.
+"""
+import multiprocessing
+from Queue import Empty
+
+from .client import ItemDoesNotExist
+
+# the fields requested for every entry by default
+CRAWL_FIELDS = ['type', 'id', 'name', 'size', 'sha1']
+
+
+def _join_path(parent_path, name):
+    return parent_path.rstrip('/') + '/' + name
+
+
+def compact_record(entry, path):
+    """
+    The default record of an entry: a (type, id, path, size, sha1) tuple
+    """
+    return entry['type'], entry['id'], path, entry.get('size'), entry.get('sha1')
+
+
+class CrawlFailed(Exception):
+    """
+    Raised when a crawling process couldn't create its client or died, leaving the crawl incomplete
+    """
+
+
+def _crawl_worker(client_factory, transform, fields, batch_size, tasks, results):
+    """
+    The loop of a crawling process: lists the folders it is handed until it gets None.
+
+    Every folder is reported as one or more (folder_id, records, subfolders, error, done) messages, the last of which
+    is done. Subfolders are (folder_id, path) tuples, to be listed next. A process that fails to create its client
+    reports it with a folder_id of None, and exits.
+    """
+    try:
+        client = client_factory()
+    except Exception as e:
+        results.put((None, [], [], 'creating a client: {0}: {1}'.format(type(e).__name__, e), True))
+        return
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+
+        folder_id, folder_path = task
+        records = []
+        subfolders = []
+        try:
+            for entry in client.get_folder_iterator(folder_id, fields=fields, prefetch=True):
+                path = _join_path(folder_path, entry['name'])
+                if entry['type'] == 'folder':
+                    subfolders.append((entry['id'], path))
+
+                record = transform(entry, path)
+                if record is not None:
+                    records.append(record)
+
+                if len(records) >= batch_size:
+                    results.put((folder_id, records, subfolders, None, False))
+                    records = []
+                    subfolders = []
+        except ItemDoesNotExist:
+            # deleted since its parent was listed
+            pass
+        except Exception as e:
+            results.put((folder_id, records, subfolders, '{0}: {1}'.format(type(e).__name__, e), True))
+            continue
+
+        results.put((folder_id, records, subfolders, None, True))
+
+
+class Crawl(object):
+    """
+    Lists a whole folder tree on a pool of processes, and streams a record per item.
+
+    Args:
+        - client_factory: a callable returning a BoxClient, called once in every process. It has to be picklable
+                          (f.ex. a module level function) where processes aren't forked.
+        - transform: (optional) a function of an entry and its path that returns the record to stream back, or None
+                     to skip the entry. Runs in the crawling processes, so it should be picklable too. Defaults to
+                     compact_record().
+        - processes: (optional) the number of crawling processes. Defaults to the number of cores.
+        - fields: (optional) the fields requested for every entry. Has to include type, id and name.
+        - batch_size: (optional) the number of records sent back to the parent at a time.
+        - poll_interval: (optional) the number of seconds between checks that the crawling processes are alive,
+                         while waiting for their records.
+
+    Attributes:
+        - errors: (folder_id, message) tuples of the folders that failed to list, once the crawl is over.
+    """
+    def __init__(self, client_factory, transform=compact_record, processes=None, fields=CRAWL_FIELDS,
+                 batch_size=500, poll_interval=1):
+        self.client_factory = client_factory
+        self.transform = transform
+        self.processes = processes or multiprocessing.cpu_count()
+        self.fields = fields
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.errors = []
+
+    def run(self, folder_id='0', path=''):
+        """
+        Yields the records of every item under a folder, in no particular order.
+
+        Raises CrawlFailed if a crawling process fails to create its client, or dies halfway.
+
+        Args:
+            - folder_id: (optional) the folder to crawl. Defaults to the root folder.
+            - path: (optional) the path of the folder, which the paths of the items are relative to.
+        """
+        tasks = multiprocessing.Queue()
+        results = multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=_crawl_worker,
+                                           args=(self.client_factory, self.transform, self.fields, self.batch_size,
+                                                 tasks, results))
+                   for _ in range(self.processes)]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+
+        self.errors = []
+        tasks.put((str(folder_id), path))
+        pending = 1
+        try:
+            while pending:
+                try:
+                    folder_id, records, subfolders, error, done = results.get(timeout=self.poll_interval)
+                except Empty:
+                    for worker in workers:
+                        if not worker.is_alive():
+                            # whatever it was listing is lost
+                            raise CrawlFailed('crawling process {0} exited with {1}'.format(worker.pid,
+                                                                                            worker.exitcode))
+                    continue
+
+                if folder_id is None:
+                    raise CrawlFailed(error)
+
+                for subfolder in subfolders:
+                    tasks.put(subfolder)
+                pending += len(subfolders)
+
+                for record in records:
+                    yield record
+
+                if error is not None:
+                    self.errors.append((folder_id, error))
+                if done:
+                    pending -= 1
+        finally:
+            if pending:
+                # abandoned halfway: the remaining folders aren't worth listing
+                for worker in workers:
+                    worker.terminate()
+            else:
+                for _ in workers:
+                    tasks.put(None)
+            for worker in workers:
+                worker.join()
@@ -0,0 +1,295 @@
+"""
+Processing the event stream with parallel handlers.
+
+Events are partitioned by the item they are about, and every partition is handled by a thread of its own: the events
+of an item are handled one after the other, in the order of the stream, while different items are handled in
+parallel. The stream position is committed once every event before it was handled, so a restarted pipeline resumes
+without skipping any event (some may be handled twice).
+
+Bursts of events about the same item can also be compacted into their net effect before being dispatched, so that
+f.ex. a file created, uploaded three times and moved is handled once, as an upsert at its final location.
+"""
+from collections import deque
+from Queue import Queue
+import sys
+import threading
+import time
+
+from .client import EventFilter, EventType
+from .models import BoxObject
+
+
+class NetEffect(object):
+    """
+    What a compacted item event amounts to
+    """
+    # the item exists, with the metadata & location of its source
+    UPSERT = 'upsert'
+    TRASH = 'trash'
+
+
+# the events compacted into their net effect. others are passed through, and break the sequences they interrupt
+_COMPACTED_EVENTS = frozenset([EventType.ITEM_CREATE, EventType.ITEM_UPLOAD, EventType.ITEM_MOVE, EventType.ITEM_COPY,
+                               EventType.ITEM_TRASH])
+
+
+def _partition_key(event):
+    """
+    The item an event is about, or the event itself if it has no item
+    """
+    source = event.get('source') or {}
+    return source.get('id') or event.get('event_id')
+
+
+def _merge(events):
+    """
+    Returns the last of a sequence of events about an item, annotated with their net effect and the events merged
+    """
+    last = events[-1]
+    net_effect = NetEffect.TRASH if last['event_type'] == EventType.ITEM_TRASH else NetEffect.UPSERT
+    merged = dict(last.to_dict() if isinstance(last, BoxObject) else last, net_effect=net_effect,
+                  merged_event_ids=[event.get('event_id') for event in events])
+    return type(last)(merged) if isinstance(last, BoxObject) else merged
+
+
+def compact_events(events):
+    """
+    Merges the sequences of create, upload, move, copy & trash events about an item into a single event carrying
+    their net effect: the last event of the sequence, with a 'net_effect' (a value from ``NetEffect``) and the
+    'merged_event_ids'. Any other event about the item ends its current sequence.
+
+    Returns the events left, in the order of the stream: a merged event takes the place of the last of its events.
+    """
+    slots = list(events)
+    # (type, id) of an item -> the indexes of its current sequence
+    sequences = {}
+
+    def close(key):
+        indexes = sequences.pop(key, None)
+        if indexes:
+            slots[indexes[-1]] = _merge([slots[index] for index in indexes])
+            for index in indexes[:-1]:
+                slots[index] = None
+
+    for index, event in enumerate(slots):
+        source = event.get('source') or {}
+        if not source.get('id'):
+            continue
+
+        key = (source.get('type'), source.get('id'))
+        if event.get('event_type') in _COMPACTED_EVENTS:
+            sequences.setdefault(key, []).append(index)
+        else:
+            close(key)
+
+    for key in list(sequences):
+        close(key)
+
+    return [event for event in slots if event is not None]
+
+
+class _Batch(object):
+    """
+    The events of a call to get_events, and the stream position after them
+    """
+    __slots__ = ('stream_position', 'remaining')
+
+    def __init__(self, stream_position, remaining):
+        self.stream_position = stream_position
+        self.remaining = remaining
+
+
+class EventPipeline(object):
+    """
+    Fetches events and dispatches them to a handler running on a pool of threads.
+
+    Args:
+        - client: a BoxClient.
+        - handler: a function called with every event.
+        - stream_position: (optional) where to start reading the events from. Defaults to 'now'.
+        - commit: (optional) a function called with the stream position up to which every event was handled, to
+                  persist it. Called on the thread running the pipeline.
+        - stream_type: (optional) a value from ``EventFilter``.
+        - workers: (optional) the number of threads handling events.
+        - max_pending: (optional) the number of events fetched but not handled yet. Once reached, fetching waits
+                       for the handlers to catch up.
+        - batch_size: (optional) the number of events fetched at a time (max=1000).
+        - compact: (optional) if True, the events of every batch are compacted with compact_events() before being
+                   dispatched, so handlers get the net effect of each sequence of item events.
+        - compact_window: (optional) with compact, the number of seconds during which consecutive batches are
+                          fetched & compacted together, up to max_pending events, as long as the stream has more.
+                          This lets compaction see through the bursts of events of heavy editing.
+
+    Attributes:
+        - stream_position: the last committed stream position.
+        - handled: the number of events handled so far.
+        - compacted: the number of events merged into others by compaction so far.
+    """
+    def __init__(self, client, handler, stream_position='now', commit=None, stream_type=EventFilter.ALL, workers=8,
+                 max_pending=2000, batch_size=1000, compact=False, compact_window=None):
+        self.client = client
+        self.handler = handler
+        self.stream_position = stream_position
+        self.commit = commit
+        self.stream_type = stream_type
+        self.workers = workers
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.compact = compact
+        self.compact_window = compact_window
+        self.handled = 0
+        self.compacted = 0
+        self._stopping = threading.Event()
+
+    def stop(self):
+        """
+        Makes run() return once the events fetched so far are handled. Doesn't interrupt a long poll in progress.
+        """
+        self._stopping.set()
+
+    def run(self, wait=True):
+        """
+        Fetches & handles events until stop() is called or a handler fails, in which case its error is raised once
+        the other events in flight are handled (except those of the same item). The stream position of a batch that
+        had a failed event isn't committed.
+
+        Args:
+            - wait: (optional) if False, returns once every event up to now is handled, rather than waiting for more.
+
+        Returns the last committed stream position.
+        """
+        self._stopping.clear()
+        self._error = None
+        self._failed_items = set()
+        self._batches = deque()
+        self._in_flight = 0
+        self._progress = threading.Condition()
+        self._slots = threading.Semaphore(self.max_pending)
+
+        partitions = [Queue() for _ in range(self.workers)]
+        threads = [threading.Thread(target=self._work, args=(partition,)) for partition in partitions]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        try:
+            self._fetch(partitions, wait)
+
+            with self._progress:
+                while self._in_flight:
+                    self._progress.wait()
+            self._commit_handled()
+        finally:
+            for partition in partitions:
+                partition.put(None)
+
+        if self._error is not None:
+            raise self._error
+        return self.stream_position
+
+    def _fetch(self, partitions, wait):
+        position = self.stream_position
+        if position is None or position == 'now':
+            cursor = self.client.get_events(stream_position='now', stream_type=self.stream_type)
+            position = cursor['next_stream_position']
+            self._commit(position)
+
+        while not self._stopping.is_set():
+            events, position = self._next_batch(position)
+
+            batch = _Batch(position, len(events))
+            with self._progress:
+                self._batches.append(batch)
+
+            for event in events:
+                # blocks while max_pending events wait for the handlers
+                self._slots.acquire()
+                if self._stopping.is_set():
+                    self._slots.release()
+                    return
+                with self._progress:
+                    self._in_flight += 1
+                key = _partition_key(event)
+                partitions[hash(key) % len(partitions)].put((batch, key, event))
+                self._commit_handled()
+
+            self._commit_handled()
+            if not events:
+                if not wait:
+                    return
+                self.client.long_poll_for_events(position, stream_type=self.stream_type)
+
+    def _next_batch(self, position):
+        """
+        Fetches the next events, compacted if asked to. Returns them with the stream position after them.
+        """
+        chunk = self.client.get_events(stream_position=position, stream_type=self.stream_type, limit=self.batch_size)
+        events = chunk['entries']
+        position = chunk['next_stream_position']
+        if not self.compact:
+            return events, position
+
+        events = list(events)
+
+        if self.compact_window:
+            window_end = time.time() + self.compact_window
+            more = bool(events)
+            while more and len(events) < self.max_pending and time.time() < window_end:
+                chunk = self.client.get_events(stream_position=position, stream_type=self.stream_type,
+                                               limit=self.batch_size)
+                events.extend(chunk['entries'])
+                position = chunk['next_stream_position']
+                more = bool(chunk['entries'])
+
+        compacted = compact_events(events)
+        self.compacted += len(events) - len(compacted)
+        return compacted, position
+
+    def _work(self, partition):
+        while True:
+            task = partition.get()
+            if task is None:
+                return
+
+            batch, key, event = task
+            # the events following a failed one on the same item are left for the next run, to keep their order
+            if key not in self._failed_items:
+                try:
+                    self.handler(event)
+                except Exception:
+                    self._fail(key, sys.exc_info()[1])
+                else:
+                    with self._progress:
+                        batch.remaining -= 1
+                        self.handled += 1
+
+            self._slots.release()
+            with self._progress:
+                self._in_flight -= 1
+                self._progress.notify_all()
+
+    def _fail(self, key, error):
+        with self._progress:
+            self._failed_items.add(key)
+            if self._error is None:
+                self._error = error
+        self._stopping.set()
+
+    def _commit_handled(self):
+        """
+        Commits the position after the batches whose events were all handled, in the order they were fetched
+        """
+        position = None
+        with self._progress:
+            while self._batches and self._batches[0].remaining == 0:
+                position = self._batches.popleft().stream_position
+
+        if position is not None:
+            self._commit(position)
+
+    def _commit(self, position):
+        if position == self.stream_position:
+            return
+        self.stream_position = position
+        if self.commit is not None:
+            self.commit(position)
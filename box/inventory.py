@@ -0,0 +1,339 @@
+"""
+Offline inventory of an enterprise: every user's files, folders and collaborations in a local sqlite database.
+Items are recorded once per user they are visible to, with their path as seen by that user.
+
+The inventory is built by a concurrent crawl of all the users' folder trees, and can then be kept up to date from the
+users' event streams, so audits can query it locally rather than against the api.
+"""
+from Queue import Queue
+import sqlite3
+
+from .client import EventType, ItemDoesNotExist
+from .pool import WorkerPool
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS items (
+    user_id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    id TEXT NOT NULL,
+    parent_id TEXT,
+    name TEXT,
+    path TEXT,
+    size INTEGER,
+    sha1 TEXT,
+    etag TEXT,
+    modified_at TEXT,
+    PRIMARY KEY (user_id, type, id)
+);
+CREATE INDEX IF NOT EXISTS items_id ON items (id);
+CREATE INDEX IF NOT EXISTS items_parent ON items (parent_id);
+CREATE INDEX IF NOT EXISTS items_path ON items (user_id, path);
+CREATE INDEX IF NOT EXISTS items_sha1 ON items (sha1);
+
+CREATE TABLE IF NOT EXISTS collaborations (
+    id TEXT PRIMARY KEY,
+    folder_id TEXT NOT NULL,
+    accessible_by_type TEXT,
+    accessible_by_id TEXT,
+    accessible_by_login TEXT,
+    role TEXT,
+    status TEXT
+);
+CREATE INDEX IF NOT EXISTS collaborations_folder ON collaborations (folder_id);
+CREATE INDEX IF NOT EXISTS collaborations_accessible_by ON collaborations (accessible_by_id);
+
+CREATE TABLE IF NOT EXISTS stream_positions (
+    user_id TEXT PRIMARY KEY,
+    stream_position TEXT NOT NULL
+);
+'''
+
+# the fields requested for every item
+ITEM_FIELDS = ['type', 'id', 'name', 'size', 'sha1', 'etag', 'modified_at', 'parent', 'has_collaborations']
+
+# events after which their source item exists, with possibly new metadata or location
+_UPSERT_EVENTS = frozenset([EventType.ITEM_CREATE, EventType.ITEM_UPLOAD, EventType.ITEM_MOVE, EventType.ITEM_COPY])
+
+
+def _join_path(parent_path, name):
+    return parent_path.rstrip('/') + '/' + name
+
+
+def _path_of_item(item):
+    """
+    The path of an item with a path_collection, like BoxClient.get_path_of_file()
+    """
+    parts = [entry['name'].strip('/') for entry in item['path_collection']['entries'][1:]]
+    parts.append(item['name'])
+    return '/' + '/'.join(parts)
+
+
+class Inventory(object):
+    """
+    A sqlite snapshot of the items & collaborations of an enterprise.
+
+    Args:
+        - client: a BoxClient with enterprise admin credentials.
+        - path: the path of the sqlite database. Created if it doesn't exist.
+        - workers: (optional) the number of concurrent api requests.
+        - batch_size: (optional) the number of rows written per transaction.
+
+    Attributes:
+        - errors: the errors of the users whose last crawl or refresh failed, by user id.
+    """
+    def __init__(self, client, path, workers=8, batch_size=1000):
+        self.client = client
+        self.path = path
+        self.workers = workers
+        self.batch_size = batch_size
+        self.errors = {}
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def query(self, sql, params=()):
+        """
+        Runs a query against the inventory and returns all the rows
+        """
+        return self.db.execute(sql, params).fetchall()
+
+    def crawl(self, user_ids=None):
+        """
+        Lists the whole folder tree of every user, replacing what the inventory held about them.
+
+        The new items of a user are staged until their whole tree is listed, and only then replace the old ones, so
+        a user whose crawl fails (f.ex. deactivated) keeps their previous snapshot, and the others are crawled anyway.
+
+        The event stream position of each user is recorded before their tree is listed, so that refresh() later
+        picks up every change made during or after the crawl.
+
+        Args:
+            - user_ids: (optional) the users to crawl. Defaults to every user of the enterprise.
+
+        Returns the errors of the users whose crawl failed, as a dictionary of user id -> exception. Also kept in
+        the errors attribute.
+        """
+        if user_ids is None:
+            user_ids = [user['id'] for user in self.client.get_user_iterator()]
+
+        self.errors = {}
+        writer = _BatchWriter(self.db, self.batch_size)
+        writer.execute('CREATE TEMP TABLE IF NOT EXISTS crawled_items AS SELECT * FROM items WHERE 0', ())
+        writer.execute('DELETE FROM crawled_items', ())
+        results = Queue()
+        # user id -> the number of their requests in flight
+        pending = {}
+        stream_positions = {}
+        pool = WorkerPool(self.workers)
+
+        def submit(user_id, func, *args):
+            pending[user_id] = pending.get(user_id, 0) + 1
+            pool.submit(func, user_id, *args).add_done_callback(lambda future: results.put((user_id, future)))
+
+        try:
+            for user_id in user_ids:
+                submit(str(user_id), self._start_user)
+
+            while pending:
+                user_id, future = results.get()
+                pending[user_id] -= 1
+
+                if user_id not in self.errors:
+                    try:
+                        kind, payload = future.result()
+                    except Exception as e:
+                        self.errors[user_id] = e
+                    else:
+                        if kind == 'user':
+                            stream_positions[user_id] = payload
+                            submit(user_id, self._list_folder, '0', '')
+
+                        elif kind == 'folder':
+                            folder_path, entries = payload
+                            for entry in entries:
+                                path = _join_path(folder_path, entry['name'])
+                                writer.insert_item(entry, user_id, path, table='crawled_items')
+                                if entry['type'] == 'folder':
+                                    submit(user_id, self._list_folder, entry['id'], path)
+                                    if entry.get('has_collaborations'):
+                                        submit(user_id, self._list_collaborations, entry['id'])
+
+                        elif kind == 'collaborations':
+                            folder_id, collaborations = payload
+                            writer.execute('DELETE FROM collaborations WHERE folder_id = ?', (folder_id,))
+                            for collaboration in collaborations:
+                                writer.insert_collaboration(folder_id, collaboration)
+
+                if not pending[user_id]:
+                    del pending[user_id]
+                    if user_id in self.errors:
+                        writer.execute('DELETE FROM crawled_items WHERE user_id = ?', (user_id,))
+                    else:
+                        writer.replace_user_items(user_id, stream_positions[user_id])
+        finally:
+            pool.shutdown(wait=False)
+            writer.flush()
+
+        return self.errors
+
+    def _start_user(self, user_id):
+        events = self.client.as_user(user_id).get_events(stream_position='now')
+        return 'user', str(events['next_stream_position'])
+
+    def _list_folder(self, user_id, folder_id, path):
+        client = self.client.as_user(user_id)
+        try:
+            entries = list(client.get_folder_iterator(folder_id, fields=ITEM_FIELDS))
+        except ItemDoesNotExist:
+            # deleted since its parent was listed
+            entries = []
+        return 'folder', (path, entries)
+
+    def _list_collaborations(self, user_id, folder_id):
+        collaborations = list(self.client.as_user(user_id).get_folder_collaborations_iterator(folder_id))
+        return 'collaborations', (folder_id, collaborations)
+
+    def refresh(self):
+        """
+        Applies the item events that happened since the last crawl or refresh, for every crawled user.
+
+        The events are applied & committed a chunk at a time, along with the stream position after them. Users whose
+        events fail to be fetched (f.ex. deactivated) are left where they were, and the others refreshed anyway.
+
+        Returns the number of events applied. The errors of the users whose refresh failed are kept in the errors
+        attribute.
+        """
+        positions = self.query('SELECT user_id, stream_position FROM stream_positions')
+        self.errors = {}
+        writer = _BatchWriter(self.db, self.batch_size)
+        results = Queue()
+        pending = [0]
+        applied = 0
+        pool = WorkerPool(self.workers)
+
+        def submit(user_id, stream_position):
+            pending[0] += 1
+            future = pool.submit(self._fetch_events, user_id, stream_position)
+            future.add_done_callback(lambda future: results.put((user_id, future)))
+
+        try:
+            for user_id, stream_position in positions:
+                submit(user_id, stream_position)
+
+            while pending[0]:
+                user_id, future = results.get()
+                pending[0] -= 1
+                try:
+                    events, stream_position, more = future.result()
+                except Exception as e:
+                    self.errors[user_id] = e
+                    continue
+
+                for event in events:
+                    applied += self._apply_event(writer, user_id, event)
+                writer.execute('UPDATE stream_positions SET stream_position = ? WHERE user_id = ?',
+                               (stream_position, user_id))
+                writer.flush()
+                if more:
+                    submit(user_id, stream_position)
+        finally:
+            pool.shutdown(wait=False)
+            writer.flush()
+
+        return applied
+
+    def _fetch_events(self, user_id, stream_position):
+        """
+        Returns a chunk of a user's events since stream_position, the position after them, and whether more follow
+        """
+        chunk = self.client.as_user(user_id).get_events(stream_position=stream_position)
+        return chunk['entries'], str(chunk['next_stream_position']), chunk['chunk_size'] >= 1000
+
+    def _apply_event(self, writer, user_id, event):
+        source = event.get('source')
+        if not source or source.get('type') not in ('file', 'folder'):
+            return 0
+
+        if event['event_type'] == EventType.ITEM_TRASH:
+            writer.delete_item(source, user_id)
+            return 1
+
+        if event['event_type'] in _UPSERT_EVENTS and 'path_collection' in source:
+            path = _path_of_item(source)
+            writer.move_descendants(source, user_id, path)
+            writer.insert_item(source, user_id, path)
+            return 1
+
+        return 0
+
+
+class _BatchWriter(object):
+    """
+    Buffers writes to the inventory and commits them in batched transactions
+    """
+    def __init__(self, db, batch_size):
+        self.db = db
+        self.batch_size = batch_size
+        self.pending = 0
+
+    def execute(self, sql, params):
+        self.db.execute(sql, params)
+        self.pending += 1
+        if self.pending >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        self.db.commit()
+        self.pending = 0
+
+    def insert_item(self, item, user_id, path, table='items'):
+        parent = item.get('parent')
+        self.execute('INSERT OR REPLACE INTO {0} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'.format(table),
+                     (user_id, item['type'], item['id'], parent['id'] if parent else None, item.get('name'), path,
+                      item.get('size'), item.get('sha1'), item.get('etag'), item.get('modified_at')))
+
+    def replace_user_items(self, user_id, stream_position):
+        """
+        Swaps the items of a user for those staged by a crawl, in a single transaction
+        """
+        self.flush()
+        self.db.execute('DELETE FROM items WHERE user_id = ?', (user_id,))
+        self.db.execute('INSERT OR REPLACE INTO items SELECT * FROM crawled_items WHERE user_id = ?', (user_id,))
+        self.db.execute('DELETE FROM crawled_items WHERE user_id = ?', (user_id,))
+        self.db.execute('INSERT OR REPLACE INTO stream_positions VALUES (?, ?)', (user_id, stream_position))
+        self.flush()
+
+    def _path(self, item, user_id):
+        row = self.db.execute('SELECT path FROM items WHERE user_id = ? AND type = ? AND id = ?',
+                              (user_id, item['type'], item['id'])).fetchone()
+        return row[0] if row else None
+
+    def delete_item(self, item, user_id):
+        path = self._path(item, user_id)
+        self.execute('DELETE FROM items WHERE user_id = ? AND type = ? AND id = ?', (user_id, item['type'], item['id']))
+        if path is not None and item['type'] == 'folder':
+            self.execute('DELETE FROM items WHERE user_id = ? AND substr(path, 1, ?) = ?',
+                         (user_id, len(path) + 1, path + '/'))
+            self.execute('DELETE FROM collaborations WHERE folder_id = ?', (item['id'],))
+
+    def move_descendants(self, folder, user_id, new_path):
+        """
+        Rewrites the paths of everything under a folder that may have moved or been renamed
+        """
+        if folder['type'] != 'folder':
+            return
+
+        path = self._path(folder, user_id)
+        if path is None or path == new_path:
+            return
+
+        self.execute('UPDATE items SET path = ? || substr(path, ?) WHERE user_id = ? AND substr(path, 1, ?) = ?',
+                     (new_path, len(path) + 1, user_id, len(path) + 1, path + '/'))
+
+    def insert_collaboration(self, folder_id, collaboration):
+        accessible_by = collaboration.get('accessible_by') or {}
+        self.execute('INSERT OR REPLACE INTO collaborations VALUES (?, ?, ?, ?, ?, ?, ?)',
+                     (collaboration['id'], folder_id, accessible_by.get('type'), accessible_by.get('id'),
+                      accessible_by.get('login'), collaboration.get('role'), collaboration.get('status')))
@@ -0,0 +1,57 @@
+"""
+Locks that can be used to coordinate token refreshes between threads and processes.
+"""
+import os
+import threading
+
+
+class FileLock(object):
+    """
+    An exclusive lock backed by a lock file, which is shared by every thread & process that uses the same path.
+
+    Can be passed as the lock of CredentialsV2 to make sure only a single worker refreshes the tokens at a time.
+    Only available on platforms that support fcntl.
+
+    Args:
+        - path: the path of the lock file. It is created if it doesn't exist.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._fd = None
+
+    def acquire(self):
+        import fcntl
+
+        # flock() doesn't serialize threads sharing this object's descriptor, hence the thread lock
+        self._thread_lock.acquire()
+        try:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            except BaseException:
+                os.close(fd)
+                raise
+        except BaseException:
+            self._thread_lock.release()
+            raise
+
+        self._fd = fd
+        return True
+
+    def release(self):
+        import fcntl
+
+        fd, self._fd = self._fd, None
+        try:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+            self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
@@ -0,0 +1,237 @@
+"""
+Server-side copying & moving of many items at once, for restructuring an account.
+
+Every folder in a migration is copied or moved with a single call that takes its whole subtree along. Only when a
+folder collides with an existing folder of the same name, and the migration merges them, is the folder broken down
+into its children, which are then migrated the same way.
+"""
+import json
+import posixpath
+from Queue import Queue
+
+from .bulk import BulkResult, _item_info
+from .client import ItemAlreadyExists
+from .pool import WorkerPool
+
+# the number of alternative names tried for an item before giving up on a conflict
+MAX_RENAMES = 100
+
+# the fields listed when a folder is merged
+_CHILD_FIELDS = ['type', 'id', 'name', 'etag']
+
+
+class MigrationMode(object):
+    COPY = 'copy'
+    MOVE = 'move'
+
+
+class OnConflict(object):
+    """
+    What to do with an item whose name is already taken in its destination
+    """
+    FAIL = 'fail'
+    SKIP = 'skip'
+    RENAME = 'rename'
+    # folders are merged into the existing folder, other items are renamed
+    MERGE = 'merge'
+
+
+def _numbered_name(name, number):
+    """
+    Returns the name with a number appended before its extension, like 'report (2).pdf'
+    """
+    root, extension = posixpath.splitext(name)
+    return '{0} ({1}){2}'.format(root, number, extension)
+
+
+def _conflicting_item(error):
+    """
+    Returns the existing item reported in the body of an ItemAlreadyExists, if any
+    """
+    try:
+        conflicts = json.loads(error.message)['context_info']['conflicts']
+    except (TypeError, ValueError, KeyError):
+        return None
+
+    if isinstance(conflicts, list):
+        return conflicts[0] if conflicts else None
+    return conflicts
+
+
+class _Task(object):
+    """
+    An item to migrate into a destination folder. Merged folders track their children, which are tasks of their own
+    """
+    __slots__ = ('row', 'type', 'id', 'name', 'etag', 'destination_id', 'parent', 'remaining', 'error', 'result')
+
+    def __init__(self, row, item, destination_id, parent=None):
+        self.row = row
+        self.type, self.id, self.name, self.etag = _item_info(item)
+        self.destination_id = destination_id
+        self.parent = parent
+        self.remaining = 0
+        self.error = None
+        self.result = None
+
+
+class Migration(object):
+    """
+    Copies or moves many items, each into its own destination folder, running the operations concurrently.
+
+    Args:
+        - client: a BoxClient.
+        - mapping: a dictionary, or (source, destination) pairs. Sources are dictionaries (as returned by the apis)
+                   or (type, id) / (type, id, etag) tuples, and destinations IDs or dictionaries of folders.
+        - mode: (optional) a value of MigrationMode. (default=MigrationMode.COPY)
+        - on_conflict: (optional) a value of OnConflict. (default=OnConflict.FAIL)
+        - workers: (optional) the number of concurrent requests.
+    """
+    def __init__(self, client, mapping, mode=MigrationMode.COPY, on_conflict=OnConflict.FAIL, workers=8):
+        self.client = client
+        if isinstance(mapping, dict):
+            mapping = mapping.items()
+        self.mapping = mapping
+        self.mode = mode
+        self.on_conflict = on_conflict
+        self.workers = workers
+        self.stats = {'migrated': 0, 'renamed': 0, 'skipped': 0, 'merged': 0, 'failed': 0}
+
+    def _migrate(self, task, name=None):
+        if self.mode == MigrationMode.MOVE:
+            if task.type == 'folder':
+                return self.client.move_folder(task.id, task.destination_id, new_foldername=name, etag=task.etag)
+            return self.client.move_file(task.id, task.destination_id, new_filename=name, etag=task.etag)
+
+        if task.type == 'folder':
+            return self.client.copy_folder(task.id, task.destination_id, new_foldername=name)
+        return self.client.copy_file(task.id, task.destination_id, new_filename=name)
+
+    def _name_of(self, task):
+        if task.name is None:
+            if task.type == 'folder':
+                task.name = self.client.get_folder(task.id, fields=['name'])['name']
+            else:
+                task.name = self.client.get_file_metadata(task.id)['name']
+        return task.name
+
+    def _find_existing(self, task, error):
+        """
+        Returns the item that already holds the name of task in its destination
+        """
+        existing = _conflicting_item(error)
+        if existing is not None:
+            return existing
+
+        name = self._name_of(task)
+        for entry in self.client.get_folder_iterator(task.destination_id, fields=_CHILD_FIELDS):
+            if entry['name'] == name:
+                return entry
+
+    def _run_task(self, task):
+        """
+        Runs on the pool. Returns what became of the task, and the resulting item (or the folder's children, when
+        it is merged)
+        """
+        if task.result is not None:
+            # a merged folder that was moved, whose children all moved out of it
+            self.client.delete_folder(task.id, recursive=False)
+            return 'merged', task.result
+
+        try:
+            return 'migrated', self._migrate(task)
+        except ItemAlreadyExists as e:
+            conflict = e
+
+        if self.on_conflict == OnConflict.SKIP:
+            return 'skipped', _conflicting_item(conflict)
+
+        if self.on_conflict == OnConflict.MERGE and task.type == 'folder':
+            existing = self._find_existing(task, conflict)
+            if existing is not None and existing['type'] == 'folder':
+                task.result = existing
+                return 'merge', list(self.client.get_folder_iterator(task.id, fields=_CHILD_FIELDS))
+
+        if self.on_conflict in (OnConflict.RENAME, OnConflict.MERGE):
+            name = self._name_of(task)
+            for number in range(1, MAX_RENAMES + 1):
+                try:
+                    return 'renamed', self._migrate(task, _numbered_name(name, number))
+                except ItemAlreadyExists:
+                    pass
+
+        raise conflict
+
+    def run(self):
+        """
+        Migrates the items. Yields a BulkResult per item as it completes, whose result is the copied or moved item.
+        Items skipped because of a conflict, or merged into an existing folder, are marked as existed. The children
+        of merged folders are reported as well, with (child, destination folder) rows.
+
+        The counts of the run are kept in stats.
+        """
+        results = Queue()
+        pending = [0]
+        pool = WorkerPool(self.workers)
+
+        def submit(task):
+            pending[0] += 1
+            pool.submit(self._run_task, task).add_done_callback(lambda future: results.put((task, future)))
+
+        try:
+            for source, destination in self.mapping:
+                submit(_Task((source, destination), source, self.client._get_id(destination)))
+
+            while pending[0]:
+                task, future = results.get()
+                pending[0] -= 1
+
+                error = future.exception()
+                if error is not None:
+                    completed = self._complete(task, submit, error=error)
+                else:
+                    outcome, payload = future.result()
+                    if outcome == 'merge':
+                        task.remaining = len(payload)
+                        for child in payload:
+                            submit(_Task((child, task.result['id']), child, task.result['id'], parent=task))
+                        completed = [] if payload else self._merged(task, submit)
+                    else:
+                        completed = self._complete(task, submit, outcome, payload)
+
+                for result in completed:
+                    yield result
+        finally:
+            pool.shutdown(wait=False)
+
+    def _merged(self, task, submit):
+        """
+        Called once all the children of a merged folder are done. Returns the BulkResults to report
+        """
+        if self.mode == MigrationMode.MOVE and task.error is None:
+            # the source folder was emptied into the existing one, and is deleted before it is reported
+            submit(task)
+            return []
+
+        return self._complete(task, submit, 'merged', task.result, task.error)
+
+    def _complete(self, task, submit, outcome=None, result=None, error=None):
+        """
+        Records the outcome of a task, and of the merged folder it may have been the last child of.
+        Returns the BulkResults to report
+        """
+        if error is not None:
+            self.stats['failed'] += 1
+            completed = [BulkResult(task.row, error=error)]
+        else:
+            self.stats[outcome] += 1
+            completed = [BulkResult(task.row, result, existed=outcome in ('skipped', 'merged'))]
+
+        parent = task.parent
+        if parent is not None:
+            parent.remaining -= 1
+            if parent.error is None:
+                parent.error = error
+            if not parent.remaining:
+                completed.extend(self._merged(parent, submit))
+
+        return completed
@@ -0,0 +1,380 @@
+"""
+Two-way mirroring of a local directory with a Box folder.
+
+The state of every file at the end of the last sync (its remote ID, etag & sha1, and its local size & mtime) is kept
+in a sqlite database. On the next sync, only local files whose size or mtime changed are hashed, and a file is
+transferred only if its content changed on one side since then. Remote changes are written with the etag of the
+last sync in If-Match, so a change made on Box in the meantime is reported as a conflict rather than overwritten.
+
+Only files are mirrored: folders are created as needed, but empty folders aren't mirrored, and deleted folders are
+deleted file by file.
+"""
+from hashlib import sha1
+import os
+import sqlite3
+import tempfile
+
+from .client import ItemAlreadyExists, ItemDoesNotExist, PreconditionFailed
+from .pool import WorkerPool
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    file_id TEXT NOT NULL,
+    etag TEXT,
+    sha1 TEXT,
+    size INTEGER,
+    mtime REAL
+);
+'''
+
+# local files whose names start with this are the mirror's own, and aren't mirrored
+STATE_PREFIX = '.boxmirror'
+
+CHUNK_SIZE = 1024 * 1024
+
+# the fields requested when listing the remote folder
+REMOTE_FIELDS = ['type', 'id', 'name', 'etag', 'sha1', 'size']
+
+
+def _join_path(parent, name):
+    return parent + '/' + name if parent else name
+
+
+def _file_sha1(path):
+    digest = sha1()
+    with open(path, 'rb') as fileobj:
+        for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), ''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _stat(path):
+    """
+    Returns the (size, mtime) of a local file, or None if it doesn't exist
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime
+
+
+class _Conflict(Exception):
+    pass
+
+
+class SyncReport(object):
+    """
+    What a sync did. All paths are relative to the mirrored directories, with '/' separators.
+
+    Attributes:
+        - uploaded, downloaded, deleted_local, deleted_remote: the paths of the files.
+        - conflicts: (path, reason) tuples of files that changed on both sides, and were left untouched.
+        - errors: (path, exception) tuples of files that couldn't be hashed, and of transfers that failed.
+    """
+    def __init__(self):
+        self.uploaded = []
+        self.downloaded = []
+        self.deleted_local = []
+        self.deleted_remote = []
+        self.conflicts = []
+        self.errors = []
+
+    @property
+    def changed(self):
+        """
+        The number of files transferred or deleted
+        """
+        return len(self.uploaded) + len(self.downloaded) + len(self.deleted_local) + len(self.deleted_remote)
+
+    def __repr__(self):
+        return '<SyncReport {0} changed, {1} conflicts, {2} errors>'.format(self.changed, len(self.conflicts),
+                                                                            len(self.errors))
+
+
+class Mirror(object):
+    """
+    Keeps a local directory and a Box folder in sync, in both directions.
+
+    Args:
+        - client: a BoxClient.
+        - local_root: the local directory.
+        - folder_id: the ID of the Box folder.
+        - state_path: (optional) the path of the state database. Defaults to a file in local_root, which isn't mirrored.
+        - workers: (optional) the number of concurrent transfers.
+        - propagate_deletes: (optional) whether files deleted on one side are deleted on the other. (default=True)
+    """
+    def __init__(self, client, local_root, folder_id, state_path=None, workers=8, propagate_deletes=True):
+        self.client = client
+        self.local_root = os.path.abspath(local_root)
+        self.folder_id = client._get_id(folder_id)
+        self.workers = workers
+        self.propagate_deletes = propagate_deletes
+        self.db = sqlite3.connect(state_path or os.path.join(self.local_root, STATE_PREFIX + '.db'))
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def _local_path(self, path):
+        return os.path.join(self.local_root, *path.split('/'))
+
+    def _load_state(self):
+        state = {}
+        for row in self.db.execute('SELECT path, file_id, etag, sha1, size, mtime FROM files'):
+            state[row[0]] = row[1:]
+        return state
+
+    def _scan_local(self):
+        """
+        Returns the (size, mtime) of every local file, by path
+        """
+        files = {}
+        for directory, dirnames, filenames in os.walk(self.local_root):
+            relative = os.path.relpath(directory, self.local_root)
+            relative = '' if relative == '.' else relative.replace(os.sep, '/')
+            for name in filenames:
+                if name.startswith(STATE_PREFIX):
+                    continue
+                path = _join_path(relative, name)
+                stat = _stat(os.path.join(directory, name))
+                if stat is not None:
+                    files[path] = stat
+        return files
+
+    def _scan_remote(self, pool):
+        """
+        Lists the remote tree level by level, listing the folders of each level concurrently.
+        Returns the entries of the files and the IDs of the folders, by path
+        """
+        files = {}
+        folders = {'': self.folder_id}
+        level = [('', self.folder_id)]
+
+        def list_folder(folder):
+            return list(self.client.get_folder_iterator(folder[1], fields=REMOTE_FIELDS))
+
+        while level:
+            next_level = []
+            for (parent, _), future in pool.map_unordered(list_folder, level):
+                for entry in future.result():
+                    path = _join_path(parent, entry['name'])
+                    if entry['type'] == 'folder':
+                        folders[path] = entry['id']
+                        next_level.append((path, entry['id']))
+                    elif entry['type'] == 'file':
+                        files[path] = entry
+            level = next_level
+
+        return files, folders
+
+    def _hash_changed(self, pool, local, state, report):
+        """
+        Returns the sha1 of the local files that are new or whose size or mtime changed since the last sync.
+        The files that couldn't be read are recorded in the report's errors, and left without a sha1.
+        """
+        changed = [path for path, stat in local.items() if path not in state or tuple(state[path][3:]) != stat]
+        hashes = {}
+        for path, future in pool.map_unordered(lambda path: _file_sha1(self._local_path(path)), changed):
+            try:
+                hashes[path] = future.result()
+            except Exception as e:
+                report.errors.append((path, e))
+        return hashes
+
+    def _plan(self, local, hashes, remote, state, skip=()):
+        """
+        Decides what to do with every path but those to skip. Returns (action, path) tuples
+        """
+        actions = []
+        for path in set(local) | set(remote) | set(state):
+            if path in skip:
+                continue
+            in_local, in_remote, synced = local.get(path), remote.get(path), state.get(path)
+
+            local_sha1 = hashes.get(path, synced[2] if synced else None) if in_local is not None else None
+            local_changed = in_local is not None and (synced is None or local_sha1 != synced[2])
+            remote_changed = in_remote is not None and (synced is None or in_remote.get('sha1') != synced[2])
+
+            if in_local is not None and in_remote is not None:
+                if local_sha1 == in_remote.get('sha1'):
+                    action = 'record'
+                elif local_changed and remote_changed:
+                    action = 'conflict'
+                elif local_changed:
+                    action = 'overwrite'
+                elif remote_changed:
+                    action = 'download'
+                else:
+                    action = 'record'
+            elif in_local is not None:
+                if synced is None:
+                    action = 'upload'
+                elif local_changed:
+                    action = 'conflict' if self.propagate_deletes else 'upload'
+                else:
+                    action = 'delete_local' if self.propagate_deletes else 'upload'
+            elif in_remote is not None:
+                if synced is None:
+                    action = 'download'
+                elif remote_changed:
+                    action = 'conflict' if self.propagate_deletes else 'download'
+                else:
+                    action = 'delete_remote' if self.propagate_deletes else 'download'
+            else:
+                action = 'forget'
+
+            if action == 'record' and synced is not None and in_remote is not None and \
+                    (synced[1], tuple(synced[3:])) == (in_remote.get('etag'), in_local):
+                # nothing changed at all
+                continue
+
+            actions.append((action, path))
+        return actions
+
+    def sync(self):
+        """
+        Brings both sides up to date with each other's changes since the last sync.
+
+        Returns:
+            - a SyncReport
+        """
+        report = SyncReport()
+        state = self._load_state()
+
+        with WorkerPool(self.workers) as pool:
+            remote, folders = self._scan_remote(pool)
+            local = self._scan_local()
+            hashes = self._hash_changed(pool, local, state, report)
+            # files that changed but couldn't be hashed are left alone until the next sync
+            actions = self._plan(local, hashes, remote, state, skip=set(path for path, _ in report.errors))
+
+            transfers = []
+            for action, path in actions:
+                if action == 'conflict':
+                    report.conflicts.append((path, 'changed on both sides'))
+                elif action == 'forget':
+                    self.db.execute('DELETE FROM files WHERE path = ?', (path,))
+                elif action == 'record':
+                    entry = remote[path]
+                    self._record(path, entry['id'], entry.get('etag'), entry.get('sha1'), local[path])
+                else:
+                    if action == 'upload':
+                        self._create_remote_folders(path, folders)
+                    transfers.append((action, path, local.get(path), remote.get(path), state.get(path),
+                                      hashes.get(path)))
+
+            def work(transfer):
+                return getattr(self, '_' + transfer[0])(*transfer[1:], folders=folders)
+
+            for transfer, future in pool.map_unordered(work, transfers):
+                action, path = transfer[:2]
+                try:
+                    result = future.result()
+                except _Conflict as e:
+                    report.conflicts.append((path, e.args[0]))
+                    continue
+                except Exception as e:
+                    report.errors.append((path, e))
+                    continue
+
+                if result is None:
+                    self.db.execute('DELETE FROM files WHERE path = ?', (path,))
+                else:
+                    self._record(path, *result)
+                getattr(report, {'upload': 'uploaded', 'overwrite': 'uploaded', 'download': 'downloaded',
+                                 'delete_local': 'deleted_local', 'delete_remote': 'deleted_remote'}[action]).append(path)
+
+        self.db.commit()
+        return report
+
+    def _record(self, path, file_id, etag, sha1, stat):
+        self.db.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)',
+                        (path, file_id, etag, sha1, stat[0], stat[1]))
+
+    def _create_remote_folders(self, path, folders):
+        """
+        Creates the remote parents of path that don't exist yet
+        """
+        parts = path.split('/')[:-1]
+        for depth in range(len(parts)):
+            folder_path = '/'.join(parts[:depth + 1])
+            if folder_path in folders:
+                continue
+
+            parent_id = folders['/'.join(parts[:depth])]
+            try:
+                folders[folder_path] = self.client.create_folder(parts[depth], parent_id)['id']
+            except ItemAlreadyExists:
+                # created since the remote tree was listed
+                for entry in self.client.get_folder_iterator(parent_id, fields=REMOTE_FIELDS):
+                    if entry['type'] == 'folder' and entry['name'] == parts[depth]:
+                        folders[folder_path] = entry['id']
+                        break
+                else:
+                    raise
+
+    # the transfers, which run on the pool. each returns the new state of the file, or None if it's gone
+
+    def _upload(self, path, local, remote, synced, local_sha1, folders):
+        parent, _, name = path.rpartition('/')
+        with open(self._local_path(path), 'rb') as fileobj:
+            try:
+                entry = self.client.upload_file(name, fileobj, parent=folders[parent])
+            except ItemAlreadyExists:
+                raise _Conflict('created remotely since the sync started')
+        return entry['id'], entry.get('etag'), local_sha1 or entry.get('sha1'), local
+
+    def _overwrite(self, path, local, remote, synced, local_sha1, folders):
+        etag = synced[1] if synced else remote.get('etag')
+        with open(self._local_path(path), 'rb') as fileobj:
+            try:
+                entry = self.client.overwrite_file(remote['id'], fileobj, etag=etag)
+            except (PreconditionFailed, ItemDoesNotExist):
+                raise _Conflict('changed remotely since the sync started')
+        return entry['id'], entry.get('etag'), local_sha1 or entry.get('sha1'), local
+
+    def _download(self, path, local, remote, synced, local_sha1, folders):
+        full_path = self._local_path(path)
+        directory = os.path.dirname(full_path)
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                if not os.path.isdir(directory):
+                    raise
+
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=STATE_PREFIX)
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                try:
+                    digest = self.client.download_file_to(remote['id'], temp, sha1=remote.get('sha1'),
+                                                          chunk_size=CHUNK_SIZE)
+                except ItemDoesNotExist:
+                    raise _Conflict('deleted remotely since the sync started')
+
+            if _stat(full_path) != local:
+                raise _Conflict('changed locally since the sync started')
+            os.rename(temp_path, full_path)
+        except Exception:
+            os.remove(temp_path)
+            raise
+
+        return remote['id'], remote.get('etag'), digest, _stat(full_path)
+
+    def _delete_local(self, path, local, remote, synced, local_sha1, folders):
+        full_path = self._local_path(path)
+        if _stat(full_path) != local:
+            raise _Conflict('changed locally since the sync started')
+        os.remove(full_path)
+        return None
+
+    def _delete_remote(self, path, local, remote, synced, local_sha1, folders):
+        try:
+            self.client.delete_file(synced[0], etag=synced[1])
+        except PreconditionFailed:
+            raise _Conflict('changed remotely since the sync started')
+        except ItemDoesNotExist:
+            pass
+        return None
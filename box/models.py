@@ -0,0 +1,223 @@
+"""
+Typed, memory efficient representations of the objects returned by the Box API.
+
+The objects use __slots__ instead of a per-instance dictionary, and nested sections (f.ex. path_collection or
+created_by) are kept as they were received until they are first accessed. They can be used both through attributes
+(file.name) and like the dictionaries the api returns (file['name']), so they work anywhere a dictionary does,
+including BoxClient._get_id() and BoxClient.get_path_of_file().
+"""
+
+_MISSING = object()
+
+# maps the 'type' of api objects to the class representing them
+MODELS = {}
+
+
+def from_json(data):
+    """
+    Converts decoded json into models: dictionaries with a known 'type' become instances of the matching model,
+    and lists & other dictionaries are converted recursively.
+    """
+    if isinstance(data, dict):
+        model = MODELS.get(data.get('type'))
+        if model is not None:
+            return model(data)
+        return dict((key, from_json(value)) for key, value in data.items())
+
+    if isinstance(data, list):
+        return [from_json(value) for value in data]
+
+    return data
+
+
+class _Nested(object):
+    """
+    A field holding a nested section, which is converted with from_json() on first access
+    """
+    def __init__(self, name, bit):
+        self.name = name
+        self.slot = '_' + name
+        self.bit = bit
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+
+        value = getattr(instance, self.slot)
+        if not instance._decoded & self.bit:
+            value = from_json(value)
+            setattr(instance, self.slot, value)
+            instance._decoded |= self.bit
+        return value
+
+    def __set__(self, instance, value):
+        setattr(instance, self.slot, value)
+        instance._decoded |= self.bit
+
+
+def _slots(fields, nested):
+    """
+    Returns the __slots__ of a model: one slot per plain field, and a private slot per nested field
+    """
+    return tuple(field for field in fields if field not in nested) + tuple('_' + field for field in nested)
+
+
+def model(type_name):
+    """
+    Class decorator that registers a model for the given api type, and sets up its nested fields
+    """
+    def register(cls):
+        cls._fields = frozenset(cls.FIELDS)
+        cls._nested_fields = frozenset(cls.NESTED)
+        for i, name in enumerate(cls.NESTED):
+            setattr(cls, name, _Nested(name, 1 << i))
+
+        MODELS[type_name] = cls
+        return cls
+    return register
+
+
+class BoxObject(object):
+    """
+    Base class of all the models.
+
+    Args:
+        - data: the dictionary returned by the api. Fields the model doesn't know about are kept as well.
+    """
+    FIELDS = ()
+    NESTED = ()
+    __slots__ = ('_extra', '_decoded')
+
+    _fields = frozenset()
+    _nested_fields = frozenset()
+
+    def __init__(self, data):
+        self._decoded = 0
+        extra = None
+        for key, value in data.items():
+            if key in self._nested_fields:
+                setattr(self, '_' + key, value)
+            elif key in self._fields:
+                setattr(self, key, value)
+            else:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+
+        self._extra = extra
+
+    def _lookup(self, key):
+        if key in self._fields:
+            try:
+                return object.__getattribute__(self, key)
+            except AttributeError:
+                return _MISSING
+
+        if self._extra is not None:
+            return self._extra.get(key, _MISSING)
+
+        return _MISSING
+
+    def __getattr__(self, name):
+        # only called for fields that weren't returned by the api
+        if name in self._fields:
+            return None
+
+        if name not in ('_extra', '_decoded') and self._extra is not None and name in self._extra:
+            return self._extra[name]
+
+        raise AttributeError(name)
+
+    def __getitem__(self, key):
+        value = self._lookup(key)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self._lookup(key) is not _MISSING
+
+    def get(self, key, default=None):
+        value = self._lookup(key)
+        return default if value is _MISSING else value
+
+    def keys(self):
+        keys = [key for key in self.FIELDS if key in self]
+        if self._extra is not None:
+            keys.extend(self._extra)
+        return keys
+
+    def to_dict(self):
+        """
+        Returns the object as a plain dictionary, like the ones returned by the api
+        """
+        return dict((key, _to_json(self[key])) for key in self.keys())
+
+    def __eq__(self, other):
+        if isinstance(other, BoxObject):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '<{0} {1}>'.format(self.__class__.__name__, self.get('id'))
+
+
+def _to_json(value):
+    if isinstance(value, BoxObject):
+        return value.to_dict()
+    if isinstance(value, dict):
+        return dict((key, _to_json(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return [_to_json(item) for item in value]
+    return value
+
+
+_ITEM_NESTED = ('path_collection', 'created_by', 'modified_by', 'owned_by', 'shared_link', 'parent', 'permissions')
+
+
+@model('file')
+class File(BoxObject):
+    FIELDS = ('type', 'id', 'sequence_id', 'etag', 'sha1', 'name', 'description', 'size', 'created_at', 'modified_at',
+              'trashed_at', 'purged_at', 'content_created_at', 'content_modified_at', 'item_status', 'version_number',
+              'comment_count', 'tags', 'lock', 'extension') + _ITEM_NESTED
+    NESTED = _ITEM_NESTED + ('lock',)
+    __slots__ = _slots(FIELDS, NESTED)
+
+
+@model('folder')
+class Folder(BoxObject):
+    FIELDS = ('type', 'id', 'sequence_id', 'etag', 'name', 'description', 'size', 'created_at', 'modified_at',
+              'trashed_at', 'purged_at', 'content_created_at', 'content_modified_at', 'item_status', 'sync_state',
+              'has_collaborations', 'tags', 'folder_upload_email', 'item_collection') + _ITEM_NESTED
+    NESTED = _ITEM_NESTED + ('folder_upload_email', 'item_collection')
+    __slots__ = _slots(FIELDS, NESTED)
+
+
+@model('user')
+class User(BoxObject):
+    FIELDS = ('type', 'id', 'name', 'login', 'created_at', 'modified_at', 'role', 'language', 'timezone',
+              'space_amount', 'space_used', 'max_upload_size', 'status', 'job_title', 'phone', 'address', 'avatar_url',
+              'enterprise')
+    NESTED = ('enterprise',)
+    __slots__ = _slots(FIELDS, NESTED)
+
+
+@model('event')
+class Event(BoxObject):
+    FIELDS = ('type', 'event_id', 'event_type', 'session_id', 'created_at', 'recorded_at', 'created_by', 'source',
+              'additional_details')
+    NESTED = ('created_by', 'source', 'additional_details')
+    __slots__ = _slots(FIELDS, NESTED)
+
+
+@model('collaboration')
+class Collaboration(BoxObject):
+    FIELDS = ('type', 'id', 'created_at', 'modified_at', 'expires_at', 'status', 'role', 'acknowledged_at',
+              'created_by', 'accessible_by', 'item')
+    NESTED = ('created_by', 'accessible_by', 'item')
+    __slots__ = _slots(FIELDS, NESTED)
@@ -0,0 +1,208 @@
+"""
+A small thread pool for running many Box api calls concurrently.
+"""
+from Queue import Queue
+import sys
+import threading
+import time
+
+
+class Future(object):
+    """
+    The pending result of a call submitted to a WorkerPool
+    """
+    def __init__(self):
+        self._done = threading.Event()
+        self._result = None
+        self._error = None
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._running = False
+
+    def set_result(self, result):
+        self._result = result
+        self._finish()
+
+    def set_exception(self, error):
+        self._error = error
+        self._finish()
+
+    def _finish(self):
+        with self._lock:
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
+
+    def add_done_callback(self, callback):
+        """
+        Calls callback with the future once it is done, right away if it already is
+        """
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def done(self):
+        return self._done.is_set()
+
+    def cancel(self):
+        """
+        Cancels the call unless it already started, failing the future with CancelledError.
+        Returns True if it was cancelled
+        """
+        with self._lock:
+            if self._running or self._done.is_set():
+                return False
+            self._done.set()
+            self._error = CancelledError('cancelled')
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
+        return True
+
+    def _start(self):
+        """
+        Marks the call as running. Returns False if it was cancelled
+        """
+        with self._lock:
+            if self._done.is_set():
+                return False
+            self._running = True
+            return True
+
+    def exception(self, timeout=None):
+        if not self._done.wait(timeout) and not self._done.is_set():
+            raise FutureTimeout('timed out waiting for the result')
+        return self._error
+
+    def result(self, timeout=None):
+        error = self.exception(timeout)
+        if error is not None:
+            raise error
+        return self._result
+
+
+class FutureTimeout(Exception):
+    pass
+
+
+class CancelledError(Exception):
+    pass
+
+
+class WorkerPool(object):
+    """
+    A fixed number of daemon threads running submitted calls.
+
+    Args:
+        - workers: the number of threads.
+        - max_pending: (optional) the number of calls that may wait for a thread. Once reached, submit() blocks until
+                       a thread frees up, which keeps producers from running ahead of the pool. Unbounded by default.
+    """
+    def __init__(self, workers=8, max_pending=None):
+        self.workers = workers
+        self._tasks = Queue(max_pending or 0)
+        self._threads = []
+        for _ in range(workers):
+            thread = threading.Thread(target=self._work)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                return
+
+            future, func, args, kwargs = task
+            if not future._start():
+                continue
+
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                future.set_exception(sys.exc_info()[1])
+            else:
+                future.set_result(result)
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Schedules func(*args, **kwargs) to run on the pool. Returns a Future.
+        """
+        future = Future()
+        self._tasks.put((future, func, args, kwargs))
+        return future
+
+    def map_unordered(self, func, iterable, window=None):
+        """
+        Calls func on every item, and yields (item, future) pairs as the calls complete.
+
+        Items are pulled from iterable lazily, with at most window calls (2 per thread by default) in flight, so
+        arbitrarily long streams run in constant memory.
+        """
+        window = window or self.workers * 2
+        completed = Queue()
+        in_flight = 0
+
+        for item in iterable:
+            if in_flight >= window:
+                yield completed.get()
+                in_flight -= 1
+
+            self.submit(func, item).add_done_callback(lambda future, item=item: completed.put((item, future)))
+            in_flight += 1
+
+        while in_flight:
+            yield completed.get()
+            in_flight -= 1
+
+    def shutdown(self, wait=True):
+        """
+        Stops the threads once all the calls submitted so far have run
+        """
+        for _ in self._threads:
+            self._tasks.put(None)
+
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+
+class RateLimiter(object):
+    """
+    A token bucket, limiting how often an operation is performed across all threads.
+
+    Args:
+        - rate: the number of operations allowed per second.
+        - burst: (optional) the number of operations that may run back to back after a quiet period. Defaults to rate.
+    """
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or max(rate, 1))
+        self._tokens = self.burst
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Blocks until the operation may be performed
+        """
+        while True:
+            with self._lock:
+                now = time.time()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
@@ -0,0 +1,125 @@
+"""
+Running many searches at once.
+"""
+from Queue import Queue
+
+from .pool import WorkerPool
+
+
+class SearchHit(object):
+    """
+    An item found by one or more queries.
+
+    Attributes:
+        - item: the item, as returned by the search api.
+        - queries: the queries that matched the item. Queries that match the item after it was yielded are appended,
+                   so the list is only complete once the search is over.
+    """
+    __slots__ = ('item', 'queries')
+
+    def __init__(self, item, queries):
+        self.item = item
+        self.queries = queries
+
+    def __repr__(self):
+        return '<SearchHit {0} {1!r}>'.format(self.item.get('id'), self.queries)
+
+
+class MultiSearch(object):
+    """
+    Runs many queries concurrently, and streams their merged results.
+
+    Every page of every query is requested on a pool of threads. Items are yielded as soon as their page arrives,
+    once per item no matter how many queries matched it. A query that fails doesn't stop the others: its error is
+    recorded in errors. The pages still pending when the iteration stops early are cancelled.
+
+    Args:
+        - client: a BoxClient.
+        - queries: the queries to run.
+        - workers: (optional) the number of concurrent requests.
+        - page_size: (optional) the number of results to request at a time (max=200).
+        - max_results: (optional) the number of results to fetch per query. Unlimited by default.
+
+    Attributes:
+        - hits: (type, id) -> the SearchHit of every item found so far.
+        - errors: query -> the exception of every query that failed, once the search is over.
+    """
+    def __init__(self, client, queries, workers=8, page_size=200, max_results=None):
+        # imported here, as the client imports this module
+        from .client import MAX_PAGE_SIZES
+
+        self.client = client
+        self.queries = list(queries)
+        self.workers = workers
+        self.page_size = min(page_size, MAX_PAGE_SIZES['search'])
+        self.max_results = max_results
+        self.hits = {}
+        self.errors = {}
+
+    def _search(self, query, offset):
+        limit = self.page_size
+        if self.max_results is not None:
+            limit = min(limit, self.max_results - offset)
+        return query, offset, self.client.search(query, limit=limit, offset=offset)
+
+    def __iter__(self):
+        self.errors = {}
+        results = Queue()
+        futures = set()
+        pool = WorkerPool(self.workers)
+
+        def submit(query, offset):
+            future = pool.submit(self._search, query, offset)
+            futures.add(future)
+            future.add_done_callback(lambda future: results.put((query, future)))
+
+        try:
+            for query in self.queries:
+                submit(query, 0)
+
+            while futures:
+                query, future = results.get()
+                futures.discard(future)
+                try:
+                    _, offset, page = future.result()
+                except Exception as e:
+                    self.errors.setdefault(query, e)
+                    continue
+
+                if offset == 0:
+                    # now that the total is known, request all the remaining pages at once
+                    total = page.get('total_count', 0)
+                    if self.max_results is not None:
+                        total = min(total, self.max_results)
+                    for next_offset in range(self.page_size, total, self.page_size):
+                        submit(query, next_offset)
+
+                for item in page['entries']:
+                    hit = self._record(item, query)
+                    if hit is not None:
+                        yield hit
+        finally:
+            for future in futures:
+                future.cancel()
+            pool.shutdown(wait=False)
+
+    def _record(self, item, query):
+        """
+        Records that query matched item. Returns a new SearchHit the first time the item is seen, None afterwards
+        """
+        key = (item.get('type'), item['id'])
+        hit = self.hits.get(key)
+        if hit is not None:
+            if query not in hit.queries:
+                hit.queries.append(query)
+            return None
+
+        hit = self.hits[key] = SearchHit(item, [query])
+        return hit
+
+    @property
+    def provenance(self):
+        """
+        Maps the (type, id) of every item found so far to the queries that matched it
+        """
+        return dict((key, list(hit.queries)) for key, hit in self.hits.items())
@@ -0,0 +1,126 @@
+"""
+Credential stores let several CredentialsV2 instances, typically living in different processes, share a single set of
+tokens. Whenever one of them refreshes the tokens, the others pick up the new tokens on their next request.
+"""
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+
+from .locks import FileLock
+
+
+class CredentialStore(object):
+    """
+    The interface of a credential store.
+
+    Tokens are passed around as dictionaries with the keys access_token, refresh_token and expires_at (a unix timestamp,
+    or None if unknown).
+    """
+
+    def load(self):
+        """
+        Returns the stored tokens, or None if nothing was stored yet.
+        Called before every request, so it should be cheap.
+        """
+        raise NotImplementedError()
+
+    def save(self, tokens):
+        """
+        Stores the tokens, replacing whatever was stored before.
+        """
+        raise NotImplementedError()
+
+    def lock(self):
+        """
+        Returns a lock shared by every user of the store, which is held while the tokens are refreshed.
+        """
+        raise NotImplementedError()
+
+
+class FileCredentialStore(CredentialStore):
+    """
+    Stores the tokens in a json file, which is replaced atomically on every save.
+    Refreshes are serialized with a lock file next to it.
+
+    Args:
+        - path: the path of the file holding the tokens.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = FileLock(path + '.lock')
+        self._cache_key = None
+        self._cached = None
+
+    def load(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+
+        # skip parsing the file unless it was replaced since the last load
+        cache_key = (stat.st_ino, stat.st_mtime, stat.st_size)
+        if cache_key != self._cache_key:
+            with open(self.path) as f:
+                self._cached = json.load(f)
+            self._cache_key = cache_key
+
+        return dict(self._cached)
+
+    def save(self, tokens):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.box-credentials')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(tokens, f)
+            os.rename(temp_path, self.path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def lock(self):
+        return self._lock
+
+
+class SqliteCredentialStore(CredentialStore):
+    """
+    Stores the tokens in a sqlite database. Several sets of tokens can share a database by using different keys.
+    Refreshes are serialized with a lock file next to the database.
+
+    Args:
+        - path: the path of the database file.
+        - key: (optional) the name the tokens are stored under.
+    """
+    def __init__(self, path, key='default'):
+        self.path = path
+        self.key = key
+        self._lock = FileLock(path + '.lock')
+        self._local = threading.local()
+
+        with self._connection() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS credentials ('
+                               'key TEXT PRIMARY KEY, access_token TEXT, refresh_token TEXT, expires_at REAL)')
+
+    def _connection(self):
+        # sqlite connections can't be shared between threads
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = sqlite3.connect(self.path, timeout=30)
+        return connection
+
+    def load(self):
+        row = self._connection().execute('SELECT access_token, refresh_token, expires_at FROM credentials WHERE key = ?',
+                                         (self.key,)).fetchone()
+        if row is None:
+            return None
+
+        return {'access_token': row[0], 'refresh_token': row[1], 'expires_at': row[2]}
+
+    def save(self, tokens):
+        with self._connection() as connection:
+            connection.execute('INSERT OR REPLACE INTO credentials (key, access_token, refresh_token, expires_at) VALUES (?, ?, ?, ?)',
+                               (self.key, tokens['access_token'], tokens.get('refresh_token'), tokens.get('expires_at')))
+
+    def lock(self):
+        return self._lock
@@ -0,0 +1,269 @@
+"""
+Fetching thumbnails for many files at once, backed by a local cache.
+
+Thumbnails that aren't ready yet are asked for again by a scheduler thread, rather than by a thread sleeping until
+they are, so the pool keeps fetching the others in the meantime.
+"""
+from hashlib import sha1
+import heapq
+from itertools import count
+import os
+import tempfile
+import threading
+import time
+
+from .models import BoxObject
+from .pool import Future, WorkerPool
+
+DEFAULT_CACHE_SIZE = 256 * 1024 * 1024
+
+
+class ThumbnailCache(object):
+    """
+    A directory of thumbnails bounded in size, evicting the least recently used ones first.
+
+    Recency is kept in the modification times of the files, so it survives restarts.
+
+    Args:
+        - directory: the directory of the cache. Created if it doesn't exist.
+        - max_size: (optional) the total size of the thumbnails, in bytes. (default=256MB)
+    """
+    def __init__(self, directory, max_size=DEFAULT_CACHE_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._clock = 0
+        # name -> [size, last use]
+        self._entries = {}
+        self._size = 0
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        files = []
+        for name in os.listdir(directory):
+            if name.endswith('.thumbnail'):
+                stat = os.stat(os.path.join(directory, name))
+                files.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._add(name, size)
+
+    @staticmethod
+    def _name(key):
+        return sha1(repr(key)).hexdigest() + '.thumbnail'
+
+    def _add(self, name, size):
+        self._clock += 1
+        self._entries[name] = [size, self._clock]
+        self._size += size
+
+    def get(self, key):
+        """
+        Returns the cached content for key, or None
+        """
+        name = self._name(key)
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                return None
+            self._clock += 1
+            entry[1] = self._clock
+
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, 'rb') as thumbnail:
+                content = thumbnail.read()
+            os.utime(path, None)
+        except (IOError, OSError):
+            # evicted in the meantime
+            return None
+        return content
+
+    def put(self, key, content):
+        name = self._name(key)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as temp:
+            temp.write(content)
+        os.rename(temp_path, os.path.join(self.directory, name))
+
+        with self._lock:
+            previous = self._entries.pop(name, None)
+            if previous is not None:
+                self._size -= previous[0]
+            self._add(name, len(content))
+            if self._size > self.max_size:
+                self._evict()
+
+    def _evict(self):
+        """
+        Removes the least recently used thumbnails, down to 90% of max_size so that evictions come in batches
+        """
+        target = self.max_size * 0.9
+        for name, (size, _) in sorted(self._entries.items(), key=lambda item: item[1][1]):
+            if self._size <= target:
+                break
+            del self._entries[name]
+            self._size -= size
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def size(self):
+        return self._size
+
+
+class ThumbnailService(object):
+    """
+    Fetches thumbnails concurrently, through an optional ThumbnailCache.
+
+    Thumbnails are cached by file ID, version and requested bounds, so files have to be passed as dictionaries or
+    models with a sha1 or an etag (as returned by the apis) to be cached. Files passed as IDs are always fetched.
+
+    Args:
+        - client: a BoxClient.
+        - cache: (optional) a ThumbnailCache, or the directory of one.
+        - workers: (optional) the number of concurrent requests.
+        - max_wait: (optional) the number of seconds to wait for a thumbnail to get ready before giving up on it.
+        - extension: (optional) the format of the thumbnails. (default=png)
+    """
+    def __init__(self, client, cache=None, workers=8, max_wait=60, extension='png'):
+        self.client = client
+        if isinstance(cache, basestring):
+            cache = ThumbnailCache(cache)
+        self.cache = cache
+        self.max_wait = max_wait
+        self.extension = extension
+        self._pool = WorkerPool(workers)
+        self._lock = threading.Lock()
+        self._inflight = {}
+        # the pending retries, as a heap of (due time, sequence, arguments of _fetch)
+        self._retries = []
+        self._sequence = count()
+        self._retries_changed = threading.Condition(self._lock)
+        self._scheduler = None
+        self._closed = False
+
+    def _key(self, file_info, bounds):
+        if isinstance(file_info, (dict, BoxObject)):
+            version = file_info.get('sha1') or file_info.get('etag')
+            file_id = str(file_info['id'])
+        else:
+            version, file_id = None, str(file_info)
+
+        if version is None:
+            return file_id, None
+        return file_id, (file_id, version, self.extension) + bounds
+
+    def get(self, file_info, min_height=None, max_height=None, min_width=None, max_width=None):
+        """
+        Requests the thumbnail of a file.
+
+        Args:
+            - file_info: the ID, or a dictionary or model (as returned by the apis) of the file.
+            - min_height, max_height, min_width, max_width: (optional) the bounds of the thumbnail.
+
+        Returns:
+            - a Future of the content of the thumbnail, or of None if the file has no thumbnail
+        """
+        bounds = (min_height, max_height, min_width, max_width)
+        file_id, key = self._key(file_info, bounds)
+
+        if key is not None and self.cache is not None:
+            content = self.cache.get(key)
+            if content is not None:
+                future = Future()
+                future.set_result(content)
+                return future
+
+        with self._lock:
+            inflight_key = key or (file_id, bounds)
+            future = self._inflight.get(inflight_key)
+            if future is not None:
+                return future
+            future = self._inflight[inflight_key] = Future()
+
+        future.add_done_callback(lambda _: self._done(inflight_key))
+        self._pool.submit(self._fetch, future, file_id, key, bounds, 0)
+        return future
+
+    def get_many(self, files, min_height=None, max_height=None, min_width=None, max_width=None):
+        """
+        Requests the thumbnails of many files at once. See get().
+
+        Returns:
+            - a list of Futures, in the order of the files
+        """
+        return [self.get(file_info, min_height, max_height, min_width, max_width) for file_info in files]
+
+    def _done(self, inflight_key):
+        with self._lock:
+            self._inflight.pop(inflight_key, None)
+
+    def _fetch(self, future, file_id, key, bounds, waited):
+        try:
+            min_height, max_height, min_width, max_width = bounds
+            thumbnail, retry_after = self.client.fetch_thumbnail(file_id, self.extension, min_height=min_height,
+                                                                 max_height=max_height, min_width=min_width,
+                                                                 max_width=max_width)
+            if retry_after is not None:
+                if waited + retry_after > self.max_wait:
+                    future.set_result(None)
+                else:
+                    self._retry_later(retry_after, future, file_id, key, bounds, waited + retry_after)
+                return
+
+            content = thumbnail.read() if thumbnail is not None else None
+            if content is not None and key is not None and self.cache is not None:
+                self.cache.put(key, content)
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            future.set_result(content)
+
+    def _retry_later(self, delay, *args):
+        with self._lock:
+            if not self._closed:
+                heapq.heappush(self._retries, (time.time() + delay, next(self._sequence), args))
+                if self._scheduler is None:
+                    self._scheduler = threading.Thread(target=self._schedule)
+                    self._scheduler.daemon = True
+                    self._scheduler.start()
+                self._retries_changed.notify()
+                return
+        # closed while the thumbnail was being fetched
+        args[0].set_result(None)
+
+    def _schedule(self):
+        """
+        The loop of the scheduler thread: submits the retries to the pool as they come due, until closed
+        """
+        with self._lock:
+            while not self._closed:
+                now = time.time()
+                while self._retries and self._retries[0][0] <= now:
+                    # the pool's queue is unbounded, so this doesn't block
+                    self._pool.submit(self._fetch, *heapq.heappop(self._retries)[2])
+                self._retries_changed.wait(self._retries[0][0] - now if self._retries else None)
+
+    def close(self):
+        """
+        Stops the pending retries, whose thumbnails resolve to None, and the pool's threads
+        """
+        with self._lock:
+            self._closed = True
+            retries, self._retries = self._retries, []
+            self._retries_changed.notify()
+        for _, _, args in retries:
+            args[0].set_result(None)
+        self._pool.shutdown(wait=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,449 @@
+"""
+The HTTP layer under BoxClient.
+
+A transport sends a request and returns a response. It takes the arguments of requests.request(), and returns an
+object with the interface of a requests.Response that BoxClient relies on: status_code, ok, headers, content, text,
+json(), raw and iter_content().
+
+Besides the default transport (requests), there is a leaner one built directly on urllib3, one multiplexing requests
+over HTTP/2, a transport that records every exchange to a file, and one that replays a recording without the network,
+for benchmarking & reproducing workloads offline.
+"""
+from base64 import b64decode, b64encode
+from hashlib import sha1
+from io import BytesIO
+import gzip
+import json
+import os
+import threading
+import time
+try:
+    from urllib import urlencode
+except ImportError:
+    from urllib.parse import urlencode
+
+import requests
+import requests.adapters
+from requests.packages.urllib3.response import HTTPResponse
+from requests.structures import CaseInsensitiveDict
+
+
+class Transport(object):
+    """
+    The interface of transports
+    """
+    def request(self, method, url, **kwargs):
+        """
+        Sends a request. Takes the same arguments as requests.request(): params, data, headers, files, stream and
+        timeout. Returns a response.
+        """
+        raise NotImplementedError()
+
+    def close(self):
+        pass
+
+
+class RequestsTransport(Transport):
+    """
+    Sends requests with the requests library, which asks for compressed responses (gzip, deflate, and br when brotli
+    is installed) and decodes them.
+
+    Args:
+        - session: (optional) a requests.Session, to reuse connections. By default, every request is sent with
+                   requests.request().
+    """
+    def __init__(self, session=None):
+        self.session = session
+
+    def request(self, method, url, **kwargs):
+        if self.session is not None:
+            return self.session.request(method, url, **kwargs)
+        return requests.request(method, url, **kwargs)
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+
+
+def _encode_pairs(pairs):
+    """
+    Returns the (name, value) pairs of a dict of query parameters or form fields, the way requests encodes them:
+    None values are dropped, lists are repeated, and text is encoded as utf-8
+    """
+    encoded = []
+    for name, values in sorted((pairs or {}).items()):
+        if values is None:
+            continue
+        if not isinstance(values, (list, tuple)):
+            values = [values]
+        for value in values:
+            if isinstance(value, type(u'')):
+                value = value.encode('utf-8')
+            elif not isinstance(value, bytes):
+                value = str(value)
+            encoded.append((name, value))
+    return encoded
+
+
+def _file_field(name, value):
+    """
+    Returns the multipart field of a requests-style file: either a fileobj, or a (filename, fileobj) tuple
+    """
+    if isinstance(value, tuple):
+        filename, fileobj = value[:2]
+    else:
+        fileobj = value
+        filename = os.path.basename(getattr(fileobj, 'name', None) or name)
+    content = fileobj.read() if hasattr(fileobj, 'read') else fileobj
+    return name, (filename, content)
+
+
+class Urllib3Response(object):
+    """
+    Adapts a urllib3 response to the interface of a requests.Response used by BoxClient
+    """
+    def __init__(self, response, url):
+        self.raw = response
+        self.status_code = response.status
+        self.headers = response.headers
+        self.url = url
+        self._content = None
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def content(self):
+        if self._content is None:
+            self._content = self.raw.read(decode_content=True)
+            self.raw.release_conn()
+        return self._content
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', 'replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size=1):
+        if self._content is not None:
+            return BufferedResponse(self.status_code, {}, self._content).iter_content(chunk_size)
+        return self.raw.stream(chunk_size, decode_content=True)
+
+    def close(self):
+        self.raw.release_conn()
+
+
+class Urllib3Transport(Transport):
+    """
+    Sends requests with urllib3 directly, skipping the sessions, hooks & adapters of requests, which dominate the
+    cost of small requests. Connections are pooled per host.
+
+    Errors are raised as the matching requests exceptions (Timeout, ConnectionError), like with the default transport.
+
+    Args:
+        - maxsize: (optional) the number of connections kept open per host. Should be at least the number of threads
+                   sharing the transport.
+        - **pool_kwargs: (optional) any other argument of urllib3.PoolManager, f.ex. ca_certs.
+    """
+    def __init__(self, maxsize=10, **pool_kwargs):
+        import urllib3
+
+        self._urllib3 = urllib3
+        self.pool = urllib3.PoolManager(maxsize=maxsize, **pool_kwargs)
+        # the encodings urllib3 can decode: gzip, deflate, and br when brotli is installed
+        self.accept_encoding = urllib3.util.make_headers(accept_encoding=True)['accept-encoding']
+        # like requests: connection errors aren't retried, but redirects (f.ex. of downloads) are followed
+        self._retries = urllib3.Retry(total=None, connect=0, read=False, redirect=30)
+
+    def _timeout(self, timeout):
+        if timeout is None:
+            return self._urllib3.Timeout(connect=None, read=None)
+        if isinstance(timeout, tuple):
+            return self._urllib3.Timeout(connect=timeout[0], read=timeout[1])
+        return self._urllib3.Timeout(connect=timeout, read=timeout)
+
+    def request(self, method, url, params=None, data=None, headers=None, files=None, stream=False, timeout=None):
+        headers = dict(headers or {})
+        headers.setdefault('Accept-Encoding', self.accept_encoding)
+        query = _encode_pairs(params)
+        if query:
+            url += ('&' if '?' in url else '?') + urlencode(query)
+
+        body = data
+        if files:
+            fields = _encode_pairs(data) + [_file_field(name, value) for name, value in sorted(files.items())]
+            body, headers['Content-Type'] = self._urllib3.encode_multipart_formdata(fields)
+        elif isinstance(data, dict):
+            body = urlencode(_encode_pairs(data))
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        elif isinstance(data, type(u'')):
+            body = data.encode('utf-8')
+
+        try:
+            raw = self.pool.urlopen(method.upper(), url, body=body, headers=headers, retries=self._retries,
+                                    timeout=self._timeout(timeout), preload_content=False, decode_content=True)
+        except self._urllib3.exceptions.HTTPError as e:
+            raise self._translate_error(e)
+
+        response = Urllib3Response(raw, url)
+        if not stream:
+            # reads the whole body, which releases the connection
+            response.content
+        return response
+
+    def _translate_error(self, error):
+        """
+        Returns the requests exception matching a urllib3 one
+        """
+        exceptions = self._urllib3.exceptions
+        reason = error.reason if isinstance(error, exceptions.MaxRetryError) else error
+        # failing to connect is a NewConnectionError, which urllib3 derives from ConnectTimeoutError
+        if isinstance(reason, exceptions.ConnectTimeoutError) and not isinstance(reason, exceptions.NewConnectionError):
+            return requests.ConnectTimeout(error)
+        if isinstance(reason, exceptions.ReadTimeoutError):
+            return requests.ReadTimeout(error)
+        return requests.ConnectionError(error)
+
+    def close(self):
+        self.pool.clear()
+
+
+class HTTP2Transport(RequestsTransport):
+    """
+    Sends requests to the Box API over HTTP/2, which multiplexes any number of concurrent requests over a single
+    connection per host, instead of opening a connection (and paying for its handshake) per request in flight.
+
+    Requires hyper (pip install box.py[http2]). Without it, as well as for the hosts not sent over HTTP/2 (uploads,
+    downloads), requests go over pooled HTTP/1.1 connections.
+
+    Args:
+        - hosts: (optional) the hosts to talk to over HTTP/2. Defaults to the API, which serves the many small
+                 requests of metadata-heavy workloads.
+        - pool_maxsize: (optional) the number of HTTP/1.1 connections kept open per host. Should be at least the
+                        number of threads sharing the transport.
+    """
+    def __init__(self, hosts=('api.box.com',), pool_maxsize=32):
+        session = requests.Session()
+        session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=pool_maxsize))
+
+        try:
+            from hyper.contrib import HTTP20Adapter
+        except ImportError:
+            self.http2 = False
+        else:
+            self.http2 = True
+            adapter = HTTP20Adapter()
+            for host in hosts:
+                session.mount('https://{0}/'.format(host), adapter)
+
+        super(HTTP2Transport, self).__init__(session)
+
+
+def _wire_bytes(response, decoded_bytes):
+    """
+    Returns the number of bytes a response body took on the network, before it was decompressed
+    """
+    if isinstance(response.raw, HTTPResponse):
+        return response.raw.tell()
+
+    length = (response.headers or {}).get('Content-Length')
+    return int(length) if length else decoded_bytes
+
+
+class TransferStats(object):
+    """
+    Counts the bytes of the response bodies received, as sent over the network and once decompressed, to measure the
+    bandwidth saved by compression. Kept per endpoint family, see box.breaker.FAMILIES.
+
+    A single instance can be shared by several clients. Only responses read in full are counted, so downloads,
+    thumbnails & incremental listings aren't.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        # family -> [responses, compressed responses, wire bytes, decoded bytes]
+        self._counts = {}
+
+    def record(self, family, response):
+        """
+        Counts a response whose body was read
+        """
+        decoded_bytes = len(response.content or b'')
+        wire_bytes = _wire_bytes(response, decoded_bytes)
+        compressed = bool((response.headers or {}).get('Content-Encoding'))
+
+        with self._lock:
+            counts = self._counts.setdefault(family, [0, 0, 0, 0])
+            counts[0] += 1
+            counts[1] += compressed
+            counts[2] += wire_bytes
+            counts[3] += decoded_bytes
+
+    def stats(self):
+        """
+        Returns the counts of every family so far, and the share of the bandwidth saved by compression
+        """
+        with self._lock:
+            counts = dict((family, list(family_counts)) for family, family_counts in self._counts.items())
+
+        return dict((family, {
+            'responses': responses,
+            'compressed_responses': compressed,
+            'wire_bytes': wire_bytes,
+            'decoded_bytes': decoded_bytes,
+            'saved': 1 - float(wire_bytes) / decoded_bytes if decoded_bytes else 0.0,
+        }) for family, (responses, compressed, wire_bytes, decoded_bytes) in counts.items())
+
+
+class _Body(BytesIO):
+    """
+    The raw body of a buffered response. Accepts the attributes set on urllib3 responses, f.ex. decode_content
+    """
+    decode_content = True
+
+
+class BufferedResponse(object):
+    """
+    A response whose body is held in memory
+    """
+    def __init__(self, status_code, headers, content, url=None):
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers or {})
+        self.content = content
+        self.url = url
+        self.raw = _Body(content)
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', 'replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size=1):
+        for offset in range(0, len(self.content), chunk_size):
+            yield self.content[offset:offset + chunk_size]
+
+    def close(self):
+        pass
+
+
+def _request_key(method, url, params=None, data=None, **kwargs):
+    """
+    What identifies a request in a recording: its method, url, parameters and the digest of its body
+    """
+    body = sha1(data).hexdigest() if isinstance(data, basestring) else None
+    return method.upper(), url, json.dumps(params, sort_keys=True), body
+
+
+class RecordingTransport(Transport):
+    """
+    Sends requests through another transport, and appends every exchange to a gzipped file of json lines.
+
+    Bodies of responses are recorded in full, so responses are read entirely before being returned, even when
+    streamed. Uploaded files aren't recorded.
+
+    Args:
+        - path: the path of the recording.
+        - transport: (optional) the transport actually sending the requests. Defaults to a RequestsTransport.
+    """
+    def __init__(self, path, transport=None):
+        self.transport = transport or RequestsTransport()
+        self._file = gzip.open(path, 'wb')
+        self._lock = threading.Lock()
+        self._start = time.time()
+
+    def request(self, method, url, **kwargs):
+        started = time.time()
+        exchange = {
+            'key': _request_key(method, url, **kwargs),
+            'started': round(started - self._start, 6),
+        }
+
+        try:
+            response = self.transport.request(method, url, **kwargs)
+            content = response.content
+        except requests.RequestException as e:
+            exchange.update(error=type(e).__name__, message=str(e), elapsed=round(time.time() - started, 6))
+            self._write(exchange)
+            raise
+
+        exchange.update(status=response.status_code, headers=dict(response.headers),
+                        elapsed=round(time.time() - started, 6))
+        try:
+            exchange['text'] = content.decode('utf-8')
+        except UnicodeDecodeError:
+            exchange['body'] = b64encode(content)
+        self._write(exchange)
+
+        return BufferedResponse(response.status_code, response.headers, content, url)
+
+    def _write(self, exchange):
+        line = json.dumps(exchange, separators=(',', ':')) + '\n'
+        with self._lock:
+            self._file.write(line)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+        self.transport.close()
+
+
+class ReplayError(requests.RequestException):
+    """
+    Raised by a ReplayTransport for a request that isn't in the recording
+    """
+    pass
+
+
+class ReplayTransport(Transport):
+    """
+    Serves the responses of a recording made by RecordingTransport, without the network.
+
+    Identical requests are served their recorded responses in the order they were recorded. The last one is served
+    again once they run out.
+
+    Args:
+        - path: the path of the recording.
+        - timing: (optional) if True, every response is delayed by the time the original one took, to reproduce
+                  the latency of the recorded workload.
+    """
+    def __init__(self, path, timing=False):
+        self.timing = timing
+        self._exchanges = {}
+        self._lock = threading.Lock()
+
+        recording = gzip.open(path, 'rb')
+        try:
+            for line in recording:
+                exchange = json.loads(line)
+                self._exchanges.setdefault(tuple(exchange['key']), []).append(exchange)
+        finally:
+            recording.close()
+
+    def request(self, method, url, **kwargs):
+        key = _request_key(method, url, **kwargs)
+        with self._lock:
+            exchanges = self._exchanges.get(key)
+            if not exchanges:
+                raise ReplayError('{0} {1} is not in the recording'.format(method.upper(), url))
+            exchange = exchanges.pop(0) if len(exchanges) > 1 else exchanges[0]
+
+        if self.timing:
+            time.sleep(exchange['elapsed'])
+
+        if 'error' in exchange:
+            error = getattr(requests.exceptions, exchange['error'], requests.RequestException)
+            raise error(exchange['message'])
+
+        if 'text' in exchange:
+            content = exchange['text'].encode('utf-8')
+        else:
+            content = b64decode(exchange['body'])
+        return BufferedResponse(exchange['status'], exchange['headers'], content, url)
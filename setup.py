@@ -9,6 +9,15 @@ TEST_REQUIRES = [
     'unittest2'
 ]
 
+SPEEDUPS_REQUIRE = [
+    'ujson',
+    'ijson',
+]
+
+HTTP2_REQUIRE = [
+    'hyper',
+]
+
 INSTALL_REQUIRES = [
     'requests>=1.0.0',
 ]
@@ -39,6 +48,8 @@ setup(
     zip_safe=False,
     extras_require={
         'tests': TEST_REQUIRES,
+        'speedups': SPEEDUPS_REQUIRE,
+        'http2': HTTP2_REQUIRE,
     },
     license='BSD',
     tests_require=TEST_REQUIRES,
@@ -1,6 +1,8 @@
 from StringIO import StringIO
+from contextlib import contextmanager
 from datetime import tzinfo, timedelta
 from flexmock import flexmock
+import __builtin__
 try:
     import json as json
 except:
@@ -50,4 +52,24 @@ def mocked_response(content=None, status_code=200, headers=None):
     if isinstance(content, dict):
         content = json.dumps(content)
 
-    return flexmock(ok=status_code < 400, status_code=status_code, json=lambda: json.loads(content), raw=content, text=content, headers=headers)
+    return flexmock(ok=status_code < 400, status_code=status_code, json=lambda: json.loads(content), raw=content, text=content, content=content,
+                    headers=headers)
+
+
+@contextmanager
+def failing_import(name):
+    """
+    makes importing the given module (or package, with its submodules) fail, as if it wasn't installed
+    """
+    original_import = __builtin__.__import__
+
+    def fake_import(module_name, *args, **kwargs):
+        if module_name == name or module_name.startswith(name + '.'):
+            raise ImportError(module_name)
+        return original_import(module_name, *args, **kwargs)
+
+    __builtin__.__import__ = fake_import
+    try:
+        yield
+    finally:
+        __builtin__.__import__ = original_import
@@ -1,12 +1,15 @@
 from tests import mocked_response
+import threading
+import time
 import unittest2 as unittest
 from urlparse import urlsplit, parse_qs
 
 from flexmock import flexmock
 import requests
 
+import box.client
 from box import start_authenticate_v1, finish_authenticate_v1, \
-    BoxAuthenticationException, start_authenticate_v2, finish_authenticate_v2, \
+    BoxClient, BoxAuthenticationException, start_authenticate_v2, finish_authenticate_v2, \
     CredentialsV1, CredentialsV2, refresh_v2_token
 from box.client import _oauth2_token_request, _handle_auth_response
 
@@ -19,8 +22,8 @@ class TestAuthenticationV1(unittest.TestCase):
     def test_start_authenticate_v1(self):
         response = mocked_response('<response><status>get_ticket_ok</status><ticket>golden_ticket</ticket></response>')
         (flexmock(requests)
-            .should_receive('get')
-            .with_args('https://www.box.com/api/1.0/rest?action=get_ticket&api_key=my_api_key')
+            .should_receive('request')
+            .with_args('get', 'https://www.box.com/api/1.0/rest?action=get_ticket&api_key=my_api_key')
             .and_return(response))
 
         self.assertEqual(start_authenticate_v1('my_api_key'), 'https://www.box.com/api/1.0/auth/golden_ticket')
@@ -28,8 +31,8 @@ class TestAuthenticationV1(unittest.TestCase):
     def test_start_authenticate_v1_fail(self):
         response = mocked_response('something_terrible', status_code=400)
         (flexmock(requests)
-            .should_receive('get')
-            .with_args('https://www.box.com/api/1.0/rest?action=get_ticket&api_key=my_api_key')
+            .should_receive('request')
+            .with_args('get', 'https://www.box.com/api/1.0/rest?action=get_ticket&api_key=my_api_key')
             .and_return(response))
 
         with self.assertRaises(BoxAuthenticationException) as expected_exception:
@@ -39,8 +42,8 @@ class TestAuthenticationV1(unittest.TestCase):
 
         response = mocked_response('<response><status>something_terrible</status></response>')
         (flexmock(requests)
-            .should_receive('get')
-            .with_args('https://www.box.com/api/1.0/rest?action=get_ticket&api_key=my_api_key')
+            .should_receive('request')
+            .with_args('get', 'https://www.box.com/api/1.0/rest?action=get_ticket&api_key=my_api_key')
             .and_return(response))
 
         with self.assertRaises(BoxAuthenticationException) as expected_exception:
@@ -56,8 +59,8 @@ class TestAuthenticationV1(unittest.TestCase):
         </user>
         </response>""")
         (flexmock(requests)
-            .should_receive('get')
-            .with_args('https://www.box.com/api/1.0/rest', params={
+            .should_receive('request')
+            .with_args('get', 'https://www.box.com/api/1.0/rest', params={
                 'action': 'get_auth_token',
                 'api_key': 'my_api_key',
                 'ticket': 'golden_ticket'
@@ -74,8 +77,8 @@ class TestAuthenticationV1(unittest.TestCase):
     def test_finish_authenticate_error(self):
         response = mocked_response('something_terrible', status_code=400)
         (flexmock(requests)
-            .should_receive('get')
-            .with_args('https://www.box.com/api/1.0/rest', params={
+            .should_receive('request')
+            .with_args('get', 'https://www.box.com/api/1.0/rest', params={
                 'action': 'get_auth_token',
                 'api_key': 'my_api_key',
                 'ticket': 'golden_ticket'
@@ -89,8 +92,8 @@ class TestAuthenticationV1(unittest.TestCase):
 
         response = mocked_response('<response><status>something_terrible</status></response>')
         (flexmock(requests)
-            .should_receive('get')
-            .with_args('https://www.box.com/api/1.0/rest', params={
+            .should_receive('request')
+            .with_args('get', 'https://www.box.com/api/1.0/rest', params={
                 'action': 'get_auth_token',
                 'api_key': 'my_api_key',
                 'ticket': 'golden_ticket'
@@ -128,8 +131,8 @@ class TestAuthenticationV2(unittest.TestCase):
             'grant_type': 'refresh_token',
         }
         (flexmock(requests)
-            .should_receive('post')
-            .with_args('https://www.box.com/api/oauth2/token', args)
+            .should_receive('request')
+            .with_args('post', 'https://www.box.com/api/oauth2/token', data=args)
             .and_return(mocked_response({'access_token': 'new_access_token',
                                          'refresh_token': 'new_refresh_token'}))
             .once())
@@ -147,8 +150,8 @@ class TestAuthenticationV2(unittest.TestCase):
             'grant_type': 'refresh_token',
         }
         (flexmock(requests)
-            .should_receive('post')
-            .with_args('https://www.box.com/api/oauth2/token', args)
+            .should_receive('request')
+            .with_args('post', 'https://www.box.com/api/oauth2/token', data=args)
             .and_return(mocked_response({'access_token': 'new_access_token',
                                          'refresh_token': 'new_refresh_token'}))
             .once())
@@ -197,8 +200,8 @@ class TestAuthenticationV2(unittest.TestCase):
         }
 
         (flexmock(requests)
-            .should_receive('post')
-            .with_args('https://www.box.com/api/oauth2/token', expected_args)
+            .should_receive('request')
+            .with_args('post', 'https://www.box.com/api/oauth2/token', data=expected_args)
             .and_return(flexmock(json=lambda: fake_response))
             .once())
 
@@ -219,8 +222,8 @@ class TestAuthenticationV2(unittest.TestCase):
         }
 
         (flexmock(requests)
-            .should_receive('post')
-            .with_args('https://www.box.com/api/oauth2/token', expected_args)
+            .should_receive('request')
+            .with_args('post', 'https://www.box.com/api/oauth2/token', data=expected_args)
             .and_return(mocked_response(fake_response))
             .once())
 
@@ -239,8 +242,8 @@ class TestAuthenticationV2(unittest.TestCase):
         }
 
         flexmock(requests)\
-            .should_receive('post')\
-            .with_args('https://www.box.com/api/oauth2/token', args)\
+            .should_receive('request')\
+            .with_args('post', 'https://www.box.com/api/oauth2/token', data=args)\
             .and_return(flexmock(json=lambda: {'aaa': 'bbb'}))\
             .once()
 
@@ -256,8 +259,8 @@ class TestAuthenticationV2(unittest.TestCase):
         }
 
         (flexmock(requests)
-            .should_receive('post')
-            .with_args('https://www.box.com/api/oauth2/token', args)
+            .should_receive('request')
+            .with_args('post', 'https://www.box.com/api/oauth2/token', data=args)
             .and_return(flexmock(json=lambda: {'aaa': 'bbb'}))
             .once())
 
@@ -272,6 +275,12 @@ class TestAuthenticationV2(unittest.TestCase):
         self.assertEqual('foobar', expected_exception.exception.message)
         self.assertEqual('some_error', expected_exception.exception.error)
 
+        with self.assertRaises(BoxAuthenticationException) as expected_exception:
+            _handle_auth_response(mocked_response('<html>Bad Gateway</html>', status_code=502))
+
+        self.assertEqual(502, expected_exception.exception.status_code)
+        self.assertEqual('invalid_response', expected_exception.exception.error)
+
 
 class TestCredentials(unittest.TestCase):
     def test_credentials_v1(self):
@@ -282,5 +291,160 @@ class TestCredentials(unittest.TestCase):
         credentials = CredentialsV2('my_token')
         self.assertDictEqual({'Authorization': 'Bearer my_token'}, credentials.headers)
 
+    def test_credentials_v2_refresh_tracks_expiry(self):
+        credentials = CredentialsV2('my_token', 'my_refresh_token', 'client_id', 'client_secret')
+        (flexmock(box.client)
+            .should_receive('refresh_v2_token')
+            .with_args('client_id', 'client_secret', 'my_refresh_token', None)
+            .and_return({'access_token': 'new_token', 'refresh_token': 'new_refresh_token', 'expires_in': 3600})
+            .once())
+
+        self.assertIsNone(credentials._expires_at)
+        self.assertTrue(credentials.refresh())
+        self.assertAlmostEqual(time.time() + 3600, credentials._expires_at, delta=5)
+
+    def test_credentials_v2_no_background_refresh_before_margin(self):
+        credentials = CredentialsV2('my_token', 'my_refresh_token', 'client_id', 'client_secret', expires_in=3600, refresh_margin=60)
+        (flexmock(box.client)
+            .should_receive('refresh_v2_token')
+            .never())
+
+        self.assertDictEqual({'Authorization': 'Bearer my_token'}, credentials.headers)
+        self.assertIsNone(credentials._background_refresh)
+
+    def test_credentials_v2_background_refresh(self):
+        callback = flexmock()
+        callback.should_receive('tokens_refreshed').with_args('new_token', 'new_refresh_token').once()
+        credentials = CredentialsV2('my_token', 'my_refresh_token', 'client_id', 'client_secret',
+                                    refresh_callback=callback.tokens_refreshed, expires_in=30, refresh_margin=60)
+        (flexmock(box.client)
+            .should_receive('refresh_v2_token')
+            .with_args('client_id', 'client_secret', 'my_refresh_token', None)
+            .and_return({'access_token': 'new_token', 'refresh_token': 'new_refresh_token', 'expires_in': 3600})
+            .once())
+
+        # the current token is handed out while the refresh runs
+        self.assertDictEqual({'Authorization': 'Bearer my_token'}, credentials.headers)
+        credentials._background_refresh.join()
+
+        self.assertDictEqual({'Authorization': 'Bearer new_token'}, credentials.headers)
+        self.assertEqual('new_refresh_token', credentials._refresh_token)
+
+    def test_credentials_v2_single_flight_refresh(self):
+        credentials = CredentialsV2('my_token', 'my_refresh_token', 'client_id', 'client_secret')
+        calls = []
+
+        def slow_refresh(client_id, client_secret, refresh_token, transport):
+            calls.append(refresh_token)
+            time.sleep(0.2)
+            return {'access_token': 'new_token', 'refresh_token': 'new_refresh_token'}
+
+        flexmock(box.client).should_receive('refresh_v2_token').replace_with(slow_refresh)
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(credentials.refresh())) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(['my_refresh_token'], calls)
+        self.assertEqual([True] * 5, results)
+        self.assertDictEqual({'Authorization': 'Bearer new_token'}, credentials.headers)
+
+    def test_credentials_v2_custom_lock(self):
+        class RecordingLock(object):
+            held = 0
+
+            def __enter__(self):
+                self.held += 1
+
+            def __exit__(self, *args):
+                pass
+
+        lock = RecordingLock()
+        credentials = CredentialsV2('my_token', 'my_refresh_token', 'client_id', 'client_secret', lock=lock)
+        (flexmock(box.client)
+            .should_receive('refresh_v2_token')
+            .and_return({'access_token': 'new_token'})
+            .once())
+
+        self.assertTrue(credentials.refresh())
+        self.assertEqual('new_token', credentials._access_token)
+        self.assertEqual(1, lock.held)
+
+    def test_credentials_v2_background_refresh_failure(self):
+        credentials = CredentialsV2('my_token', 'my_refresh_token', 'client_id', 'client_secret', expires_in=30, refresh_margin=60)
+        (flexmock(box.client)
+            .should_receive('refresh_v2_token')
+            .and_raise(BoxAuthenticationException(400, 'invalid_grant'))
+            .once())
+
+        credentials.headers
+        credentials._background_refresh.join()
+
+        self.assertFalse(credentials._should_refresh_in_background())
+        self.assertDictEqual({'Authorization': 'Bearer my_token'}, credentials.headers)
+
+    def test_credentials_v2_background_refresh_unexpected_failure(self):
+        credentials = CredentialsV2('my_token', 'my_refresh_token', 'client_id', 'client_secret', expires_in=30, refresh_margin=60)
+        (flexmock(box.client)
+            .should_receive('refresh_v2_token')
+            .and_return({'refresh_token': 'new_refresh_token'})
+            .once())
+
+        credentials.headers
+        credentials._background_refresh.join()
+
+        # the refresh isn't attempted again for every request
+        for _ in range(5):
+            self.assertDictEqual({'Authorization': 'Bearer my_token'}, credentials.headers)
+        self.assertFalse(credentials._background_refresh.is_alive())
+
+    def test_credentials_v2_refresh_through_client_transport(self):
+        credentials = CredentialsV2('my_token', 'my_refresh_token', 'client_id', 'client_secret')
+        transports = [flexmock(), flexmock()]
+        clients = [BoxClient(credentials, transport=transport) for transport in transports]
+
+        (transports[1]
+            .should_receive('request')
+            .with_args('get', 'https://api.box.com/2.0/users/me', params=None, data=None,
+                       headers={'Authorization': 'Bearer my_token'})
+            .and_return(mocked_response(status_code=401))
+            .once())
+        (transports[1]
+            .should_receive('request')
+            .with_args('post', 'https://www.box.com/api/oauth2/token', data={
+                'client_id': 'client_id',
+                'client_secret': 'client_secret',
+                'refresh_token': 'my_refresh_token',
+                'grant_type': 'refresh_token',
+            })
+            .and_return(mocked_response({'access_token': 'new_token', 'refresh_token': 'new_refresh_token'}))
+            .once())
+        (transports[1]
+            .should_receive('request')
+            .with_args('get', 'https://api.box.com/2.0/users/me', params=None, data=None,
+                       headers={'Authorization': 'Bearer new_token'})
+            .and_return(mocked_response({'name': 'bla'}))
+            .once())
+        transports[0].should_receive('request').never()
+
+        # the refresh goes through the transport of the client whose request was unauthorized
+        self.assertEqual({'name': 'bla'}, clients[1].get_user_info())
+        self.assertIsNone(credentials.transport)
+
+    def test_credentials_v2_own_transport(self):
+        transport = flexmock()
+        credentials = CredentialsV2('my_token', 'my_refresh_token', 'client_id', 'client_secret', transport=transport)
+        (flexmock(box.client)
+            .should_receive('refresh_v2_token')
+            .with_args('client_id', 'client_secret', 'my_refresh_token', transport)
+            .and_return({'access_token': 'new_token'})
+            .once())
+
+        self.assertTrue(credentials.refresh())
+
+
 if __name__ == '__main__':
     unittest.main()
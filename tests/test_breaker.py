@@ -0,0 +1,145 @@
+import unittest2 as unittest
+
+from flexmock import flexmock
+import requests
+
+from box import BoxClient, BoxClientException, CircuitBreakers, CircuitOpen, ItemDoesNotExist
+from box.breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+from tests import mocked_response
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def make_breaker(self, **kwargs):
+        return CircuitBreaker(min_requests=4, failure_rate=0.5, window=10, open_duration=30, clock=self.clock, **kwargs)
+
+    def test_opens_on_failure_rate(self):
+        breaker = self.make_breaker()
+        for success in (True, False, True):
+            self.assertTrue(breaker.allow())
+            breaker.record(success, 0.1)
+        self.assertEqual(CLOSED, breaker.state)
+
+        breaker.record(False, 0.1)
+        self.assertEqual(OPEN, breaker.state)
+        self.assertFalse(breaker.allow())
+        self.assertEqual(30, breaker.retry_after())
+
+    def test_failures_age_out_of_the_window(self):
+        breaker = self.make_breaker()
+        breaker.record(False, 0.1)
+        breaker.record(False, 0.1)
+        self.clock.now += 11
+        breaker.record(True, 0.1)
+        breaker.record(False, 0.1)
+        self.assertEqual(CLOSED, breaker.state)
+        self.assertEqual(2, breaker.stats()['requests'])
+
+    def test_slow_calls_count_as_failures(self):
+        breaker = self.make_breaker(slow_call_duration=1)
+        for _ in range(4):
+            breaker.record(True, 2)
+        self.assertEqual(OPEN, breaker.state)
+        self.assertEqual(4, breaker.stats()['slow'])
+
+    def test_half_open_probes(self):
+        breaker = self.make_breaker(probes=2)
+        for _ in range(4):
+            breaker.record(False, 0.1)
+
+        self.clock.now += 30
+        self.assertTrue(breaker.allow())
+        self.assertEqual(HALF_OPEN, breaker.state)
+        self.assertTrue(breaker.allow())
+        # only as many probes as configured are in flight at once
+        self.assertFalse(breaker.allow())
+
+        breaker.record(True, 0.1)
+        self.assertEqual(HALF_OPEN, breaker.state)
+        breaker.record(True, 0.1)
+        self.assertEqual(CLOSED, breaker.state)
+        self.assertEqual(0, breaker.stats()['requests'])
+
+    def test_failed_probe_reopens(self):
+        breaker = self.make_breaker()
+        for _ in range(4):
+            breaker.record(False, 0.1)
+
+        self.clock.now += 30
+        self.assertTrue(breaker.allow())
+        breaker.record(False, 0.1)
+        self.assertEqual(OPEN, breaker.state)
+        self.assertFalse(breaker.allow())
+
+    def test_stats(self):
+        breaker = self.make_breaker()
+        breaker.record(True, 0.1)
+        breaker.record(False, 0.3)
+        stats = breaker.stats()
+        self.assertEqual(0.5, stats['error_rate'])
+        self.assertAlmostEqual(0.2, stats['mean_latency'])
+
+
+class TestCircuitBreakers(unittest.TestCase):
+    def test_per_family(self):
+        breakers = CircuitBreakers(min_requests=1)
+        breakers.configure('events', slow_call_duration=700)
+        self.assertIs(breakers.get('api'), breakers['api'])
+        self.assertIsNot(breakers.get('api'), breakers.get('upload'))
+        self.assertEqual(1, breakers.get('events').min_requests)
+        self.assertEqual(700, breakers.get('events').slow_call_duration)
+        self.assertIsNone(breakers.get('api').slow_call_duration)
+
+    def test_client_fails_fast(self):
+        breakers = CircuitBreakers(min_requests=2)
+        client = BoxClient('my_token', circuit_breakers=breakers)
+
+        responses = [mocked_response(status_code=503), requests.ConnectionError('down')]
+
+        def request(*args, **kwargs):
+            response = responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        flexmock(requests).should_receive('request').replace_with(request)
+
+        with self.assertRaises(BoxClientException):
+            client.get_folder(1)
+        with self.assertRaises(requests.ConnectionError):
+            client.get_folder(1)
+
+        with self.assertRaises(CircuitOpen) as context:
+            client.get_folder(1)
+        self.assertEqual('api', context.exception.family)
+
+        # the other families are unaffected
+        (flexmock(requests)
+            .should_receive('request')
+            .and_return(mocked_response(status_code=302))
+            .once())
+        self.assertIsNone(client.get_thumbnail(1))
+        self.assertEqual(OPEN, breakers.stats()['api']['state'])
+        self.assertEqual(CLOSED, breakers.stats()['thumbnails']['state'])
+
+    def test_client_errors_dont_open(self):
+        client = BoxClient('my_token', circuit_breakers=CircuitBreakers(min_requests=1))
+        flexmock(requests).should_receive('request').and_return(mocked_response(status_code=404)).twice()
+
+        for _ in range(2):
+            with self.assertRaises(ItemDoesNotExist):
+                client.get_folder(1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,260 @@
+import os
+import shutil
+import tempfile
+
+import unittest2 as unittest
+
+from flexmock import flexmock
+
+from box import BoxClient, BoxClientException, ItemAlreadyExists, ItemDoesNotExist
+from box import PreconditionFailed
+from box.bulk import create_collaborations, edit_collaborations, delete_collaborations, run_bulk, BulkResult
+from box.bulk import DeleteCheckpoint, DeletePipeline, TRASHED, PURGED
+from box.models import File, Folder
+
+
+class TestBulk(unittest.TestCase):
+    def setUp(self):
+        self.client = BoxClient('my_token')
+
+    def test_run_bulk_keeps_order(self):
+        results = run_bulk(lambda row: BulkResult(row, row * 2), range(100), workers=4)
+        self.assertEqual([row * 2 for row in range(100)], [result.result for result in results])
+
+    def test_run_bulk_records_errors(self):
+        def fail(row):
+            raise ValueError(row)
+
+        results = run_bulk(fail, [1, 2])
+        self.assertFalse(results[0].ok)
+        self.assertIsInstance(results[1].error, ValueError)
+
+    def test_create_collaborations(self):
+        (flexmock(self.client)
+            .should_receive('create_collaboration_by_user_id')
+            .with_args('1', '10', role='editor', notify=False)
+            .and_return({'id': '100'})
+            .once())
+        (flexmock(self.client)
+            .should_receive('create_collaboration_by_login')
+            .with_args('2', 'someone@example.com', role='viewer', notify=False)
+            .and_raise(ItemAlreadyExists(409))
+            .once())
+        (flexmock(self.client)
+            .should_receive('create_collaboration_by_user_id')
+            .with_args('3', '30', role='viewer', notify=False)
+            .and_raise(BoxClientException(400, 'bad request'))
+            .once())
+
+        results = create_collaborations(self.client, [
+            (1, 10, 'editor'),
+            ({'id': 2}, 'someone@example.com'),
+            ('3', {'type': 'user', 'id': '30'}, 'viewer'),
+        ])
+
+        self.assertEqual([True, True, False], [result.ok for result in results])
+        self.assertEqual({'id': '100'}, results[0].result)
+        self.assertTrue(results[1].existed)
+        self.assertEqual(400, results[2].error.status_code)
+
+    def test_edit_collaborations(self):
+        (flexmock(self.client)
+            .should_receive('edit_collaboration')
+            .with_args('100', role='co-owner', etag='1')
+            .and_return({'id': '100', 'role': 'co-owner'})
+            .once())
+        (flexmock(self.client)
+            .should_receive('edit_collaboration')
+            .with_args('101', role='viewer', etag=None)
+            .and_return({'id': '101', 'role': 'viewer'})
+            .once())
+
+        results = edit_collaborations(self.client, [('100', 'co-owner', '1'), ({'id': '101'}, 'viewer')])
+        self.assertEqual(['co-owner', 'viewer'], [result.result['role'] for result in results])
+
+    def test_delete_collaborations(self):
+        (flexmock(self.client)
+            .should_receive('delete_collaboration')
+            .with_args('100', etag=None)
+            .once())
+        (flexmock(self.client)
+            .should_receive('delete_collaboration')
+            .with_args('101', etag='2')
+            .and_raise(ItemDoesNotExist(404))
+            .once())
+
+        results = delete_collaborations(self.client, ['100', ('101', '2')])
+        self.assertEqual([True, True], [result.ok for result in results])
+        self.assertEqual([False, True], [result.existed for result in results])
+
+
+class TestDeletePipeline(unittest.TestCase):
+    def setUp(self):
+        self.client = BoxClient('my_token')
+        self.tmp = tempfile.mkdtemp()
+        self.checkpoint_path = os.path.join(self.tmp, 'checkpoint.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_trash_and_purge(self):
+        flexmock(self.client).should_receive('delete_file').with_args('1', etag='e1').once()
+        flexmock(self.client).should_receive('delete_trashed_file').with_args('1').once()
+        flexmock(self.client).should_receive('delete_folder').with_args('2', etag=None, recursive=True).once()
+        flexmock(self.client).should_receive('delete_trashed_folder').with_args('2').once()
+
+        pipeline = DeletePipeline(self.client)
+        results = list(pipeline.run([{'type': 'file', 'id': '1', 'etag': 'e1'}, ('folder', 2)]))
+
+        self.assertEqual([PURGED, PURGED], [result.result for result in results])
+        self.assertEqual(2, pipeline.stats['purged'])
+
+    def test_missing_items_count_as_deleted(self):
+        flexmock(self.client).should_receive('delete_file').and_raise(ItemDoesNotExist(404)).once()
+        flexmock(self.client).should_receive('delete_trashed_file').and_raise(ItemDoesNotExist(404)).once()
+
+        results = list(DeletePipeline(self.client).run([('file', '1')]))
+        self.assertTrue(results[0].ok)
+        self.assertEqual(PURGED, results[0].result)
+
+    def test_without_purge(self):
+        flexmock(self.client).should_receive('delete_file').once()
+        flexmock(self.client).should_receive('delete_trashed_file').never()
+
+        results = list(DeletePipeline(self.client, purge=False).run([('file', '1')]))
+        self.assertEqual(TRASHED, results[0].result)
+
+    def test_resumes_from_checkpoint(self):
+        (flexmock(self.client)
+            .should_receive('delete_file')
+            .with_args('2', etag='stale')
+            .and_raise(PreconditionFailed(412))
+            .once())
+        flexmock(self.client).should_receive('delete_file').with_args('1', etag=None).once()
+        (flexmock(self.client)
+            .should_receive('delete_trashed_file')
+            .with_args('1')
+            .and_raise(BoxClientException(500))
+            .once())
+
+        pipeline = DeletePipeline(self.client, checkpoint=self.checkpoint_path)
+        results = dict((result.row[1], result) for result in pipeline.run([('file', '1'), ('file', '2', 'stale')]))
+
+        self.assertEqual(TRASHED, results['1'].result)
+        self.assertFalse(results['1'].ok)
+        self.assertIsNone(results['2'].result)
+        self.assertIsInstance(results['2'].error, PreconditionFailed)
+        self.assertEqual(2, pipeline.stats['failed'])
+
+        # the second run purges the file that made it to the trash, retries the other and skips the finished one
+        client = BoxClient('my_token')
+        flexmock(client).should_receive('delete_file').with_args('1', etag=None).never()
+        flexmock(client).should_receive('delete_trashed_file').with_args('1').once()
+        flexmock(client).should_receive('delete_file').with_args('2', etag=None).once()
+        flexmock(client).should_receive('delete_trashed_file').with_args('2').once()
+        flexmock(client).should_receive('delete_file').with_args('3', etag=None).never()
+
+        checkpoint = DeleteCheckpoint(self.checkpoint_path)
+        checkpoint.record('file', '3', PURGED)
+        pipeline = DeletePipeline(client, checkpoint=checkpoint)
+        results = list(pipeline.run([('file', '1'), ('file', '2'), ('file', '3')]))
+
+        self.assertEqual([PURGED, PURGED], [result.result for result in results])
+        self.assertEqual(1, pipeline.stats['skipped'])
+        self.assertEqual(PURGED, checkpoint.stage('file', '1'))
+
+    def test_bottom_up(self):
+        tree = {
+            '1': [{'type': 'file', 'id': '10', 'etag': '0'}, {'type': 'folder', 'id': '2', 'etag': '0'}],
+            '2': [{'type': 'file', 'id': '20', 'etag': '0'}, {'type': 'folder', 'id': '3', 'etag': '0'}],
+            '3': [],
+        }
+        calls = []
+        (flexmock(self.client)
+            .should_receive('get_folder_iterator')
+            .replace_with(lambda folder_id, fields: iter(tree[folder_id])))
+        (flexmock(self.client)
+            .should_receive('delete_file')
+            .replace_with(lambda file_id, etag: calls.append(('file', file_id))))
+        (flexmock(self.client)
+            .should_receive('delete_folder')
+            .replace_with(lambda folder_id, etag, recursive: calls.append(('folder', folder_id, recursive))))
+
+        pipeline = DeletePipeline(self.client, purge=False, bottom_up=True)
+        results = list(pipeline.run([('folder', '1')]))
+
+        self.assertEqual(5, len(results))
+        self.assertEqual(set([('file', '10'), ('file', '20')]), set(calls[:2]))
+        self.assertEqual([('folder', '3', False), ('folder', '2', False), ('folder', '1', False)], calls[2:])
+
+    def test_bottom_up_folder_already_trashed(self):
+        flexmock(self.client).should_receive('get_folder_iterator').and_raise(ItemDoesNotExist(404)).once()
+        flexmock(self.client).should_receive('delete_folder').never()
+        flexmock(self.client).should_receive('delete_trashed_folder').with_args('1').once()
+
+        pipeline = DeletePipeline(self.client, bottom_up=True)
+        results = list(pipeline.run([('folder', '1')]))
+
+        self.assertEqual([(('folder', '1', None), PURGED)], [(result.row, result.result) for result in results])
+        self.assertTrue(results[0].ok)
+
+    def test_bottom_up_listing_errors(self):
+        tree = {
+            '1': [{'type': 'file', 'id': '10', 'etag': '0'}, {'type': 'folder', 'id': '2', 'etag': '0'}],
+            '2': BoxClientException(500),
+        }
+
+        def get_folder_iterator(folder_id, fields):
+            if isinstance(tree[folder_id], Exception):
+                raise tree[folder_id]
+            return iter(tree[folder_id])
+
+        deleted = []
+        flexmock(self.client).should_receive('get_folder_iterator').replace_with(get_folder_iterator)
+        flexmock(self.client).should_receive('delete_file').replace_with(lambda file_id, etag: deleted.append(file_id))
+        (flexmock(self.client)
+            .should_receive('delete_folder')
+            .replace_with(lambda folder_id, etag, recursive: deleted.append(folder_id)))
+
+        pipeline = DeletePipeline(self.client, purge=False, bottom_up=True)
+        results = dict((result.row[1], result) for result in pipeline.run([('folder', '1')]))
+
+        self.assertEqual(500, results['2'].error.status_code)
+        self.assertIsNone(results['2'].result)
+        self.assertTrue(results['10'].ok)
+        self.assertEqual(['10', '1'], deleted)
+        self.assertEqual(1, pipeline.stats['failed'])
+
+    def test_bottom_up_lists_folders_before_deleting(self):
+        files = dict((str(file_id), File({'type': 'file', 'id': str(file_id), 'etag': '0'}))
+                     for file_id in range(100, 125))
+
+        def get_folder_iterator(folder_id, fields):
+            # pages read by offset, like the api: deleting while listing would shift the later pages
+            offset = 0
+            while True:
+                page = sorted(files)[offset:offset + 10]
+                if not page:
+                    return
+                for file_id in page:
+                    yield files[file_id]
+                offset += len(page)
+
+        def delete_folder(folder_id, etag, recursive):
+            if files:
+                raise BoxClientException(400, 'folder not empty')
+
+        flexmock(self.client).should_receive('get_folder_iterator').replace_with(get_folder_iterator)
+        flexmock(self.client).should_receive('delete_file').replace_with(lambda file_id, etag: files.pop(file_id))
+        flexmock(self.client).should_receive('delete_folder').replace_with(delete_folder).once()
+
+        pipeline = DeletePipeline(self.client, purge=False, workers=1, bottom_up=True)
+        results = list(pipeline.run([Folder({'type': 'folder', 'id': '1'})]))
+
+        self.assertEqual(26, len(results))
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual({}, files)
+
+
+if __name__ == '__main__':
+    unittest.main()
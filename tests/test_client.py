@@ -1,16 +1,27 @@
 from StringIO import StringIO
 from datetime import datetime
+from hashlib import sha1
 from httplib import CONFLICT, NOT_FOUND, PRECONDITION_FAILED, UNAUTHORIZED
 import json
-from tests import FileObjMatcher, UTC, mocked_response
+import os
+import threading
+import time
+from tests import FileObjMatcher, UTC, mocked_response, failing_import
 import unittest2 as unittest
 
 from flexmock import flexmock
 import requests
 
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+from box.client import IJSON_BACKENDS, _HashingReader, _load_ijson_backend, _load_json_backend, remaining_time
+from box.models import Collaboration, File, Folder
 from box import BoxClient, ShareAccess, EventFilter, BoxClientException,\
     ItemAlreadyExists, ItemDoesNotExist, PreconditionFailed, BoxAccountUnauthorized,\
-    CredentialsV2
+    CredentialsV2, DeadlineExceeded, IntegrityError, deadline
 
 
 class TestClient(unittest.TestCase):
@@ -62,6 +73,14 @@ class TestClient(unittest.TestCase):
         client = BoxClient(flexmock(headers={'hello': 'world'}))
         self.assertDictEqual(client.default_headers, {'hello': 'world'})
 
+    def test_as_user(self):
+        client = BoxClient('my_token')
+        user_client = client.as_user({'id': 123})
+
+        self.assertDictEqual({'Authorization': 'Bearer my_token'}, client.default_headers)
+        self.assertDictEqual({'Authorization': 'Bearer my_token', 'As-User': '123'}, user_client.default_headers)
+        self.assertIs(client.credentials, user_client.credentials)
+
     def test_get_id(self):
         self.assertEqual('123', BoxClient._get_id(123))
         self.assertEqual('123', BoxClient._get_id('123'))
@@ -161,8 +180,8 @@ class TestClient(unittest.TestCase):
 
         # The call to refresh the token
         (requests_mock
-            .should_receive('post')
-            .with_args('https://www.box.com/api/oauth2/token', {
+            .should_receive('request')
+            .with_args('post', 'https://www.box.com/api/oauth2/token', data={
                 'client_id': 'client_id',
                 'client_secret': 'client_secret',
                 'refresh_token': 'refresh_token',
@@ -189,6 +208,34 @@ class TestClient(unittest.TestCase):
         self.assertEqual(credentials._access_token, "new_access_token")
         self.assertEqual(credentials._refresh_token, "new_refresh_token")
 
+    def test_refresh_skipped_when_already_refreshed(self):
+        credentials = CredentialsV2("access_token", "refresh_token", "client_id", "client_secret")
+        client = BoxClient(credentials)
+
+        def refreshed_elsewhere(*args, **kwargs):
+            # another thread refreshes the tokens while this request is in flight
+            credentials._access_token = "new_access_token"
+            return mocked_response(status_code=401)
+
+        requests_mock = flexmock(requests)
+        (requests_mock
+            .should_receive('request')
+            .with_args("get", 'https://api.box.com/2.0/users/me', params=None, data=None,
+                       headers={"Authorization": "Bearer access_token"})
+            .replace_with(refreshed_elsewhere)
+            .once())
+
+        requests_mock.should_receive('request').with_args('post', 'https://www.box.com/api/oauth2/token', data=dict).never()
+
+        (requests_mock
+            .should_receive('request')
+            .with_args("get", 'https://api.box.com/2.0/users/me', params=None, data=None,
+                       headers={"Authorization": "Bearer new_access_token"})
+            .and_return(mocked_response({'name': 'bla'}))
+            .once())
+
+        self.assertDictEqual({'name': 'bla'}, client.get_user_info())
+
     def test_get_user_info(self):
         client = self.make_client("get", 'users/me', result={'name': 'bla'})
 
@@ -277,10 +324,191 @@ class TestClient(unittest.TestCase):
 
         self.assertListEqual(list(client.get_folder_iterator(666)), [])
 
+    def _mock_listing_stream(self, client, params, listing):
+        raw = StringIO(json.dumps(listing))
+        (flexmock(client)
+            .should_receive('_request')
+            .with_args('get', 'folders/666/items', params=params, stream=True)
+            .and_return(flexmock(raw=raw, close=lambda: None))
+            .once())
+
+    @unittest.skipIf(ijson is None, 'requires ijson')
+    def test_get_folder_iterator_incremental(self):
+        client = BoxClient('my_token')
+        self._mock_listing_stream(client, {'limit': 1000, 'offset': 0},
+                                  {'entries': [{'id': str(i)} for i in range(1000)], 'total_count': 1001})
+        self._mock_listing_stream(client, {'limit': 1000, 'offset': 1000},
+                                  {'entries': [{'id': '1000'}], 'total_count': 1001})
+
+        entries = list(client.get_folder_iterator(666, incremental=True))
+        self.assertEqual([{'id': str(i)} for i in range(1001)], entries)
+
+    def test_get_folder_iterator_incremental_without_ijson(self):
+        client = BoxClient('my_token')
+        (flexmock(client)
+            .should_receive('_request')
+            .with_args('get', 'folders/666/items', params={'limit': 1000, 'offset': 0})
+            .and_return(mocked_response({'entries': [{'id': '1'}], 'total_count': 1}))
+            .once())
+
+        with failing_import('ijson'):
+            self.assertEqual([{'id': '1'}], list(client.get_folder_iterator(666, incremental=True)))
+
+    @unittest.skipIf(ijson is None, 'requires ijson')
+    def test_ijson_backend(self):
+        backend = _load_ijson_backend()
+        self.assertIn(backend.__name__, IJSON_BACKENDS)
+        self.assertTrue(hasattr(backend, 'parse'))
+
+        # the pure python backend is the last resort
+        with failing_import('ijson.backends.yajl2_c'):
+            with failing_import('ijson.backends.yajl2_cffi'):
+                self.assertEqual('ijson', _load_ijson_backend().__name__)
+
+        with failing_import('ijson'):
+            self.assertIsNone(_load_ijson_backend())
+
+    def test_json_backend(self):
+        self.assertIs(json, _load_json_backend('json'))
+        backend = flexmock(loads=lambda content: {'decoded': content})
+        self.assertIs(backend, _load_json_backend(backend))
+        with self.assertRaises(ImportError):
+            _load_json_backend('no_such_json')
+
+        client = BoxClient('my_token', json_backend=backend)
+        (flexmock(requests)
+            .should_receive('request')
+            .and_return(mocked_response('hello')))
+        self.assertEqual({'decoded': 'hello'}, client.get_file_metadata(123))
+
+    def test_typed_results(self):
+        client = BoxClient('my_token', typed_results=True)
+        (flexmock(requests)
+            .should_receive('request')
+            .and_return(mocked_response({'type': 'file', 'id': '123', 'name': 'hello.txt'})))
+
+        result = client.get_file_metadata(123)
+        self.assertIsInstance(result, File)
+        self.assertEqual('hello.txt', result.name)
+
+    def test_typed_results_iterator(self):
+        client = BoxClient('my_token', typed_results=True)
+        (flexmock(requests)
+            .should_receive('request')
+            .and_return(mocked_response({'entries': [{'type': 'folder', 'id': '1'}, {'type': 'file', 'id': '2'}],
+                                         'total_count': 2})))
+
+        entries = list(client.get_folder_iterator(666))
+        self.assertIsInstance(entries[0], Folder)
+        self.assertIsInstance(entries[1], File)
+
+    def test_typed_results_of_changes(self):
+        client = BoxClient('my_token', typed_results=True)
+        sha1_of_content = sha1('hello').hexdigest()
+
+        def request(method, url, **kwargs):
+            if url.endswith('/search'):
+                return mocked_response({'entries': [{'type': 'file', 'id': '1'}, {'type': 'folder', 'id': '2'}],
+                                        'total_count': 2})
+            if url.endswith('/collaborations') and method == 'get':
+                return mocked_response({'entries': [{'type': 'collaboration', 'id': '3'}], 'total_count': 1})
+            if 'collaborations' in url:
+                return mocked_response({'type': 'collaboration', 'id': '3'})
+            if url.endswith('/content'):
+                return mocked_response({'entries': [{'type': 'file', 'id': '1', 'sha1': sha1_of_content, 'size': 5}]})
+            if '/folders' in url:
+                return mocked_response({'type': 'folder', 'id': '2'})
+            return mocked_response({'type': 'file', 'id': '1'})
+
+        flexmock(requests).should_receive('request').replace_with(request)
+
+        self.assertEqual([File, Folder], [type(entry) for entry in client.search('hello')['entries']])
+        self.assertIsInstance(client.get_folder_collaborations(2)['entries'][0], Collaboration)
+        self.assertIsInstance(client.create_collaboration_by_user_id(2, 4), Collaboration)
+        self.assertIsInstance(client.create_collaboration_by_login(2, 'someone@example.com'), Collaboration)
+        self.assertIsInstance(client.edit_collaboration(3), Collaboration)
+        self.assertIsInstance(client.copy_file(1, 2), File)
+        self.assertIsInstance(client.move_file(1, 2), File)
+        self.assertIsInstance(client.copy_folder(2, 0), Folder)
+        self.assertIsInstance(client.move_folder(2, 0), Folder)
+        self.assertIsInstance(client.create_folder('hello'), Folder)
+        self.assertIsInstance(client.upload_file('hello.txt', StringIO('hello')), File)
+        self.assertIsInstance(client.overwrite_file(1, StringIO('hello')), File)
+
     def test_get_folder_collaborations(self):
         client = self.make_client("get", 'folders/123/collaborations', result={'a': 'b'})
         self.assertEqual({'a': 'b'}, client.get_folder_collaborations(123))
 
+        client = self.make_client("get", 'folders/123/collaborations', params={'limit': 10, 'offset': 20}, result={'a': 'b'})
+        self.assertEqual({'a': 'b'}, client.get_folder_collaborations(123, limit=10, offset=20))
+
+    def _mock_pages(self, client, method, args, pages, page_size):
+        offset = 0
+        for i, page in enumerate(pages):
+            kwargs = {'limit': page_size}
+            if i:
+                kwargs['offset'] = offset
+            (flexmock(client)
+                .should_receive(method)
+                .with_args(*args, **kwargs)
+                .and_return(page)
+                .once())
+            offset += page_size
+
+    def test_get_user_iterator(self):
+        client = BoxClient('my_token')
+        self._mock_pages(client, 'get_user_list', (), [
+            {'entries': range(1000), 'total_count': 1500},
+            {'entries': range(1000, 1500), 'total_count': 1500},
+        ], 1000)
+
+        self.assertEqual(range(1500), list(client.get_user_iterator()))
+
+    def test_search_iterator_page_size_capped(self):
+        client = BoxClient('my_token')
+        self._mock_pages(client, 'search', ('hello',), [
+            {'entries': range(200), 'total_count': 250},
+            {'entries': range(200, 250), 'total_count': 250},
+        ], 200)
+
+        self.assertEqual(range(250), list(client.search_iterator('hello', page_size=5000)))
+
+    def test_iterator_short_page_with_total_count(self):
+        client = BoxClient('my_token')
+        self._mock_pages(client, 'get_file_comments', (123,), [
+            {'entries': range(8), 'total_count': 15},
+            {'entries': range(8, 15), 'total_count': 15},
+        ], 10)
+
+        self.assertEqual(range(15), list(client.get_file_comments_iterator(123, page_size=10)))
+
+    def test_iterator_without_total_count(self):
+        client = BoxClient('my_token')
+        self._mock_pages(client, 'get_file_tasks', (123,), [
+            {'entries': range(10)},
+            {'entries': range(10, 13)},
+        ], 10)
+
+        self.assertEqual(range(13), list(client.get_file_tasks_iterator(123, page_size=10)))
+
+    def test_iterator_endpoint_ignores_paging(self):
+        client = BoxClient('my_token')
+        self._mock_pages(client, 'get_folder_collaborations', (123,), [{'entries': range(30)}], 10)
+
+        self.assertEqual(range(30), list(client.get_folder_collaborations_iterator(123, page_size=10)))
+
+    def test_iterator_prefetch(self):
+        client = BoxClient('my_token')
+        self._mock_pages(client, 'get_user_list', (), [
+            {'entries': range(10), 'total_count': 25},
+            {'entries': range(10, 20), 'total_count': 25},
+            {'entries': range(20, 25), 'total_count': 25},
+        ], 10)
+
+        iterator = client.get_user_iterator(page_size=10, prefetch=True)
+        self.assertEqual(0, next(iterator))
+        self.assertEqual(range(1, 25), list(iterator))
+
     def test_copy_folder(self):
         client = self.make_client("post", 'folders/123/copy', data={'parent': {'id': '666'}}, result={'id': '1'})
         result = client.copy_folder(123, 666)
@@ -290,6 +518,16 @@ class TestClient(unittest.TestCase):
         result = client.copy_folder(123, 666, 'goatse.cx')
         self.assertEqual({'id': '1'}, result)
 
+    def test_move_folder(self):
+        client = self.make_client("put", 'folders/123', data={'parent': {'id': '666'}}, result={'id': '123'})
+        result = client.move_folder(123, 666)
+        self.assertEqual({'id': '123'}, result)
+
+        client = self.make_client("put", 'folders/123', data={'parent': {'id': '666'}, 'name': 'new'},
+                                  headers={'If-Match': 'deadbeef'}, result={'id': '123'})
+        result = client.move_folder(123, {'id': 666}, 'new', etag='deadbeef')
+        self.assertEqual({'id': '123'}, result)
+
     def test_create_folder_no_parent(self):
         expected_dict = {
             'name': 'hello',
@@ -314,6 +552,69 @@ class TestClient(unittest.TestCase):
         client = self.make_client("get", 'files/123', result={'a': 'b'})
         self.assertEqual({'a': 'b'}, client.get_file_metadata(123))
 
+    def _run_concurrently(self, *funcs):
+        results = [None] * len(funcs)
+
+        def run(i):
+            try:
+                results[i] = funcs[i]()
+            except Exception as e:
+                results[i] = e
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(len(funcs))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def _slow_response(self, calls, result=None, status_code=200):
+        def respond(method, url, **kwargs):
+            calls.append((url, kwargs['params']))
+            time.sleep(0.2)
+            return mocked_response(result, status_code=status_code)
+        return respond
+
+    def test_coalesced_requests(self):
+        client = BoxClient('my_token', coalesce_requests=True)
+        calls = []
+        flexmock(requests).should_receive('request').replace_with(self._slow_response(calls, {'id': '123'}))
+
+        results = self._run_concurrently(*[lambda: client.get_file_metadata(123)] * 5)
+
+        self.assertEqual([('https://api.box.com/2.0/files/123', None)], calls)
+        self.assertEqual([{'id': '123'}] * 5, results)
+        self.assertEqual({}, client._inflight)
+
+    def test_coalesced_requests_differ_by_params(self):
+        client = BoxClient('my_token', coalesce_requests=True)
+        calls = []
+        flexmock(requests).should_receive('request').replace_with(self._slow_response(calls, {'entries': []}))
+
+        self._run_concurrently(lambda: client.get_folder(1, offset=0), lambda: client.get_folder(1, offset=100))
+
+        self.assertEqual(2, len(calls))
+
+    def test_coalesced_requests_share_errors(self):
+        client = BoxClient('my_token', coalesce_requests=True)
+        calls = []
+        flexmock(requests).should_receive('request').replace_with(self._slow_response(calls, 'gone', status_code=404))
+
+        results = self._run_concurrently(*[lambda: client.get_file_metadata(123)] * 3)
+
+        self.assertEqual(1, len(calls))
+        for result in results:
+            self.assertIsInstance(result, ItemDoesNotExist)
+
+    def test_requests_not_coalesced_by_default(self):
+        client = BoxClient('my_token')
+        calls = []
+        flexmock(requests).should_receive('request').replace_with(self._slow_response(calls, {'id': '123'}))
+
+        self._run_concurrently(*[lambda: client.get_file_metadata(123)] * 3)
+
+        self.assertEqual(3, len(calls))
+
     def test_delete_file(self):
         client = self.make_client("delete", 'files/123')
         result = client.delete_file(123)
@@ -350,6 +651,12 @@ class TestClient(unittest.TestCase):
         result = client.delete_trashed_file(123)
         self.assertIsNone(result)
 
+    def test_delete_trashed_folder(self):
+        client = self.make_client("delete", 'folders/123/trash')
+
+        result = client.delete_trashed_folder(123)
+        self.assertIsNone(result)
+
     def test_download_file(self):
         client = self.make_client("get", "files/123/content", params={}, result='hello world', stream=True)
         response = client.download_file(123)
@@ -378,6 +685,22 @@ class TestClient(unittest.TestCase):
         thumbnail = client.get_thumbnail(123)
         self.assertIsNone(thumbnail)
 
+    def test_fetch_thumbnail(self):
+        client = BoxClient("my_token")
+
+        (flexmock(requests)
+            .should_receive('request')
+            .with_args("get",
+                       'https://api.box.com/2.0/files/123/thumbnail.png',
+                       params={'max_width': 64},
+                       data=None,
+                       headers=client.default_headers,
+                       stream=True)
+            .and_return(mocked_response(status_code=202, headers={"Location": "http://box.com", "Retry-After": "5"}))
+            .once())
+
+        self.assertEqual((None, 5), client.fetch_thumbnail(123, max_width=64))
+
     def test_file_get_comments(self):
         client = BoxClient("my_token")
 
@@ -741,6 +1064,19 @@ class TestClient(unittest.TestCase):
         thumbnail = client.get_thumbnail(123, max_wait=1)
         self.assertEqual('Thumbnail contents', thumbnail.read())
 
+    def test_get_thumbnail_deadline(self):
+        client = BoxClient("my_token")
+
+        (flexmock(requests)
+            .should_receive('request')
+            .and_return(mocked_response(status_code=202, headers={"Retry-After": "5"}))
+            .once())
+        flexmock(time).should_receive('sleep').never()
+
+        with deadline(1):
+            with self.assertRaises(DeadlineExceeded):
+                client.get_thumbnail(123, max_wait=10)
+
     def test_get_thumbnail_with_params(self):
         client = BoxClient("my_token")
 
@@ -800,9 +1136,9 @@ class TestClient(unittest.TestCase):
 
         response = mocked_response({'entries': [{'id': '1'}]})
         (flexmock(requests)
-            .should_receive('post')
-            .with_args('https://upload.box.com/api/2.0/files/content',
-                       {'parent_id': '666'},
+            .should_receive('request')
+            .with_args('post', 'https://upload.box.com/api/2.0/files/content',
+                       data={'parent_id': '666'},
                        headers=client.default_headers,
                        files={'hello.jpg': ('hello.jpg', FileObjMatcher('hello world'))})
             .and_return(response)
@@ -819,9 +1155,9 @@ class TestClient(unittest.TestCase):
             .should_receive('_check_for_errors')
             .once())
         (flexmock(requests)
-            .should_receive('post')
-            .with_args('https://upload.box.com/api/2.0/files/content',
-                       {
+            .should_receive('request')
+            .with_args('post', 'https://upload.box.com/api/2.0/files/content',
+                       data={
                            'parent_id': '666',
                            'content_modified_at': '2007-05-04T03:02:01+00:00',
                            'content_created_at': '2006-05-04T03:02:01+00:00'
@@ -844,9 +1180,9 @@ class TestClient(unittest.TestCase):
 
         response = mocked_response({'entries': [{'id': '1'}]})
         (flexmock(requests)
-            .should_receive('post')
-            .with_args('https://upload.box.com/api/2.0/files/content',
-                       {'parent_id': '666'},
+            .should_receive('request')
+            .with_args('post', 'https://upload.box.com/api/2.0/files/content',
+                       data={'parent_id': '666'},
                        headers=client.default_headers,
                        files={'hello.jpg': ('hello.jpg', FileObjMatcher('hello world'))})
             .and_return(response)
@@ -867,9 +1203,9 @@ class TestClient(unittest.TestCase):
 
         expected_response = mocked_response({'entries': [{'id': '1'}]})
         (flexmock(requests)
-            .should_receive('post')
-            .with_args('https://upload.box.com/api/2.0/files/666/content',
-                       {'content_modified_at': '2006-05-04T03:02:01+00:00'},
+            .should_receive('request')
+            .with_args('post', 'https://upload.box.com/api/2.0/files/666/content',
+                       data={'content_modified_at': '2006-05-04T03:02:01+00:00'},
                        headers=expected_headers,
                        files={'file': FileObjMatcher('hello world')})
             .and_return(expected_response)
@@ -888,6 +1224,16 @@ class TestClient(unittest.TestCase):
         result = client.copy_file(123, 666, 'goatse.cx')
         self.assertEqual({'id': '1'}, result)
 
+    def test_move_file(self):
+        client = self.make_client("put", 'files/123', data={'parent': {'id': '666'}}, result={'id': '123'})
+        result = client.move_file(123, 666)
+        self.assertEqual({'id': '123'}, result)
+
+        client = self.make_client("put", 'files/123', data={'parent': {'id': '666'}, 'name': 'new.txt'},
+                                  headers={'If-Match': 'deadbeef'}, result={'id': '123'})
+        result = client.move_file(123, 666, 'new.txt', etag='deadbeef')
+        self.assertEqual({'id': '123'}, result)
+
     def test_share_link(self):
         # defaults
         args = {
@@ -1035,8 +1381,8 @@ class TestClient(unittest.TestCase):
                 .once())
 
             (flexmock(requests)
-                .should_receive('get')
-                .with_args('http://2.realtime.services.box.net/subscribe', params=expected_get_params)
+                .should_receive('request')
+                .with_args('get', 'http://2.realtime.services.box.net/subscribe', params=expected_get_params)
                 .and_return(mocked_response({'message': 'new_message'}))
                 .once())
 
@@ -1066,14 +1412,50 @@ class TestClient(unittest.TestCase):
         }
 
         (flexmock(requests)
-            .should_receive('get')
-            .with_args('http://2.realtime.services.box.net/subscribe', params=expected_get_params)
+            .should_receive('request')
+            .with_args('get', 'http://2.realtime.services.box.net/subscribe', params=expected_get_params)
             .and_return(mocked_response({'message': 'new_message'}))
             .once())
 
         position = client.long_poll_for_events('some_stream_position', stream_type=EventFilter.CHANGES)
         self.assertEqual('some_stream_position', position)
 
+    def test_long_poll_for_events_timeout(self):
+        client = BoxClient('my_token', timeout=(5, 60))
+
+        (flexmock(client)
+            .should_receive('_get_long_poll_data')
+            .and_return({'url': 'http://2.realtime.services.box.net/subscribe?channel=12345678', 'retry_timeout': 610})
+            .once())
+
+        (flexmock(requests)
+            .should_receive('request')
+            .with_args('get', 'http://2.realtime.services.box.net/subscribe',
+                       params={'channel': ['12345678'], 'stream_type': 'all', 'stream_position': '1'},
+                       timeout=(5, 640))
+            .and_return(mocked_response({'message': 'new_change'}))
+            .once())
+
+        self.assertEqual('1', client.long_poll_for_events('1'))
+
+    def test_long_poll_for_events_deadline(self):
+        client = BoxClient('my_token')
+
+        (flexmock(client)
+            .should_receive('_get_long_poll_data')
+            .and_return({'url': 'http://2.realtime.services.box.net/subscribe?channel=12345678', 'retry_timeout': 610}))
+
+        def poll(method, url, params, timeout):
+            self.assertLessEqual(timeout, 0.05)
+            time.sleep(timeout)
+            raise requests.Timeout()
+
+        flexmock(requests).should_receive('request').replace_with(poll).once()
+
+        with self.assertRaises(DeadlineExceeded):
+            with deadline(0.05):
+                client.long_poll_for_events('1')
+
     def test_long_poll_for_events_multiple_tries(self):
         client = BoxClient('my_token')
 
@@ -1101,8 +1483,8 @@ class TestClient(unittest.TestCase):
         }
 
         (flexmock(requests)
-            .should_receive('get')
-            .with_args('http://2.realtime.services.box.net/subscribe', params=expected_get_params)
+            .should_receive('request')
+            .with_args('get', 'http://2.realtime.services.box.net/subscribe', params=expected_get_params)
             .and_return(mocked_response({'message': 'foo'}))
             .and_return(mocked_response({'message': 'foo'}))
             .and_return(mocked_response({'message': 'foo'}))
@@ -1136,8 +1518,8 @@ class TestClient(unittest.TestCase):
         }
 
         (flexmock(requests)
-            .should_receive('get')
-            .with_args('http://2.realtime.services.box.net/subscribe', params=expected_get_params)
+            .should_receive('request')
+            .with_args('get', 'http://2.realtime.services.box.net/subscribe', params=expected_get_params)
             .and_return(mocked_response({'message': 'foo'}))
             .and_return(mocked_response('some error', status_code=400))
             .times(2))
@@ -1205,5 +1587,162 @@ class TestClient(unittest.TestCase):
         self.assertIsNone(result)
 
 
+class TestTimeouts(unittest.TestCase):
+    def expect_request(self, timeout, times=1):
+        (flexmock(requests)
+            .should_receive('request')
+            .with_args('get', 'https://api.box.com/2.0/folders/1', params={'limit': 100, 'offset': 0}, data=None,
+                       headers=dict, timeout=timeout)
+            .and_return(mocked_response({'id': '1'}))
+            .times(times))
+
+    def test_client_timeout(self):
+        self.expect_request(timeout=(3, 30))
+        BoxClient('my_token', timeout=(3, 30)).get_folder(1)
+
+    def test_with_timeout(self):
+        client = BoxClient('my_token', timeout=10)
+        self.expect_request(timeout=120)
+        self.assertEqual({'id': '1'}, client.with_timeout(120).get_folder(1))
+        self.assertEqual(10, client.timeout)
+
+    def test_deadline_shortens_timeout(self):
+        client = BoxClient('my_token', timeout=(3, 30))
+
+        def request(method, url, timeout, **kwargs):
+            self.assertEqual(3, timeout[0])
+            self.assertLessEqual(timeout[1], 10)
+            return mocked_response({'id': '1'})
+
+        flexmock(requests).should_receive('request').replace_with(request).once()
+        with deadline(10):
+            client.get_folder(1)
+
+    def test_nested_deadlines(self):
+        with deadline(10):
+            with deadline(100):
+                self.assertLessEqual(remaining_time(), 10)
+            with deadline(1):
+                self.assertLessEqual(remaining_time(), 1)
+            self.assertGreater(remaining_time(), 1)
+        self.assertIsNone(remaining_time())
+
+    def test_deadline_cuts_iteration(self):
+        client = BoxClient('my_token')
+        pages = [{'entries': [{'id': '1'}], 'total_count': 2}, {'entries': [{'id': '2'}], 'total_count': 2}]
+
+        def request(method, url, **kwargs):
+            time.sleep(0.03)
+            return mocked_response(pages.pop(0))
+
+        flexmock(requests).should_receive('request').replace_with(request).once()
+
+        entries = []
+        with self.assertRaises(DeadlineExceeded):
+            with deadline(0.02):
+                for entry in client.get_folder_iterator(1, page_size=1):
+                    entries.append(entry)
+        self.assertEqual([{'id': '1'}], entries)
+
+    def test_deadline_reaches_prefetch(self):
+        client = BoxClient('my_token')
+        timeouts = []
+
+        def request(method, url, timeout, **kwargs):
+            timeouts.append(timeout)
+            offset = kwargs['params'].get('offset', 0)
+            return mocked_response({'entries': [{'id': str(offset)}], 'total_count': 2})
+
+        flexmock(requests).should_receive('request').replace_with(request).twice()
+        with deadline(10):
+            self.assertEqual(2, len(list(client.get_folder_iterator(1, page_size=1, prefetch=True))))
+        self.assertTrue(all(timeout <= 10 for timeout in timeouts))
+
+
+
+class TestIntegrity(unittest.TestCase):
+    def upload(self, entry):
+        client = BoxClient('my_token')
+
+        def request(method, url, data, headers, files):
+            # read the way requests encodes multipart bodies
+            self.assertEqual('hello world', files['hello.txt'][1].read())
+            return mocked_response({'entries': [entry]})
+
+        flexmock(requests).should_receive('request').replace_with(request).once()
+        return client.upload_file('hello.txt', StringIO('hello world'))
+
+    def test_upload(self):
+        entry = {'id': '1', 'size': 11, 'sha1': sha1('hello world').hexdigest()}
+        self.assertEqual(entry, self.upload(entry))
+
+    def test_corrupt_upload(self):
+        with self.assertRaises(IntegrityError) as expected_exception:
+            self.upload({'id': '1', 'size': 11, 'sha1': sha1('hello there').hexdigest()})
+
+        self.assertEqual(sha1('hello world').hexdigest(), expected_exception.exception.expected)
+        self.assertEqual(sha1('hello there').hexdigest(), expected_exception.exception.actual)
+
+    def test_hashing_reader(self):
+        fileobj = StringIO('skip hello world')
+        fileobj.read(5)
+        reader = _HashingReader(fileobj)
+
+        self.assertEqual('hello', reader.read(5))
+        # reading again after seeking back doesn't hash the data twice
+        reader.seek(5)
+        self.assertEqual('hello', reader.read(5))
+        self.assertEqual(' world', reader.read(6))
+        self.assertEqual(11, reader.size)
+        self.assertEqual(sha1('hello world').hexdigest(), reader.hexdigest())
+        self.assertEqual('', reader.read())
+
+    def test_hashing_reader_on_pipe(self):
+        read_end, write_end = os.pipe()
+        os.write(write_end, 'hello world')
+        os.close(write_end)
+
+        with os.fdopen(read_end, 'rb') as fileobj:
+            reader = _HashingReader(fileobj)
+            self.assertEqual('hello', reader.read(5))
+            self.assertEqual(' world', reader.read())
+
+        self.assertEqual(11, reader.size)
+        self.assertEqual(sha1('hello world').hexdigest(), reader.hexdigest())
+
+    def test_download_file_to(self):
+        client = BoxClient('my_token')
+        (flexmock(requests)
+            .should_receive('request')
+            .with_args('get', 'https://api.box.com/2.0/files/1/content', params={}, data=None,
+                       headers=client.default_headers, stream=True)
+            .and_return(flexmock(ok=True, status_code=200, iter_content=lambda size: iter(['hello', ' world'])))
+            .twice())
+
+        fileobj = StringIO()
+        digest = sha1('hello world').hexdigest()
+        self.assertEqual(digest, client.download_file_to(1, fileobj, sha1=digest))
+        self.assertEqual('hello world', fileobj.getvalue())
+
+        with self.assertRaises(IntegrityError):
+            client.download_file_to(1, StringIO(), sha1=sha1('hello there').hexdigest())
+
+    def test_download_file_to_fetches_sha1(self):
+        client = BoxClient('my_token')
+        (flexmock(requests)
+            .should_receive('request')
+            .with_args('get', 'https://api.box.com/2.0/files/1', params={'fields': 'sha1'}, data=None,
+                       headers=client.default_headers)
+            .and_return(mocked_response({'sha1': sha1('hello world').hexdigest()}))
+            .once())
+        (flexmock(requests)
+            .should_receive('request')
+            .with_args('get', 'https://api.box.com/2.0/files/1/content', params={}, data=None,
+                       headers=client.default_headers, stream=True)
+            .and_return(flexmock(ok=True, status_code=200, iter_content=lambda size: iter(['hello world'])))
+            .once())
+
+        self.assertEqual(sha1('hello world').hexdigest(), client.download_file_to(1, StringIO()))
+
 if __name__ == '__main__':
     unittest.main()
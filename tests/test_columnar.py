@@ -0,0 +1,82 @@
+from array import array
+import unittest2 as unittest
+
+from flexmock import flexmock
+
+from box import BoxClient
+from box.columnar import ListingColumns, fields_for_columns, MISSING
+from box.models import from_json
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+ENTRIES = [
+    {'type': 'folder', 'id': '11', 'name': 'Pictures', 'size': 100, 'modified_at': '2013-01-01T00:00:00-08:00',
+     'parent': {'type': 'folder', 'id': '0'}},
+    {'type': 'file', 'id': '12', 'name': 'tigers.jpeg', 'size': 629644, 'sha1': 'abcd',
+     'modified_at': '2013-01-02T00:00:00-08:00', 'parent': {'type': 'folder', 'id': '11'}},
+    {'type': 'file', 'id': '13', 'name': 'empty.txt', 'parent': None},
+]
+
+
+class TestListingColumns(unittest.TestCase):
+    def test_fields_for_columns(self):
+        self.assertEqual(['id', 'name', 'parent'], fields_for_columns(['id', 'name', 'parent_id']))
+
+    def test_from_entries(self):
+        columns = ListingColumns.from_entries(ENTRIES)
+
+        self.assertEqual(3, len(columns))
+        self.assertIsInstance(columns['id'], array)
+        self.assertEqual([11, 12, 13], list(columns['id']))
+        self.assertEqual([100, 629644, MISSING], list(columns['size']))
+        self.assertEqual([0, 11, MISSING], list(columns['parent_id']))
+        self.assertEqual(['folder', 'file', 'file'], columns['type'])
+        self.assertEqual(['Pictures', 'tigers.jpeg', 'empty.txt'], columns['name'])
+        self.assertEqual([None, 'abcd', None], columns['sha1'])
+
+    def test_unicode_values(self):
+        entries = [{'type': u'file', 'id': str(id), 'name': u'\u05e7\u05d5\u05d1\u05e5.\u05d8\u05e7\u05e1\u05d8',
+                    'extension': u'\u05d8\u05e7\u05e1\u05d8'} for id in range(2)]
+        columns = ListingColumns.from_entries(entries, columns=('type', 'extension'))
+
+        self.assertEqual([u'\u05d8\u05e7\u05e1\u05d8'] * 2, columns['extension'])
+        # a single copy of every distinct value is kept
+        self.assertIs(columns['extension'][0], columns['extension'][1])
+        self.assertIs(columns['type'][0], columns['type'][1])
+
+    def test_selected_columns(self):
+        columns = ListingColumns.from_entries(ENTRIES, columns=('id', 'name'))
+        self.assertEqual(('id', 'name'), columns.columns)
+        with self.assertRaises(KeyError):
+            columns['size']
+
+    def test_from_models(self):
+        columns = ListingColumns.from_entries([from_json(entry) for entry in ENTRIES])
+        self.assertEqual([0, 11, MISSING], list(columns['parent_id']))
+
+    def test_empty(self):
+        self.assertEqual(0, len(ListingColumns()))
+
+    @unittest.skipIf(numpy is None, 'requires numpy')
+    def test_to_numpy(self):
+        arrays = ListingColumns.from_entries(ENTRIES).to_numpy()
+        self.assertEqual([12], list(arrays['id'][arrays['size'] > 1000]))
+
+    def test_client_get_folder_columns(self):
+        client = BoxClient('my_token')
+        (flexmock(client)
+            .should_receive('get_folder_content')
+            .with_args(666, limit=1000, fields=['id', 'type', 'name', 'size', 'sha1', 'modified_at', 'parent'])
+            .and_return({'entries': ENTRIES, 'total_count': 3})
+            .once())
+
+        columns = client.get_folder_columns(666)
+        self.assertEqual([11, 12, 13], list(columns['id']))
+
+
+if __name__ == '__main__':
+    unittest.main()
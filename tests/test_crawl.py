@@ -0,0 +1,92 @@
+import os
+import unittest2 as unittest
+
+from box import BoxClient, ItemDoesNotExist
+from box.crawl import Crawl, CrawlFailed
+
+# folder id -> entries
+TREE = {
+    '0': [{'type': 'folder', 'id': '1', 'name': 'a'},
+          {'type': 'folder', 'id': '2', 'name': 'b'},
+          {'type': 'file', 'id': '10', 'name': 'x.txt', 'size': 1, 'sha1': 'x'}],
+    '1': [{'type': 'folder', 'id': '3', 'name': 'c'}] +
+         [{'type': 'file', 'id': str(id), 'name': '{0}.txt'.format(id), 'size': id, 'sha1': str(id)}
+          for id in range(100, 150)],
+    '2': [{'type': 'folder', 'id': '4', 'name': 'deleted'},
+          {'type': 'folder', 'id': '5', 'name': 'broken'}],
+    '3': [{'type': 'file', 'id': '11', 'name': 'y.txt', 'size': 2, 'sha1': 'y'}],
+}
+
+
+class FakeClient(BoxClient):
+    """
+    Serves TREE
+    """
+    def __init__(self):
+        super(FakeClient, self).__init__('my_token')
+
+    def get_folder_iterator(self, folder_id, incremental=False, fields=None, page_size=1000, prefetch=False):
+        if folder_id == '4':
+            raise ItemDoesNotExist(404)
+        if folder_id == '5':
+            raise ValueError('boom')
+        return iter(TREE[folder_id])
+
+
+def failing_factory():
+    raise ValueError('no credentials')
+
+
+def dying_transform(entry, path):
+    if entry['id'] == '11':
+        os._exit(3)
+    return entry['id']
+
+
+def names_and_pids(entry, path):
+    if entry['type'] == 'file':
+        return path, os.getpid()
+
+
+class TestCrawl(unittest.TestCase):
+    def test_crawl(self):
+        crawl = Crawl(FakeClient, processes=2, batch_size=7)
+        records = sorted(crawl.run())
+
+        self.assertEqual(57, len(records))
+        self.assertIn(('file', '10', '/x.txt', 1, 'x'), records)
+        self.assertIn(('file', '11', '/a/c/y.txt', 2, 'y'), records)
+        self.assertIn(('file', '149', '/a/149.txt', 149, '149'), records)
+        self.assertIn(('folder', '4', '/b/deleted', None, None), records)
+        self.assertEqual([('5', 'ValueError: boom')], crawl.errors)
+
+    def test_transform(self):
+        crawl = Crawl(FakeClient, transform=names_and_pids, processes=2)
+        records = list(crawl.run('1', '/a'))
+
+        self.assertEqual(['/a/100.txt', '/a/c/y.txt'], sorted(path for path, _ in records)[::50])
+        self.assertEqual(51, len(records))
+        # transformed in the crawling processes
+        self.assertNotIn(os.getpid(), set(pid for _, pid in records))
+
+    def test_abandoned(self):
+        crawl = Crawl(FakeClient, processes=2, batch_size=1)
+        records = crawl.run()
+        next(records)
+        records.close()
+
+    def test_client_factory_fails(self):
+        crawl = Crawl(failing_factory, processes=2, poll_interval=0.1)
+        with self.assertRaises(CrawlFailed) as expected_exception:
+            list(crawl.run())
+        self.assertIn('ValueError: no credentials', str(expected_exception.exception))
+
+    def test_worker_dies(self):
+        crawl = Crawl(FakeClient, transform=dying_transform, processes=2, poll_interval=0.1)
+        with self.assertRaises(CrawlFailed) as expected_exception:
+            list(crawl.run())
+        self.assertIn('exited with 3', str(expected_exception.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
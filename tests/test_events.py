@@ -0,0 +1,194 @@
+import random
+import threading
+import time
+import unittest2 as unittest
+
+from flexmock import flexmock
+
+from box import BoxClient, EventType
+from box.events import EventPipeline, NetEffect, compact_events
+from box.models import Event
+
+
+def event(event_id, item_id, event_type='ITEM_UPLOAD'):
+    return {'event_id': str(event_id), 'event_type': event_type, 'source': {'type': 'file', 'id': str(item_id)}}
+
+
+class FakeStream(object):
+    """
+    Serves batches of events, then nothing
+    """
+    def __init__(self, batches):
+        self.batches = list(batches)
+        self.calls = []
+
+    def get_events(self, stream_position='0', stream_type='all', limit=1000):
+        self.calls.append(stream_position)
+        if stream_position == 'now':
+            return {'entries': [], 'chunk_size': 0, 'next_stream_position': 0}
+
+        index = int(stream_position)
+        entries = self.batches[index] if index < len(self.batches) else []
+        return {'entries': entries, 'chunk_size': len(entries),
+                'next_stream_position': index + 1 if entries else index}
+
+
+class TestEventPipeline(unittest.TestCase):
+    def setUp(self):
+        self.client = BoxClient('my_token')
+
+    def stream(self, batches):
+        stream = FakeStream(batches)
+        flexmock(self.client).should_receive('get_events').replace_with(stream.get_events)
+        return stream
+
+    def test_keeps_order_per_item(self):
+        batches = [[event(batch * 100 + index, index % 5) for index in range(20)] for batch in range(3)]
+        self.stream(batches)
+        handled = []
+        lock = threading.Lock()
+        commits = []
+
+        def handler(event):
+            time.sleep(random.random() / 1000)
+            with lock:
+                handled.append(event)
+
+        pipeline = EventPipeline(self.client, handler, stream_position=0, commit=commits.append, workers=4)
+        self.assertEqual(3, pipeline.run(wait=False))
+
+        self.assertEqual(60, pipeline.handled)
+        # batches handled by the time the next one is dispatched are committed together
+        self.assertEqual(3, commits[-1])
+        self.assertEqual(sorted(set(commits)), commits)
+        for item_id in range(5):
+            expected = [e['event_id'] for batch in batches for e in batch if e['source']['id'] == str(item_id)]
+            self.assertEqual(expected, [e['event_id'] for e in handled if e['source']['id'] == str(item_id)])
+
+    def test_starts_now(self):
+        stream = self.stream([])
+        commits = []
+        pipeline = EventPipeline(self.client, lambda event: None, commit=commits.append)
+        self.assertEqual(0, pipeline.run(wait=False))
+        self.assertEqual(['now', 0], stream.calls)
+        self.assertEqual([0], commits)
+
+    def test_failure_isnt_committed(self):
+        self.stream([[event(1, 1), event(2, 2)], [event(3, 1), event(4, 3)], [event(5, 4)]])
+        commits = []
+
+        def handler(event):
+            if event['event_id'] == '3':
+                raise ValueError('boom')
+
+        pipeline = EventPipeline(self.client, handler, stream_position=0, commit=commits.append, workers=2)
+        with self.assertRaises(ValueError):
+            pipeline.run(wait=False)
+
+        self.assertEqual(1, pipeline.stream_position)
+        self.assertEqual([1], commits)
+
+    def test_backpressure(self):
+        stream = self.stream([[event(index, index) for index in range(5)], [event(5, 5)]])
+        release = threading.Event()
+
+        def handler(event):
+            release.wait(5)
+
+        pipeline = EventPipeline(self.client, handler, stream_position=0, workers=5, max_pending=2)
+        thread = threading.Thread(target=pipeline.run, kwargs={'wait': False})
+        thread.start()
+        time.sleep(0.05)
+
+        # waiting for the handlers to catch up before fetching more
+        self.assertEqual([0], stream.calls)
+        release.set()
+        thread.join(5)
+
+        self.assertEqual(6, pipeline.handled)
+        self.assertEqual(2, pipeline.stream_position)
+
+    def test_long_polls(self):
+        stream = self.stream([[event(1, 1)]])
+        pipeline = EventPipeline(self.client, lambda event: None, stream_position=0)
+
+        def long_poll(stream_position, stream_type):
+            stream.batches.append([event(2, 1)])
+            pipeline.stop()
+            return stream_position
+
+        flexmock(self.client).should_receive('long_poll_for_events').replace_with(long_poll).once()
+        self.assertEqual(1, pipeline.run())
+        self.assertEqual(1, pipeline.handled)
+
+    def test_compacts(self):
+        stream = self.stream([
+            [event(1, 1, EventType.ITEM_CREATE), event(2, 1, EventType.ITEM_UPLOAD)],
+            [event(3, 1, EventType.ITEM_MOVE), event(4, 2, EventType.ITEM_UPLOAD)],
+        ])
+        handled = []
+
+        pipeline = EventPipeline(self.client, handled.append, stream_position=0, workers=1, compact=True,
+                                 compact_window=10)
+        self.assertEqual(2, pipeline.run(wait=False))
+
+        # both batches were compacted together, until the stream was caught up
+        self.assertEqual([0, 1, 2, 2], stream.calls)
+        self.assertEqual(2, pipeline.compacted)
+        self.assertEqual([(['1', '2', '3'], NetEffect.UPSERT), (['4'], NetEffect.UPSERT)],
+                         sorted((e['merged_event_ids'], e['net_effect']) for e in handled))
+
+
+class TestCompactEvents(unittest.TestCase):
+    def test_net_effect(self):
+        events = [
+            event(1, 1, EventType.ITEM_CREATE),
+            event(2, 2, EventType.ITEM_UPLOAD),
+            event(3, 1, EventType.ITEM_UPLOAD),
+            event(4, 2, EventType.ITEM_TRASH),
+            event(5, 1, EventType.ITEM_MOVE),
+        ]
+        compacted = compact_events(events)
+
+        self.assertEqual(['4', '5'], [e['event_id'] for e in compacted])
+        self.assertEqual(NetEffect.TRASH, compacted[0]['net_effect'])
+        self.assertEqual(['2', '4'], compacted[0]['merged_event_ids'])
+        self.assertEqual(NetEffect.UPSERT, compacted[1]['net_effect'])
+        self.assertEqual(['1', '3', '5'], compacted[1]['merged_event_ids'])
+        # the original events are left alone
+        self.assertNotIn('net_effect', events[4])
+
+    def test_other_events_break_sequences(self):
+        events = [
+            event(1, 1, EventType.ITEM_UPLOAD),
+            event(2, 1, 'COMMENT_CREATE'),
+            event(3, 1, EventType.ITEM_UPLOAD),
+            event(4, 1, EventType.ITEM_UPLOAD),
+            {'event_id': '5', 'event_type': 'USER_LOGIN', 'source': None},
+            dict(event(6, 1, EventType.ITEM_UPLOAD), source={'type': 'folder', 'id': '1'}),
+        ]
+        compacted = compact_events(events)
+
+        self.assertEqual(['1', '2', '4', '5', '6'], [e['event_id'] for e in compacted])
+        self.assertEqual(['3', '4'], compacted[2]['merged_event_ids'])
+        self.assertNotIn('net_effect', compacted[1])
+
+    def test_generator(self):
+        events = [event(1, 1, EventType.ITEM_CREATE), event(2, 1, EventType.ITEM_UPLOAD), event(3, 1, EventType.ITEM_MOVE)]
+        compacted = compact_events(e for e in events)
+
+        self.assertEqual(1, len(compacted))
+        self.assertEqual(['1', '2', '3'], compacted[0]['merged_event_ids'])
+
+    def test_typed_events(self):
+        events = [Event(event(1, 1, EventType.ITEM_UPLOAD)), Event(event(2, 1, EventType.ITEM_TRASH))]
+        compacted = compact_events(events)
+
+        self.assertEqual(1, len(compacted))
+        self.assertIsInstance(compacted[0], Event)
+        self.assertEqual(NetEffect.TRASH, compacted[0]['net_effect'])
+        self.assertEqual('1', compacted[0].source['id'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,226 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest2 as unittest
+
+from flexmock import flexmock
+
+from box import BoxClient, BoxClientException, ItemDoesNotExist
+from box.inventory import Inventory
+
+
+def folder(id, name, parent_id, **kwargs):
+    return dict(type='folder', id=id, name=name, parent={'type': 'folder', 'id': parent_id}, **kwargs)
+
+
+def file(id, name, parent_id, **kwargs):
+    return dict(type='file', id=id, name=name, parent={'type': 'folder', 'id': parent_id}, **kwargs)
+
+
+class FakeClient(BoxClient):
+    """
+    Serves folder trees & events from memory
+    """
+    def __init__(self, trees, collaborations=None, events=None):
+        super(FakeClient, self).__init__('my_token')
+        self.trees = trees
+        self.collaborations = collaborations or {}
+        self.events = events or {}
+        self.before_get_events = None
+
+    @property
+    def user(self):
+        return self._extra_headers['As-User']
+
+    def get_user_list(self, limit=100, offset=0):
+        users = [{'type': 'user', 'id': user_id} for user_id in sorted(self.trees)]
+        return {'entries': users[offset:offset + limit], 'total_count': len(users)}
+
+    def get_events(self, stream_position='0', stream_type=None, limit=1000):
+        if stream_position == 'now':
+            return {'entries': [], 'chunk_size': 0, 'next_stream_position': 100}
+        if self.before_get_events is not None:
+            self.before_get_events(self.user, stream_position)
+        events = self.events.get(self.user, [])
+        if isinstance(events, Exception):
+            raise events
+        # served in chunks of 1000, from position 100 up to 200
+        index = int(stream_position) - 100
+        entries = events[index * 1000:(index + 1) * 1000]
+        last = (index + 1) * 1000 >= len(events)
+        return {'entries': entries, 'chunk_size': len(entries), 'next_stream_position': 200 if last else 101 + index}
+
+    def get_folder_iterator(self, folder_id, incremental=False, fields=None):
+        tree = self.trees[self.user]
+        if tree.get(folder_id) == 403:
+            raise BoxClientException(403, 'forbidden')
+        if folder_id not in tree:
+            raise ItemDoesNotExist(404)
+        return iter(tree[folder_id])
+
+    def get_folder_collaborations(self, folder_id, limit=None, offset=None):
+        collaborations = self.collaborations.get(folder_id, [])
+        offset = offset or 0
+        return {'entries': collaborations[offset:offset + limit], 'total_count': len(collaborations)}
+
+
+class TestInventory(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'inventory.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def make_inventory(self, client):
+        inventory = Inventory(client, self.path, workers=4, batch_size=3)
+        self.addCleanup(inventory.close)
+        return inventory
+
+    def crawl(self, **kwargs):
+        client = FakeClient({
+            '1': {
+                '0': [folder('10', 'Docs', '0', has_collaborations=True), file('11', 'a.txt', '0', size=5, sha1='aa')],
+                '10': [file('12', 'b.txt', '10', size=7), folder('13', 'Old', '10')],
+                '13': [file('14', 'c.txt', '13')],
+            },
+            '2': {
+                '0': [file('21', 'a.txt', '0', sha1='aa')],
+            },
+        }, collaborations={
+            '10': [{'type': 'collaboration', 'id': '500', 'role': 'editor', 'status': 'accepted',
+                    'accessible_by': {'type': 'user', 'id': '2', 'login': 'two@example.com'}}],
+        }, **kwargs)
+        inventory = self.make_inventory(client)
+        inventory.crawl()
+        return inventory
+
+    def test_crawl(self):
+        inventory = self.crawl()
+
+        self.assertEqual([
+            ('1', 'folder', '10', '/Docs'),
+            ('1', 'folder', '13', '/Docs/Old'),
+            ('1', 'file', '14', '/Docs/Old/c.txt'),
+            ('1', 'file', '12', '/Docs/b.txt'),
+            ('1', 'file', '11', '/a.txt'),
+            ('2', 'file', '21', '/a.txt'),
+        ], inventory.query('SELECT user_id, type, id, path FROM items ORDER BY user_id, path'))
+
+        self.assertEqual([('11',), ('21',)], inventory.query("SELECT id FROM items WHERE sha1 = 'aa' ORDER BY id"))
+        self.assertEqual([('500', '10', 'two@example.com', 'editor')],
+                         inventory.query('SELECT id, folder_id, accessible_by_login, role FROM collaborations'))
+        self.assertEqual([('1', '100'), ('2', '100')],
+                         inventory.query('SELECT * FROM stream_positions ORDER BY user_id'))
+
+    def test_recrawl_replaces_items(self):
+        self.crawl()
+        inventory = self.crawl()
+        self.assertEqual(6, inventory.query('SELECT count(*) FROM items')[0][0])
+
+    def test_failed_user_keeps_their_snapshot(self):
+        self.crawl()
+
+        client = FakeClient({
+            '1': {
+                '0': [folder('10', 'Docs', '0'), file('16', 'e.txt', '0')],
+                '10': 403,
+            },
+            '2': {
+                '0': [file('22', 'f.txt', '0')],
+            },
+        })
+        inventory = self.make_inventory(client)
+        flexmock(client).should_receive('get_events').and_return({'next_stream_position': 300})
+        errors = inventory.crawl()
+
+        self.assertEqual(['1'], list(errors))
+        self.assertEqual(403, errors['1'].status_code)
+        self.assertEqual([('1', '10'), ('1', '11'), ('1', '12'), ('1', '13'), ('1', '14'), ('2', '22')],
+                         inventory.query('SELECT user_id, id FROM items ORDER BY user_id, id'))
+        self.assertEqual([('1', '100'), ('2', '300')],
+                         inventory.query('SELECT * FROM stream_positions ORDER BY user_id'))
+
+    def test_refresh(self):
+        path_collection = {'entries': [{'type': 'folder', 'id': '0', 'name': 'All Files'}]}
+        inventory = self.crawl(events={'1': [
+            {'event_type': 'ITEM_TRASH', 'source': {'type': 'file', 'id': '11'}},
+            {'event_type': 'ITEM_MOVE', 'source': dict(folder('13', 'New', '0'), path_collection=path_collection)},
+            {'event_type': 'ITEM_UPLOAD', 'source': dict(file('15', 'd.txt', '0', size=1), path_collection=path_collection)},
+            {'event_type': 'COLLAB_INVITE_COLLABORATOR', 'source': {'type': 'collaboration', 'id': '501'}},
+        ]})
+
+        self.assertEqual(3, inventory.refresh())
+
+        self.assertEqual([
+            ('10', '/Docs'),
+            ('12', '/Docs/b.txt'),
+            ('13', '/New'),
+            ('14', '/New/c.txt'),
+            ('15', '/d.txt'),
+        ], inventory.query("SELECT id, path FROM items WHERE user_id = '1' ORDER BY path"))
+        self.assertEqual([('1', '200'), ('2', '200')],
+                         inventory.query('SELECT * FROM stream_positions ORDER BY user_id'))
+
+    def test_refresh_in_chunks(self):
+        path_collection = {'entries': [{'type': 'folder', 'id': '0', 'name': 'All Files'}]}
+        events = [{'event_type': 'ITEM_UPLOAD',
+                   'source': dict(file(str(1000 + index), '{0}.txt'.format(index), '0'), path_collection=path_collection)}
+                  for index in range(2500)]
+        inventory = self.crawl(events={'1': events})
+        committed = []
+
+        def before_get_events(user_id, stream_position):
+            if user_id == '1':
+                # as seen by another connection
+                db = sqlite3.connect(self.path)
+                committed.append((stream_position, db.execute(
+                    "SELECT count(*) FROM items WHERE user_id = '1' AND CAST(id AS INTEGER) >= 1000").fetchone()[0]))
+                db.close()
+
+        inventory.client.before_get_events = before_get_events
+        inventory.batch_size = 10000
+
+        self.assertEqual(2500, inventory.refresh())
+        # every chunk was committed with the position after it before the next one was fetched
+        self.assertEqual([('100', 0), ('101', 1000), ('102', 2000)],
+                         [(str(position), count) for position, count in committed])
+        self.assertEqual([('1', '200'), ('2', '200')],
+                         inventory.query('SELECT * FROM stream_positions ORDER BY user_id'))
+
+    def test_refresh_errors(self):
+        path_collection = {'entries': [{'type': 'folder', 'id': '0', 'name': 'All Files'}]}
+        inventory = self.crawl(events={
+            '1': BoxClientException(403, 'forbidden'),
+            '2': [{'event_type': 'ITEM_UPLOAD', 'source': dict(file('22', 'b.txt', '0'), path_collection=path_collection)}],
+        })
+
+        self.assertEqual(1, inventory.refresh())
+
+        self.assertEqual(['1'], list(inventory.errors))
+        self.assertEqual(403, inventory.errors['1'].status_code)
+        self.assertEqual([('21',), ('22',)], inventory.query("SELECT id FROM items WHERE user_id = '2' ORDER BY id"))
+        self.assertEqual([('1', '100'), ('2', '200')],
+                         inventory.query('SELECT * FROM stream_positions ORDER BY user_id'))
+
+    def test_paginated_collaborations(self):
+        collaborations = [{'type': 'collaboration', 'id': str(500 + index), 'role': 'viewer', 'status': 'accepted',
+                           'accessible_by': {'type': 'user', 'id': str(index)}} for index in range(1200)]
+        client = FakeClient({'1': {'0': [folder('10', 'Docs', '0', has_collaborations=True)], '10': []}},
+                            collaborations={'10': collaborations})
+        inventory = self.make_inventory(client)
+        inventory.crawl()
+
+        self.assertEqual(1200, inventory.query('SELECT count(*) FROM collaborations')[0][0])
+
+    def test_refresh_trash_folder(self):
+        inventory = self.crawl(events={'1': [{'event_type': 'ITEM_TRASH', 'source': {'type': 'folder', 'id': '10'}}]})
+        inventory.refresh()
+
+        self.assertEqual([('11',)], inventory.query("SELECT id FROM items WHERE user_id = '1'"))
+        self.assertEqual([], inventory.query('SELECT * FROM collaborations'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest2 as unittest
+
+from box import FileLock
+
+
+class TestFileLock(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'refresh.lock')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_creates_lock_file(self):
+        with FileLock(self.path):
+            self.assertTrue(os.path.exists(self.path))
+
+    def test_excludes_other_holders(self):
+        events = []
+
+        def hold(name):
+            # separate instances behave like separate processes sharing the file
+            with FileLock(self.path):
+                events.append(name + ' in')
+                time.sleep(0.1)
+                events.append(name + ' out')
+
+        threads = [threading.Thread(target=hold, args=(name,)) for name in ('a', 'b')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(events[0][0], events[1][0])
+        self.assertEqual(events[2][0], events[3][0])
+
+    def test_reusable(self):
+        lock = FileLock(self.path)
+        for _ in range(3):
+            with lock:
+                pass
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+import json
+
+import unittest2 as unittest
+
+from flexmock import flexmock
+
+from box import BoxClient, ItemAlreadyExists, PreconditionFailed
+from box.migration import Migration, MigrationMode, OnConflict, _numbered_name, _conflicting_item
+from box.models import File, Folder
+
+
+def conflict(existing=None):
+    body = {'type': 'error', 'status': 409, 'code': 'item_name_in_use'}
+    if existing is not None:
+        body['context_info'] = {'conflicts': [existing]}
+    return ItemAlreadyExists(409, json.dumps(body))
+
+
+class TestMigration(unittest.TestCase):
+    def setUp(self):
+        self.client = BoxClient('my_token')
+
+    def test_numbered_name(self):
+        self.assertEqual('report (2).pdf', _numbered_name('report.pdf', 2))
+        self.assertEqual('Projects (1)', _numbered_name('Projects', 1))
+
+    def test_conflicting_item(self):
+        self.assertEqual({'id': '5'}, _conflicting_item(conflict({'id': '5'})))
+        self.assertEqual({'id': '5'}, _conflicting_item(ItemAlreadyExists(409, json.dumps({'context_info': {'conflicts': {'id': '5'}}}))))
+        self.assertIsNone(_conflicting_item(conflict()))
+        self.assertIsNone(_conflicting_item(ItemAlreadyExists(409, 'not json')))
+
+    def test_copy(self):
+        flexmock(self.client).should_receive('copy_folder').with_args('1', '100', new_foldername=None).and_return({'id': '11'}).once()
+        flexmock(self.client).should_receive('copy_file').with_args('2', '200', new_filename=None).and_return({'id': '22'}).once()
+
+        migration = Migration(self.client, [(('folder', 1), 100), ({'type': 'file', 'id': '2'}, {'id': '200'})])
+        results = sorted(migration.run(), key=lambda result: result.result['id'])
+
+        self.assertEqual([{'id': '11'}, {'id': '22'}], [result.result for result in results])
+        self.assertEqual(2, migration.stats['migrated'])
+
+    def test_move_with_etag(self):
+        (flexmock(self.client)
+            .should_receive('move_file')
+            .with_args('2', '200', new_filename=None, etag='3')
+            .and_raise(PreconditionFailed(412))
+            .once())
+
+        migration = Migration(self.client, {('file', '2', '3'): '200'}, mode=MigrationMode.MOVE)
+        results = list(migration.run())
+
+        self.assertIsInstance(results[0].error, PreconditionFailed)
+        self.assertEqual(1, migration.stats['failed'])
+
+    def test_conflicts(self):
+        flexmock(self.client).should_receive('copy_file').with_args('1', '100', new_filename=None).and_raise(conflict()).once()
+        results = list(Migration(self.client, [(('file', '1'), '100')]).run())
+        self.assertIsInstance(results[0].error, ItemAlreadyExists)
+
+        flexmock(self.client).should_receive('copy_file').with_args('2', '100', new_filename=None).and_raise(conflict({'id': '3'})).once()
+        results = list(Migration(self.client, [(('file', '2'), '100')], on_conflict=OnConflict.SKIP).run())
+        self.assertTrue(results[0].ok)
+        self.assertTrue(results[0].existed)
+        self.assertEqual({'id': '3'}, results[0].result)
+
+    def test_rename(self):
+        flexmock(self.client).should_receive('copy_file').with_args('1', '100', new_filename=None).and_raise(conflict()).once()
+        flexmock(self.client).should_receive('copy_file').with_args('1', '100', new_filename='a (1).txt').and_raise(conflict()).once()
+        flexmock(self.client).should_receive('copy_file').with_args('1', '100', new_filename='a (2).txt').and_return({'id': '2'}).once()
+        flexmock(self.client).should_receive('get_file_metadata').with_args('1').and_return({'name': 'a.txt'}).once()
+
+        migration = Migration(self.client, [(('file', '1'), '100')], on_conflict=OnConflict.RENAME)
+        results = list(migration.run())
+
+        self.assertEqual({'id': '2'}, results[0].result)
+        self.assertEqual(1, migration.stats['renamed'])
+
+    def test_merge(self):
+        # folder 1 holds a file and folder 2, and both collide in the destination folder 100
+        (flexmock(self.client)
+            .should_receive('move_folder')
+            .with_args('1', '100', new_foldername=None, etag=None)
+            .and_raise(conflict({'type': 'folder', 'id': '10', 'name': 'Projects'})))
+        (flexmock(self.client)
+            .should_receive('move_folder')
+            .with_args('2', '10', new_foldername=None, etag='0')
+            .and_raise(conflict()))
+        (flexmock(self.client)
+            .should_receive('move_file')
+            .with_args('3', '10', new_filename=None, etag='0')
+            .and_return({'id': '3'}))
+        (flexmock(self.client)
+            .should_receive('move_file')
+            .with_args('4', '20', new_filename=None, etag='0')
+            .and_raise(conflict()))
+        (flexmock(self.client)
+            .should_receive('move_file')
+            .with_args('4', '20', new_filename='b (1).txt', etag='0')
+            .and_return({'id': '4'}))
+
+        listings = {
+            '1': [{'type': 'file', 'id': '3', 'name': 'a.txt', 'etag': '0'},
+                  {'type': 'folder', 'id': '2', 'name': 'Old', 'etag': '0'}],
+            '2': [{'type': 'file', 'id': '4', 'name': 'b.txt', 'etag': '0'}],
+            # the destination of folder 2, whose conflict isn't described in the error
+            '10': [{'type': 'folder', 'id': '20', 'name': 'Old'}],
+        }
+        (flexmock(self.client)
+            .should_receive('get_folder_iterator')
+            .replace_with(lambda folder_id, fields: iter(listings[folder_id])))
+
+        deleted = []
+        (flexmock(self.client)
+            .should_receive('delete_folder')
+            .replace_with(lambda folder_id, recursive: deleted.append(folder_id)))
+
+        migration = Migration(self.client, [(('folder', '1'), '100')], mode=MigrationMode.MOVE,
+                              on_conflict=OnConflict.MERGE)
+        results = list(migration.run())
+
+        self.assertTrue(all(result.ok for result in results))
+        # the top folder is reported last, once everything it held moved
+        self.assertEqual((('folder', '1'), '100'), results[-1].row)
+        self.assertEqual({'type': 'folder', 'id': '10', 'name': 'Projects'}, results[-1].result)
+        self.assertEqual(['2', '1'], deleted)
+        self.assertEqual({'migrated': 1, 'renamed': 1, 'skipped': 0, 'merged': 2, 'failed': 0}, migration.stats)
+
+    def test_merge_typed_items(self):
+        (flexmock(self.client)
+            .should_receive('move_folder')
+            .with_args('1', '100', new_foldername=None, etag='0')
+            .and_raise(conflict({'type': 'folder', 'id': '10', 'name': 'Projects'})))
+        (flexmock(self.client)
+            .should_receive('move_file')
+            .with_args('3', '10', new_filename=None, etag='0')
+            .and_return({'id': '3'})
+            .once())
+        (flexmock(self.client)
+            .should_receive('get_folder_iterator')
+            .replace_with(lambda folder_id, fields: iter([File({'type': 'file', 'id': '3', 'name': 'a.txt',
+                                                                 'etag': '0'})])))
+        flexmock(self.client).should_receive('delete_folder').with_args('1', recursive=False).once()
+
+        folder = Folder({'type': 'folder', 'id': '1', 'name': 'Projects', 'etag': '0'})
+        results = list(Migration(self.client, [(folder, '100')], mode=MigrationMode.MOVE,
+                                 on_conflict=OnConflict.MERGE).run())
+
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual(2, len(results))
+
+    def test_failed_merge_keeps_source(self):
+        (flexmock(self.client)
+            .should_receive('move_folder')
+            .and_raise(conflict({'type': 'folder', 'id': '10'})))
+        (flexmock(self.client)
+            .should_receive('get_folder_iterator')
+            .and_return(iter([{'type': 'file', 'id': '3', 'name': 'a.txt', 'etag': '0'}])))
+        (flexmock(self.client)
+            .should_receive('move_file')
+            .and_raise(PreconditionFailed(412)))
+        flexmock(self.client).should_receive('delete_folder').never()
+
+        results = list(Migration(self.client, [(('folder', '1'), '100')], mode=MigrationMode.MOVE,
+                                 on_conflict=OnConflict.MERGE).run())
+
+        self.assertEqual(2, len(results))
+        self.assertIsInstance(results[1].error, PreconditionFailed)
+
+
+if __name__ == '__main__':
+    unittest.main()
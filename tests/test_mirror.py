@@ -0,0 +1,241 @@
+from hashlib import sha1
+import os
+import shutil
+import tempfile
+import unittest2 as unittest
+
+from flexmock import flexmock
+
+from box import BoxClient, ItemAlreadyExists, ItemDoesNotExist, PreconditionFailed
+import box.mirror
+from box.mirror import Mirror
+
+
+class FakeResponse(object):
+    def __init__(self, content):
+        self.content = content
+
+    def iter_content(self, chunk_size):
+        return iter([self.content])
+
+
+class FakeClient(BoxClient):
+    """
+    Serves a folder tree from memory
+    """
+    def __init__(self):
+        super(FakeClient, self).__init__('my_token')
+        self.folders = {'0': {'name': 'root', 'parent': None}}
+        self.files = {}
+        self.next_id = 1
+
+    def _new_id(self):
+        self.next_id += 1
+        return str(self.next_id)
+
+    def _entry(self, file_id):
+        info = self.files[file_id]
+        return {'type': 'file', 'id': file_id, 'name': info['name'], 'etag': str(info['etag']),
+                'sha1': sha1(info['content']).hexdigest(), 'size': len(info['content'])}
+
+    def _names(self, parent):
+        names = [info['name'] for info in self.folders.values() if info['parent'] == parent]
+        return names + [info['name'] for info in self.files.values() if info['parent'] == parent]
+
+    def get_folder_iterator(self, folder_id, incremental=False, fields=None):
+        entries = [{'type': 'folder', 'id': id, 'name': info['name']}
+                   for id, info in self.folders.items() if info['parent'] == folder_id]
+        entries.extend(self._entry(id) for id, info in self.files.items() if info['parent'] == folder_id)
+        return iter(entries)
+
+    def create_folder(self, name, parent=0):
+        if name in self._names(str(parent)):
+            raise ItemAlreadyExists(409)
+        folder_id = self._new_id()
+        self.folders[folder_id] = {'name': name, 'parent': str(parent)}
+        return {'type': 'folder', 'id': folder_id, 'name': name}
+
+    def add_file(self, name, content, parent='0'):
+        file_id = self._new_id()
+        self.files[file_id] = {'name': name, 'parent': parent, 'content': content, 'etag': 0}
+        return file_id
+
+    def find(self, name):
+        for file_id, info in self.files.items():
+            if info['name'] == name:
+                return file_id
+
+    def upload_file(self, filename, fileobj, parent=0, content_created_at=None, content_modified_at=None):
+        if filename in self._names(str(parent)):
+            raise ItemAlreadyExists(409)
+        return self._entry(self.add_file(filename, fileobj.read(), str(parent)))
+
+    def overwrite_file(self, file_id, fileobj, etag=None, content_modified_at=None):
+        info = self.files[file_id]
+        if etag is not None and etag != str(info['etag']):
+            raise PreconditionFailed(412)
+        info['content'] = fileobj.read()
+        info['etag'] += 1
+        return self._entry(file_id)
+
+    def download_file(self, file_id, version=None):
+        if file_id not in self.files:
+            raise ItemDoesNotExist(404)
+        return FakeResponse(self.files[file_id]['content'])
+
+    def delete_file(self, file_id, etag=None):
+        if etag is not None and etag != str(self.files[file_id]['etag']):
+            raise PreconditionFailed(412)
+        del self.files[file_id]
+
+
+class TestMirror(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.client = FakeClient()
+        self.mirror = Mirror(self.client, self.directory, '0')
+
+    def tearDown(self):
+        self.mirror.close()
+        shutil.rmtree(self.directory)
+
+    def write(self, path, content):
+        full_path = os.path.join(self.directory, *path.split('/'))
+        if not os.path.isdir(os.path.dirname(full_path)):
+            os.makedirs(os.path.dirname(full_path))
+        with open(full_path, 'wb') as fileobj:
+            fileobj.write(content)
+        # make sure the modification is noticed, even within the resolution of the mtime
+        stat = os.stat(full_path)
+        os.utime(full_path, (stat.st_atime, stat.st_mtime + 10))
+
+    def read(self, path):
+        with open(os.path.join(self.directory, *path.split('/'))) as fileobj:
+            return fileobj.read()
+
+    def test_first_sync(self):
+        self.write('a.txt', 'local a')
+        self.write('sub/b.txt', 'local b')
+        self.client.add_file('c.txt', 'remote c')
+        folder_id = self.client.create_folder('dir', '0')['id']
+        self.client.add_file('d.txt', 'remote d', folder_id)
+
+        report = self.mirror.sync()
+
+        self.assertEqual(['a.txt', 'sub/b.txt'], sorted(report.uploaded))
+        self.assertEqual(['c.txt', 'dir/d.txt'], sorted(report.downloaded))
+        self.assertEqual('remote d', self.read('dir/d.txt'))
+        self.assertEqual('local b', self.client.files[self.client.find('b.txt')]['content'])
+        self.assertEqual('sub', self.client.folders[self.client.files[self.client.find('b.txt')]['parent']]['name'])
+
+    def test_steady_state(self):
+        self.write('a.txt', 'same')
+        self.client.add_file('a.txt', 'same')
+        self.client.add_file('b.txt', 'remote')
+
+        report = self.mirror.sync()
+        self.assertEqual(['b.txt'], report.downloaded)
+        self.assertEqual([], report.uploaded)
+
+        # nothing is hashed or transferred once both sides are in sync
+        flexmock(box.mirror).should_receive('_file_sha1').never()
+        report = self.mirror.sync()
+        self.assertEqual(0, report.changed)
+
+    def test_changes(self):
+        self.write('a.txt', 'a')
+        self.write('b.txt', 'b')
+        self.mirror.sync()
+
+        self.write('a.txt', 'new a')
+        self.client.files[self.client.find('b.txt')].update(content='new b', etag=5)
+        report = self.mirror.sync()
+
+        self.assertEqual(['a.txt'], report.uploaded)
+        self.assertEqual(['b.txt'], report.downloaded)
+        self.assertEqual('new a', self.client.files[self.client.find('a.txt')]['content'])
+        self.assertEqual('new b', self.read('b.txt'))
+        self.assertEqual(0, self.mirror.sync().changed)
+
+    def test_conflicts(self):
+        self.write('a.txt', 'a')
+        self.write('b.txt', 'b')
+        self.mirror.sync()
+
+        # changed on both sides
+        self.write('a.txt', 'local a')
+        self.client.files[self.client.find('a.txt')].update(content='remote a', etag=1)
+        # changed locally, while the remote file changed without a change of content
+        self.write('b.txt', 'local b')
+        self.client.files[self.client.find('b.txt')]['etag'] = 1
+
+        report = self.mirror.sync()
+
+        self.assertEqual(['a.txt', 'b.txt'], sorted(path for path, _ in report.conflicts))
+        self.assertEqual('local a', self.read('a.txt'))
+        self.assertEqual('remote a', self.client.files[self.client.find('a.txt')]['content'])
+        self.assertEqual('b', self.client.files[self.client.find('b.txt')]['content'])
+
+    def test_deletes(self):
+        self.write('a.txt', 'a')
+        self.write('b.txt', 'b')
+        self.mirror.sync()
+
+        os.remove(os.path.join(self.directory, 'a.txt'))
+        del self.client.files[self.client.find('b.txt')]
+        report = self.mirror.sync()
+
+        self.assertEqual(['a.txt'], report.deleted_remote)
+        self.assertEqual(['b.txt'], report.deleted_local)
+        self.assertEqual({}, self.client.files)
+        self.assertEqual([], [name for name in os.listdir(self.directory) if not name.startswith('.boxmirror')])
+
+    def test_without_deletes(self):
+        self.write('a.txt', 'a')
+        self.mirror.sync()
+        self.mirror.propagate_deletes = False
+
+        del self.client.files[self.client.find('a.txt')]
+        report = self.mirror.sync()
+
+        self.assertEqual(['a.txt'], report.uploaded)
+        self.assertIsNotNone(self.client.find('a.txt'))
+
+    def test_errors(self):
+        self.client.add_file('a.txt', 'a')
+        flexmock(self.client).should_receive('download_file').and_raise(ValueError('boom'))
+
+        report = self.mirror.sync()
+
+        self.assertEqual('a.txt', report.errors[0][0])
+        self.assertIsInstance(report.errors[0][1], ValueError)
+        self.assertEqual([], [name for name in os.listdir(self.directory) if not name.startswith('.boxmirror')])
+
+    def test_unreadable_files_are_skipped(self):
+        self.write('a.txt', 'a')
+        self.write('b.txt', 'b')
+        self.mirror.sync()
+
+        self.write('a.txt', 'local a')
+        self.client.files[self.client.find('a.txt')].update(content='remote a', etag=1)
+        self.write('b.txt', 'local b')
+        file_sha1 = box.mirror._file_sha1
+
+        def unreadable_a(path):
+            if path.endswith('a.txt'):
+                raise IOError(13, 'Permission denied')
+            return file_sha1(path)
+
+        flexmock(box.mirror).should_receive('_file_sha1').replace_with(unreadable_a)
+        report = self.mirror.sync()
+
+        self.assertEqual(['a.txt'], [path for path, _ in report.errors])
+        self.assertIsInstance(report.errors[0][1], IOError)
+        self.assertEqual(['b.txt'], report.uploaded)
+        self.assertEqual([], report.downloaded)
+        # the local change isn't mistaken for the synced content, and overwritten
+        self.assertEqual('local a', self.read('a.txt'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest2 as unittest
+
+from box import BoxClient
+from box.models import from_json, BoxObject, File, Folder, User, Event, Collaboration
+
+
+FILE = {
+    'type': 'file',
+    'id': '5000948880',
+    'etag': '3',
+    'sha1': '134b65991ed521fcfe4724b7d814ab8ded5185dc',
+    'name': 'tigers.jpeg',
+    'size': 629644,
+    'path_collection': {
+        'total_count': 2,
+        'entries': [
+            {'type': 'folder', 'id': '0', 'name': 'All Files'},
+            {'type': 'folder', 'id': '11446498', 'name': 'Pictures'},
+        ]
+    },
+    'owned_by': {'type': 'user', 'id': '17738362', 'name': 'sean rose', 'login': 'sean@box.com'},
+    'shared_link': None,
+    'x_custom': 'hello',
+}
+
+
+class TestModels(unittest.TestCase):
+    def test_from_json_types(self):
+        self.assertIsInstance(from_json(FILE), File)
+        self.assertIsInstance(from_json({'type': 'folder', 'id': '1'}), Folder)
+        self.assertIsInstance(from_json({'type': 'user', 'id': '1'}), User)
+        self.assertIsInstance(from_json({'type': 'event', 'event_id': '1'}), Event)
+        self.assertIsInstance(from_json({'type': 'collaboration', 'id': '1'}), Collaboration)
+        self.assertEqual({'type': 'web_link', 'id': '1'}, from_json({'type': 'web_link', 'id': '1'}))
+        self.assertEqual([1, 'a'], from_json([1, 'a']))
+
+    def test_no_instance_dict(self):
+        self.assertFalse(hasattr(from_json(FILE), '__dict__'))
+
+    def test_attribute_and_item_access(self):
+        f = from_json(FILE)
+        self.assertEqual('tigers.jpeg', f.name)
+        self.assertEqual('tigers.jpeg', f['name'])
+        self.assertEqual('hello', f.x_custom)
+        self.assertEqual('hello', f['x_custom'])
+        self.assertIsNone(f.modified_at)
+        self.assertIsNone(f.shared_link)
+        self.assertNotIn('modified_at', f)
+        self.assertIn('shared_link', f)
+        self.assertEqual('default', f.get('modified_at', 'default'))
+        with self.assertRaises(KeyError):
+            f['modified_at']
+        with self.assertRaises(AttributeError):
+            f.no_such_field
+
+    def test_nested_decoded_lazily(self):
+        f = from_json(FILE)
+        self.assertIs(FILE['owned_by'], f._owned_by)
+
+        owner = f.owned_by
+        self.assertIsInstance(owner, User)
+        self.assertEqual('sean@box.com', owner.login)
+        self.assertIs(owner, f.owned_by)
+
+        self.assertIsInstance(f['path_collection']['entries'][1], Folder)
+
+    def test_to_dict(self):
+        f = from_json(FILE)
+        f.owned_by
+        self.assertEqual(FILE, f.to_dict())
+        self.assertEqual(f, FILE)
+
+    def test_works_with_client_helpers(self):
+        f = from_json(FILE)
+        self.assertEqual('5000948880', BoxClient._get_id(f))
+        self.assertEqual('/Pictures/tigers.jpeg', BoxClient.get_path_of_file(f))
+
+    def test_assign_nested(self):
+        f = from_json(FILE)
+        f.parent = {'type': 'folder', 'id': '1'}
+        self.assertEqual({'type': 'folder', 'id': '1'}, f.parent)
+
+    def test_base_class(self):
+        self.assertTrue(issubclass(File, BoxObject))
+
+
+if __name__ == '__main__':
+    unittest.main()
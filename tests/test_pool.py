@@ -0,0 +1,99 @@
+import threading
+import time
+import unittest2 as unittest
+
+from box.pool import CancelledError, WorkerPool, Future, FutureTimeout, RateLimiter
+
+
+class TestWorkerPool(unittest.TestCase):
+    def test_submit(self):
+        with WorkerPool(2) as pool:
+            self.assertEqual(3, pool.submit(lambda a, b: a + b, 1, b=2).result())
+
+    def test_submit_error(self):
+        def fail():
+            raise ValueError('boom')
+
+        with WorkerPool(2) as pool:
+            future = pool.submit(fail)
+            with self.assertRaises(ValueError):
+                future.result()
+            self.assertIsInstance(future.exception(), ValueError)
+
+    def test_map_unordered(self):
+        with WorkerPool(4) as pool:
+            results = dict((item, future.result()) for item, future in pool.map_unordered(lambda x: x * 2, range(50)))
+        self.assertEqual(dict((x, x * 2) for x in range(50)), results)
+
+    def test_map_unordered_is_lazy(self):
+        pulled = []
+
+        def items():
+            for i in range(100):
+                pulled.append(i)
+                yield i
+
+        with WorkerPool(2) as pool:
+            results = pool.map_unordered(lambda x: x, items(), window=3)
+            next(results)
+            self.assertLessEqual(len(pulled), 4)
+            self.assertEqual(99, len(list(results)))
+
+    def test_runs_concurrently(self):
+        barrier = threading.Semaphore(0)
+
+        def wait_for_other():
+            barrier.release()
+            time.sleep(0.05)
+            return barrier.acquire(False)
+
+        with WorkerPool(2) as pool:
+            futures = [pool.submit(wait_for_other) for _ in range(2)]
+            self.assertTrue(any(future.result() for future in futures))
+
+
+class TestFuture(unittest.TestCase):
+    def test_callbacks(self):
+        future = Future()
+        called = []
+        future.add_done_callback(called.append)
+        self.assertFalse(future.done())
+        future.set_result(1)
+        future.add_done_callback(called.append)
+        self.assertEqual([future, future], called)
+
+    def test_cancel(self):
+        pool = WorkerPool(1)
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+        running = pool.submit(lambda: started.set() or release.wait(5))
+        queued = pool.submit(calls.append, 1)
+        started.wait(5)
+
+        # calls that started run to completion
+        self.assertFalse(running.cancel())
+        self.assertTrue(queued.cancel())
+        self.assertIsInstance(queued.exception(), CancelledError)
+        release.set()
+        pool.shutdown()
+
+        self.assertTrue(running.result())
+        self.assertEqual([], calls)
+
+    def test_timeout(self):
+        with self.assertRaises(FutureTimeout):
+            Future().result(timeout=0.01)
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_limits_rate(self):
+        limiter = RateLimiter(100, burst=1)
+        start = time.time()
+        for _ in range(6):
+            limiter.acquire()
+        self.assertGreaterEqual(time.time() - start, 0.045)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import time
+import unittest2 as unittest
+
+from box import BoxClient, BoxClientException
+
+
+def item(id, type='file'):
+    return {'type': type, 'id': str(id)}
+
+
+class FakeSearchClient(BoxClient):
+    def __init__(self, results):
+        super(FakeSearchClient, self).__init__('my_token')
+        self.results = results
+        self.calls = []
+
+    def search(self, query, limit=30, offset=0):
+        self.calls.append((query, limit, offset))
+        if query not in self.results:
+            raise BoxClientException(500, 'boom')
+        items = self.results[query]
+        return {'entries': items[offset:offset + limit], 'total_count': len(items)}
+
+
+class TestMultiSearch(unittest.TestCase):
+    def test_pages_every_query(self):
+        client = FakeSearchClient({
+            'a': [item(i) for i in range(450)],
+            'b': [item(i) for i in range(1000, 1010)],
+        })
+
+        hits = list(client.search_many(['a', 'b']))
+
+        self.assertEqual(460, len(hits))
+        self.assertEqual(sorted([('a', 200, 0), ('a', 200, 200), ('a', 200, 400), ('b', 200, 0)]), sorted(client.calls))
+
+    def test_dedupes_with_provenance(self):
+        client = FakeSearchClient({
+            'a': [item(1), item(2)],
+            'b': [item(2), item(3), item(1, type='folder')],
+        })
+
+        search = client.search_many(['a', 'b'], workers=1)
+        hits = list(search)
+
+        self.assertEqual(4, len(hits))
+        self.assertEqual(['a', 'b'], sorted(search.provenance[('file', '2')]))
+        self.assertEqual(['b'], search.provenance[('folder', '1')])
+        hit = [h for h in hits if h.item == item(2)][0]
+        self.assertEqual(['a', 'b'], sorted(hit.queries))
+
+    def test_max_results(self):
+        client = FakeSearchClient({'a': [item(i) for i in range(1000)]})
+
+        hits = list(client.search_many(['a'], page_size=100, max_results=250))
+
+        self.assertEqual(250, len(hits))
+        self.assertEqual(sorted([('a', 100, 0), ('a', 100, 100), ('a', 50, 200)]), sorted(client.calls))
+
+    def test_errors(self):
+        client = FakeSearchClient({'b': [item(1), item(2)]})
+
+        search = client.search_many(['a', 'b'])
+        hits = list(search)
+
+        # the failed query doesn't stop the others
+        self.assertEqual(2, len(hits))
+        self.assertEqual(['a'], list(search.errors))
+        self.assertIsInstance(search.errors['a'], BoxClientException)
+
+    def test_stopped_early(self):
+        client = FakeSearchClient({'a': [item(i) for i in range(1000)]})
+        search = client.search_many(['a'], workers=1, page_size=100)
+        original_search = client.search
+
+        def slow_search(query, limit=30, offset=0):
+            time.sleep(0.01)
+            return original_search(query, limit, offset)
+
+        client.search = slow_search
+        hits = iter(search)
+        next(hits)
+        hits.close()
+        time.sleep(0.1)
+
+        # the pages still queued were cancelled
+        self.assertLessEqual(len(client.calls), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
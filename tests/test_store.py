@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest2 as unittest
+
+from flexmock import flexmock
+
+import box.client
+from box import CredentialsV2, FileCredentialStore, SqliteCredentialStore
+
+
+class StoreTestsMixin(object):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_empty(self):
+        self.assertIsNone(self.make_store().load())
+
+    def test_save_and_load(self):
+        tokens = {'access_token': 'a', 'refresh_token': 'r', 'expires_at': 1234.5}
+        self.make_store().save(tokens)
+        self.assertDictEqual(tokens, self.make_store().load())
+
+    def test_replace(self):
+        store = self.make_store()
+        store.save({'access_token': 'a', 'refresh_token': 'r', 'expires_at': None})
+        store.save({'access_token': 'b', 'refresh_token': 's', 'expires_at': None})
+        self.assertEqual('b', store.load()['access_token'])
+        self.assertEqual('b', self.make_store().load()['access_token'])
+
+    def test_credentials_seed_store(self):
+        store = self.make_store()
+        CredentialsV2('my_token', 'my_refresh_token', 'client_id', 'client_secret', store=store)
+        self.assertEqual('my_token', store.load()['access_token'])
+        self.assertEqual('my_refresh_token', store.load()['refresh_token'])
+
+    def test_credentials_prefer_stored_tokens(self):
+        store = self.make_store()
+        store.save({'access_token': 'stored_token', 'refresh_token': 'stored_refresh_token', 'expires_at': None})
+        credentials = CredentialsV2('my_token', 'my_refresh_token', 'client_id', 'client_secret', store=store)
+        self.assertDictEqual({'Authorization': 'Bearer stored_token'}, credentials.headers)
+
+    def test_refresh_reaches_other_workers(self):
+        worker_1 = CredentialsV2('my_token', 'my_refresh_token', 'client_id', 'client_secret', store=self.make_store())
+        worker_2 = CredentialsV2('my_token', 'my_refresh_token', 'client_id', 'client_secret', store=self.make_store())
+        (flexmock(box.client)
+            .should_receive('refresh_v2_token')
+            .with_args('client_id', 'client_secret', 'my_refresh_token', None)
+            .and_return({'access_token': 'new_token', 'refresh_token': 'new_refresh_token', 'expires_in': 3600})
+            .once())
+
+        self.assertTrue(worker_1.refresh())
+
+        # a worker that got a 401 with the old token doesn't refresh again with the used up refresh token
+        self.assertTrue(worker_2.refresh())
+        self.assertEqual('new_refresh_token', worker_2._refresh_token)
+
+        worker_3 = CredentialsV2('my_token', 'my_refresh_token', 'client_id', 'client_secret', store=self.make_store())
+        self.assertDictEqual({'Authorization': 'Bearer new_token'}, worker_3.headers)
+        self.assertAlmostEqual(time.time() + 3600, worker_3._expires_at, delta=5)
+
+
+class TestFileCredentialStore(StoreTestsMixin, unittest.TestCase):
+    def make_store(self):
+        return FileCredentialStore(os.path.join(self.directory, 'credentials.json'))
+
+
+class TestSqliteCredentialStore(StoreTestsMixin, unittest.TestCase):
+    def make_store(self):
+        return SqliteCredentialStore(os.path.join(self.directory, 'credentials.db'))
+
+    def test_keys(self):
+        path = os.path.join(self.directory, 'credentials.db')
+        SqliteCredentialStore(path, key='alice').save({'access_token': 'a'})
+        SqliteCredentialStore(path, key='bob').save({'access_token': 'b'})
+
+        self.assertEqual('a', SqliteCredentialStore(path, key='alice').load()['access_token'])
+        self.assertEqual('b', SqliteCredentialStore(path, key='bob').load()['access_token'])
+
+
+if __name__ == '__main__':
+    unittest.main()
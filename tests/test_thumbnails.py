@@ -0,0 +1,159 @@
+from StringIO import StringIO
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import unittest2 as unittest
+
+from flexmock import flexmock
+
+from box import BoxClient
+from box.models import File
+from box.thumbnails import ThumbnailCache, ThumbnailService
+
+
+class TestThumbnailCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_get_put(self):
+        cache = ThumbnailCache(self.directory)
+        self.assertIsNone(cache.get(('1', 'abc')))
+        cache.put(('1', 'abc'), 'thumbnail')
+        self.assertEqual('thumbnail', cache.get(('1', 'abc')))
+        self.assertIsNone(cache.get(('1', 'def')))
+
+        # replacing an entry doesn't count it twice
+        cache.put(('1', 'abc'), 'other')
+        self.assertEqual(5, cache.size)
+
+    def test_evicts_least_recently_used(self):
+        cache = ThumbnailCache(self.directory, max_size=30)
+        cache.put('a', 'x' * 10)
+        cache.put('b', 'x' * 10)
+        cache.put('c', 'x' * 10)
+        cache.get('a')
+        cache.put('d', 'x' * 10)
+
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNone(cache.get('c'))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNotNone(cache.get('d'))
+        self.assertEqual(2, len([name for name in os.listdir(self.directory) if name.endswith('.thumbnail')]))
+
+    def test_reloads_directory(self):
+        ThumbnailCache(self.directory).put('a', 'thumbnail')
+        cache = ThumbnailCache(self.directory)
+        self.assertEqual(1, len(cache))
+        self.assertEqual('thumbnail', cache.get('a'))
+
+
+class TestThumbnailService(unittest.TestCase):
+    def setUp(self):
+        self.client = BoxClient('my_token')
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_fetches_and_caches(self):
+        (flexmock(self.client)
+            .should_receive('fetch_thumbnail')
+            .with_args('1', 'png', min_height=None, max_height=64, min_width=None, max_width=64)
+            .and_return((StringIO('thumbnail'), None))
+            .once())
+
+        with ThumbnailService(self.client, cache=self.directory) as service:
+            file_info = {'type': 'file', 'id': '1', 'sha1': 'abc'}
+            self.assertEqual('thumbnail', service.get(file_info, max_height=64, max_width=64).result(1))
+            # served from the cache
+            self.assertEqual('thumbnail', service.get(file_info, max_height=64, max_width=64).result(1))
+
+    def test_ids_are_not_cached(self):
+        (flexmock(self.client)
+            .should_receive('fetch_thumbnail')
+            .and_return((StringIO('thumbnail'), None), (None, None))
+            .one_by_one()
+            .twice())
+
+        with ThumbnailService(self.client, cache=self.directory) as service:
+            self.assertEqual('thumbnail', service.get('1').result(1))
+            self.assertIsNone(service.get('1').result(1))
+
+    def test_retries_later(self):
+        calls = []
+
+        def fetch_thumbnail(file_id, extension, **bounds):
+            calls.append(file_id)
+            if file_id == '1' and calls.count('1') == 1:
+                return None, 0.05
+            return StringIO('thumbnail ' + file_id), None
+
+        flexmock(self.client).should_receive('fetch_thumbnail').replace_with(fetch_thumbnail)
+
+        with ThumbnailService(self.client, workers=1) as service:
+            futures = service.get_many(['1', '2'])
+            self.assertEqual(['thumbnail 1', 'thumbnail 2'], [future.result(1) for future in futures])
+
+        # the pool's only thread fetched the other thumbnail while the first one wasn't ready
+        self.assertEqual(['1', '2', '1'], calls)
+
+    def test_retries_share_a_thread(self):
+        calls = []
+
+        def fetch_thumbnail(file_id, extension, **bounds):
+            calls.append(file_id)
+            if calls.count(file_id) == 1:
+                return None, 0.1
+            return StringIO('thumbnail ' + file_id), None
+
+        flexmock(self.client).should_receive('fetch_thumbnail').replace_with(fetch_thumbnail)
+
+        with ThumbnailService(self.client, workers=2) as service:
+            threads = threading.active_count()
+            futures = service.get_many([str(file_id) for file_id in range(20)])
+            time.sleep(0.05)
+            # a single scheduler thread waits for all the retries
+            self.assertLessEqual(threading.active_count(), threads + 1)
+            self.assertEqual(['thumbnail {0}'.format(file_id) for file_id in range(20)],
+                             [future.result(1) for future in futures])
+
+    def test_typed_files_are_cached(self):
+        flexmock(self.client).should_receive('fetch_thumbnail').and_return((StringIO('thumbnail'), None)).once()
+
+        with ThumbnailService(self.client, cache=self.directory) as service:
+            file_info = File({'type': 'file', 'id': '1', 'sha1': 'abc'})
+            self.assertEqual('thumbnail', service.get(file_info).result(1))
+            self.assertEqual('thumbnail', service.get(file_info).result(1))
+
+    def test_waits_up_to_max_wait(self):
+        flexmock(self.client).should_receive('fetch_thumbnail').and_return((None, 0.05)).times(3)
+        with ThumbnailService(self.client, max_wait=0.12) as service:
+            self.assertIsNone(service.get('1').result(1))
+
+    def test_gives_up_after_max_wait(self):
+        flexmock(self.client).should_receive('fetch_thumbnail').and_return((None, 30)).once()
+        with ThumbnailService(self.client, max_wait=10) as service:
+            self.assertIsNone(service.get('1').result(1))
+
+    def test_close_resolves_pending(self):
+        flexmock(self.client).should_receive('fetch_thumbnail').and_return((None, 5)).once()
+        service = ThumbnailService(self.client)
+        future = service.get('1')
+        time.sleep(0.05)
+        service.close()
+        self.assertIsNone(future.result(1))
+
+    def test_error(self):
+        flexmock(self.client).should_receive('fetch_thumbnail').and_raise(ValueError('boom'))
+        with ThumbnailService(self.client) as service:
+            self.assertIsInstance(service.get('1').exception(1), ValueError)
+
+
+if __name__ == '__main__':
+    unittest.main()
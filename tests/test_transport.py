@@ -0,0 +1,311 @@
+from StringIO import StringIO
+from io import BytesIO
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest2 as unittest
+
+from flexmock import flexmock
+import requests
+import urllib3
+
+from box import BoxClient
+from box.transport import BufferedResponse, HTTP2Transport, RecordingTransport, ReplayError, ReplayTransport, \
+    RequestsTransport, TransferStats, Urllib3Transport
+from tests import failing_import, mocked_response
+
+
+class FakeTransport(object):
+    """
+    Serves canned responses by url
+    """
+    def __init__(self, responses):
+        self.responses = responses
+        self.requests = []
+
+    def request(self, method, url, **kwargs):
+        self.requests.append((method, url, kwargs))
+        response = self.responses[url]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def close(self):
+        pass
+
+
+class TestRequestsTransport(unittest.TestCase):
+    def test_request(self):
+        (flexmock(requests)
+            .should_receive('request')
+            .with_args('get', 'https://api.box.com/2.0/users/me', params=None, timeout=5)
+            .and_return(mocked_response({'id': '1'}))
+            .once())
+        response = RequestsTransport().request('get', 'https://api.box.com/2.0/users/me', params=None, timeout=5)
+        self.assertEqual({'id': '1'}, response.json())
+
+    def test_session(self):
+        session = requests.Session()
+        (flexmock(session)
+            .should_receive('request')
+            .with_args('get', 'https://api.box.com/2.0/users/me')
+            .and_return(mocked_response({'id': '1'}))
+            .once())
+        self.assertEqual({'id': '1'}, RequestsTransport(session).request('get', 'https://api.box.com/2.0/users/me').json())
+
+
+class FakeHTTP20Adapter(requests.adapters.BaseAdapter):
+    pass
+
+
+class TestHTTP2Transport(unittest.TestCase):
+    def test_http2(self):
+        hyper = flexmock(contrib=flexmock(HTTP20Adapter=FakeHTTP20Adapter))
+        modules = {'hyper': hyper, 'hyper.contrib': hyper.contrib}
+        original = dict((name, sys.modules.get(name)) for name in modules)
+        sys.modules.update(modules)
+        try:
+            transport = HTTP2Transport()
+        finally:
+            for name, module in original.items():
+                if module is None:
+                    del sys.modules[name]
+                else:
+                    sys.modules[name] = module
+
+        self.assertTrue(transport.http2)
+        session = transport.session
+        self.assertIsInstance(session.get_adapter('https://api.box.com/2.0/folders/0'), FakeHTTP20Adapter)
+        self.assertIsInstance(session.get_adapter('https://upload.box.com/api/2.0/files/content'),
+                              requests.adapters.HTTPAdapter)
+
+    def test_fallback(self):
+        with failing_import('hyper.contrib'):
+            transport = HTTP2Transport(pool_maxsize=64)
+
+        self.assertFalse(transport.http2)
+        adapter = transport.session.get_adapter('https://api.box.com/2.0/folders/0')
+        self.assertIsInstance(adapter, requests.adapters.HTTPAdapter)
+        self.assertEqual(64, adapter._pool_maxsize)
+
+
+def urllib3_response(content, status=200, headers=None):
+    return urllib3.HTTPResponse(body=BytesIO(content), headers=headers or {}, status=status, preload_content=False)
+
+
+class TestUrllib3Transport(unittest.TestCase):
+    def setUp(self):
+        self.transport = Urllib3Transport()
+
+    def expect(self, method, url, response, **kwargs):
+        headers = dict(kwargs.pop('headers', {}))
+        headers['Accept-Encoding'] = self.transport.accept_encoding
+        (flexmock(self.transport.pool)
+            .should_receive('urlopen')
+            .with_args(method, url, body=kwargs.pop('body', None), headers=headers,
+                       retries=self.transport._retries, timeout=urllib3.Timeout, preload_content=False,
+                       decode_content=True)
+            .and_return(response)
+            .once())
+
+    def test_get(self):
+        self.expect('GET', 'https://api.box.com/2.0/search?channel=1&channel=2&query=caf%C3%A9',
+                    urllib3_response('{"total_count": 0}', headers={'Content-Type': 'application/json'}))
+        response = self.transport.request('get', 'https://api.box.com/2.0/search',
+                                          params={'query': u'caf\xe9', 'channel': ['1', '2'], 'fields': None})
+        self.assertTrue(response.ok)
+        self.assertEqual({'total_count': 0}, response.json())
+        self.assertEqual('application/json', response.headers['content-type'])
+
+    def test_json_body(self):
+        self.expect('POST', 'https://api.box.com/2.0/folders', urllib3_response('{}', status=409),
+                    body='{"name": "a"}', headers={'Authorization': 'Bearer my_token'})
+        response = self.transport.request('post', 'https://api.box.com/2.0/folders', data='{"name": "a"}',
+                                          headers={'Authorization': 'Bearer my_token'})
+        self.assertFalse(response.ok)
+        self.assertEqual(409, response.status_code)
+
+    def test_form(self):
+        self.expect('POST', 'https://www.box.com/api/oauth2/token', urllib3_response('{}'),
+                    body='client_id=1&grant_type=refresh_token',
+                    headers={'Content-Type': 'application/x-www-form-urlencoded'})
+        self.transport.request('post', 'https://www.box.com/api/oauth2/token',
+                               data={'client_id': 1, 'grant_type': 'refresh_token'})
+
+    def test_upload(self):
+        def urlopen(method, url, body, headers, **kwargs):
+            self.assertIn('multipart/form-data', headers['Content-Type'])
+            self.assertIn('name="parent_id"\r\n\r\n0\r\n', body)
+            self.assertIn('name="a.txt"; filename="a.txt"', body)
+            self.assertIn('\r\n\r\ncontent\r\n', body)
+            return urllib3_response('{"entries": []}', status=201)
+
+        flexmock(self.transport.pool).should_receive('urlopen').replace_with(urlopen).once()
+        response = self.transport.request('post', 'https://upload.box.com/api/2.0/files/content', data={'parent_id': 0},
+                                          files={'a.txt': ('a.txt', StringIO('content'))})
+        self.assertEqual(201, response.status_code)
+
+    def test_stream(self):
+        self.expect('GET', 'https://api.box.com/2.0/files/1/content', urllib3_response('abcdef'))
+        response = self.transport.request('get', 'https://api.box.com/2.0/files/1/content', stream=True)
+        self.assertEqual(['ab', 'cd', 'ef'], list(response.iter_content(2)))
+
+    def test_timeout(self):
+        self.assertEqual((5, 60), (self.transport._timeout((5, 60)).connect_timeout,
+                                   self.transport._timeout((5, 60)).read_timeout))
+        self.assertEqual(10, self.transport._timeout(10).connect_timeout)
+        self.assertIsNone(self.transport._timeout(None).read_timeout)
+
+    def test_errors(self):
+        pool = flexmock(self.transport.pool)
+        pool.should_receive('urlopen').and_raise(urllib3.exceptions.ReadTimeoutError(None, None, 'timed out'))
+        with self.assertRaises(requests.Timeout):
+            self.transport.request('get', 'https://api.box.com/2.0/users/me', timeout=1)
+
+        error = urllib3.exceptions.MaxRetryError(None, 'https://api.box.com/2.0/users/me',
+                                                 urllib3.exceptions.NewConnectionError(None, 'refused'))
+        pool.should_receive('urlopen').and_raise(error)
+        with self.assertRaises(requests.ConnectionError):
+            self.transport.request('get', 'https://api.box.com/2.0/users/me')
+
+    def test_client(self):
+        self.expect('GET', 'https://api.box.com/2.0/users/me', urllib3_response('{"name": "bla"}'),
+                    headers={'Authorization': 'Bearer my_token'})
+        self.assertEqual({'name': 'bla'}, BoxClient('my_token', transport=self.transport).get_user_info())
+
+
+def gzipped(content):
+    buffer = BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb') as fileobj:
+        fileobj.write(content)
+    return buffer.getvalue()
+
+
+class TestTransferStats(unittest.TestCase):
+    def test_compressed(self):
+        content = json.dumps({'entries': [{'type': 'file', 'id': str(id)} for id in range(1000)]})
+        transport = Urllib3Transport()
+        self.assertIn('gzip', transport.accept_encoding)
+        (flexmock(transport.pool)
+            .should_receive('urlopen')
+            .and_return(urllib3_response(gzipped(content), headers={'Content-Encoding': 'gzip'}))
+            .once())
+
+        stats = TransferStats()
+        client = BoxClient('my_token', transport=transport, transfer_stats=stats)
+        self.assertEqual(1000, len(client.get_folder_content(0)['entries']))
+
+        api = stats.stats()['api']
+        self.assertEqual(1, api['responses'])
+        self.assertEqual(1, api['compressed_responses'])
+        self.assertEqual(len(content), api['decoded_bytes'])
+        self.assertEqual(len(gzipped(content)), api['wire_bytes'])
+        self.assertGreater(api['saved'], 0.8)
+
+    def test_families(self):
+        (flexmock(requests)
+            .should_receive('request')
+            .and_return(mocked_response({'entries': [], 'chunk_size': 0, 'next_stream_position': 1},
+                                        headers={'Content-Length': '10'}))
+            .and_return(mocked_response({'name': 'bla'}))
+            .one_by_one())
+
+        stats = TransferStats()
+        client = BoxClient('my_token', transfer_stats=stats)
+        client.get_events()
+        client.get_user_info()
+
+        self.assertEqual({'events', 'api'}, set(stats.stats()))
+        self.assertEqual(10, stats.stats()['events']['wire_bytes'])
+        self.assertEqual(15, stats.stats()['api']['wire_bytes'])
+        self.assertEqual(0.0, stats.stats()['api']['saved'])
+
+
+class TestBufferedResponse(unittest.TestCase):
+    def test_response(self):
+        response = BufferedResponse(404, {'Content-Type': 'application/json'}, '{"status": 404}')
+        self.assertFalse(response.ok)
+        self.assertEqual('application/json', response.headers['content-type'])
+        self.assertEqual({'status': 404}, response.json())
+        self.assertEqual(['{"st', 'atus', '": 4', '04}'], list(response.iter_content(4)))
+        response.raw.decode_content = True
+        self.assertEqual('{"status": 404}', response.raw.read())
+
+
+class TestRecordAndReplay(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'recording.jsonl.gz')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def record(self, responses, calls):
+        transport = RecordingTransport(self.path, FakeTransport(responses))
+        client = BoxClient('my_token', transport=transport)
+        try:
+            return calls(client)
+        finally:
+            transport.close()
+
+    def test_replays_client_calls(self):
+        folder_url = 'https://api.box.com/2.0/folders/1'
+        content_url = 'https://api.box.com/2.0/files/2/content'
+        binary = ''.join(chr(byte) for byte in range(256))
+        responses = {
+            folder_url: mocked_response({'id': '1', 'name': 'folder'}, headers={}),
+            content_url: mocked_response(content=binary, headers={}),
+        }
+
+        def calls(client):
+            return client.get_folder(1), client.download_file(2).raw.read()
+
+        recorded = self.record(responses, calls)
+        self.assertEqual(({'id': '1', 'name': 'folder'}, binary), recorded)
+
+        client = BoxClient('my_token', transport=ReplayTransport(self.path))
+        self.assertEqual(recorded, calls(client))
+        # served again once the recorded responses run out
+        self.assertEqual(recorded, calls(client))
+
+        with self.assertRaises(ReplayError):
+            client.get_folder(3)
+
+    def test_replays_in_order(self):
+        url = 'https://api.box.com/2.0/users/me'
+        transport = RecordingTransport(self.path, FakeTransport({url: mocked_response({'name': 'first'}, headers={})}))
+        transport.request('get', url, params={'fields': 'name'})
+        transport.transport.responses[url] = mocked_response({'name': 'second'}, headers={})
+        transport.request('get', url, params={'fields': 'name'})
+        transport.transport.responses[url] = mocked_response({'name': 'third'}, headers={})
+        transport.request('post', url, data='{"name": "third"}')
+        transport.close()
+
+        replay = ReplayTransport(self.path)
+        self.assertEqual({'name': 'third'}, replay.request('post', url, data='{"name": "third"}').json())
+        self.assertEqual({'name': 'first'}, replay.request('get', url, params={'fields': 'name'}).json())
+        self.assertEqual({'name': 'second'}, replay.request('get', url, params={'fields': 'name'}).json())
+        with self.assertRaises(ReplayError):
+            replay.request('post', url, data='{"name": "other"}')
+
+    def test_replays_errors_and_timing(self):
+        url = 'https://api.box.com/2.0/users/me'
+        transport = RecordingTransport(self.path, FakeTransport({url: requests.ConnectionError('down')}))
+        with self.assertRaises(requests.ConnectionError):
+            transport.request('get', url)
+        transport.close()
+
+        with self.assertRaises(requests.ConnectionError):
+            ReplayTransport(self.path).request('get', url)
+
+        flexmock(time).should_receive('sleep').once()
+        with self.assertRaises(requests.ConnectionError):
+            ReplayTransport(self.path, timing=True).request('get', url)
+
+
+if __name__ == '__main__':
+    unittest.main()